@@ -4,29 +4,58 @@
     Email: amro.farag@bregroup.com / amrihabfaraj@gmail.com
 """
 
-import os
 import sys
-import csv
-import serial
+import time
+import argparse
 import numpy as np
-from collections import deque
-from datetime import datetime, timedelta
-from filelock import FileLock
-from matplotlib.dates import DateFormatter, date2num
-from bamLoadBasedTesting.twoMassModel import CalcParameters
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import serial
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QApplication, QLabel, QVBoxLayout, QWidget, QPushButton, \
     QLineEdit, QGridLayout, QGroupBox, QHBoxLayout, QFrame, QPlainTextEdit, \
-    QTabWidget, QTableWidget, QTableWidgetItem, QFileDialog, QProgressBar, QSplashScreen
+    QTabWidget, QTableView, QFileDialog, QProgressBar, QSplashScreen
 from PyQt5.QtGui import QFont, QColor, QPalette, QPixmap, QIcon
-from PyQt5.QtCore import QTimer, Qt, QSize
+from PyQt5.QtCore import QTimer, Qt, QSize, QAbstractTableModel, QModelIndex, QThread, pyqtSignal, QSocketNotifier
+from renderScheduler import RenderScheduler, LABEL_FRAME_MS, TABLE_FRAME_MS, GRAPH_FRAME_MS
+from terminalLog import TerminalLog
+from controllerEngine import (ControllerEngine, adjustDesignParameters, validateModelSettings, SAMPLE_COLUMNS,
+                              validateSampling, MAX_SAMPLE_RATE, MAX_AVG_WINDOW, MAX_BATCH_SAMPLE_RATE,
+                              MAX_BATCH_SAMPLES)
+from sampleStore import SampleStore, HISTORY_WINDOW_SAMPLES, STORE_COLUMNS
+from replaySource import parseReplaySpeed
+from controlLoop import ControlLoop, CONTROL_PERIOD
+from eventBus import EventBus, publishLog
 
 # Constants for Arduino connection
 ARDUINO_PORT = 'COM4'
 BAUD_RATE = 115200
 
+# Graph tab rendering backend: 'matplotlib' or 'pyqtgraph' (Qt-native, for live streaming at 30 fps or more)
+GRAPH_BACKEND = 'matplotlib'
+
+# Optional SQLite database (e.g. 'samples.sqlite3') receiving the samples of every logged session;
+# required for the "Browse History" button of the Data Spreadsheet tab
+SAMPLE_DATABASE = None
+
+# Write the CSV log as rotating zstd-compressed segments (bench1.csv -> bench1.segments/) instead of one file
+LOG_SEGMENTS = False
+
+# Optional Prometheus metrics endpoint (e.g. 9100 -> http://127.0.0.1:9100/metrics) for central monitoring
+METRICS_PORT = None
+METRICS_HOST = '127.0.0.1'  # '0.0.0.0' to be scraped from other machines
+
+# Optional live sample stream for remote viewers (e.g. 8090 -> http://127.0.0.1:8090/ in a browser)
+STREAM_PORT = None
+STREAM_HOST = '127.0.0.1'  # '0.0.0.0' to let other machines watch
+
+# Shared memory ring of a separate acquisition process (controller-daemon.py --shared-ring NAME) to show instead
+# of running the controller in the GUI process; None runs it here
+ATTACH_RING = None
+
+# Event queues of the GUI (eventBus.py); a view that falls behind loses its oldest events, never holds up the model
+LOG_QUEUE_DEPTH = 1000  # Log messages waiting for the terminal
+READING_QUEUE_DEPTH = 100  # Readings waiting for the measurement labels
+SAMPLE_QUEUE_DEPTH = 10000  # Samples waiting for the spreadsheet and graph
+
 def applyOneDarkProTheme(app):
     app.setStyle("Fusion")
     palette = QPalette()
@@ -94,26 +123,110 @@ def show_splash_screen():
 
     return splash
 
+class SampleTableModel(QAbstractTableModel):
+    def __init__(self, store, parent=None):
+        """
+        Read-only table model over a SampleStore; cells are formatted only when the view asks for them.
+        """
+        super(SampleTableModel, self).__init__(parent)
+        self.store = store
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(SAMPLE_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.store.row(index.row())[index.column()]
+        if index.column() == 0:  # Time column
+            return time.strftime('%H:%M:%S', time.localtime(value))
+        return 'N/A' if np.isnan(value) else f"{value:.3f}"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return SAMPLE_COLUMNS[section]
+        return super(SampleTableModel, self).headerData(section, orientation, role)
+
+    def refresh(self):
+        # The ring buffer shifts rows once it is full, so the view is reset rather than told about inserted rows
+        self.beginResetModel()
+        self.endResetModel()
+
+
+class SessionLoaderThread(QThread):
+    metadataLoaded = pyqtSignal(object)
+    chunkLoaded = pyqtSignal(object, float)
+    loadFailed = pyqtSignal(str)
+
+    def __init__(self, path, parent=None):
+        """
+        Parses a previous run (CSV log, segment log or columnar session) off the GUI thread and hands it over chunk by chunk.
+        """
+        super(SessionLoaderThread, self).__init__(parent)
+        self.path = path
+
+    def run(self):
+        from sessionLoader import openSessionReader
+        try:
+            reader = openSessionReader(self.path)
+            self.metadataLoaded.emit(reader.metadata)
+            for rows, fraction in reader.chunks():
+                if self.isInterruptionRequested():
+                    return
+                self.chunkLoaded.emit(rows, fraction)
+        except (OSError, ValueError) as e:
+            self.loadFailed.emit(str(e))
+
+
+class ExportThread(QThread):
+    progressed = pyqtSignal(int, int)
+    exportFailed = pyqtSignal(str)
+
+    def __init__(self, job, parent=None):
+        """
+        Runs an ExportJob (exportJob.py) off the GUI thread; acquisition and logging carry on meanwhile.
+        """
+        super(ExportThread, self).__init__(parent)
+        self.job = job
+        self.rowsWritten = None
+        self.elapsed = 0.0
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.rowsWritten = self.job.run(progress=self.progressed.emit, cancelled=self.isInterruptionRequested)
+        except (OSError, ValueError) as e:
+            self.exportFailed.emit(str(e))
+        self.elapsed = time.perf_counter() - start
+
+
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, port=ARDUINO_PORT, replayPath=None, replaySpeed=1.0, sampleRate=None,
+                 avgWindow=None, batchSamples=None, metricsPort=METRICS_PORT, streamPort=STREAM_PORT,
+                 attachRing=ATTACH_RING):
         super(MainWindow, self).__init__(parent)
 
-        self.arduinoSerial = None
-        self.currentAmbientTemperature = 0  
-        self.currentMassFlow = 0.0 
-        self.currentDesignHeatingPower = 0  
-        self.currentFlowTemperatureDesign = 0 
-        self.boostHeatPower = 6000 
-
-        self.t_sup_history = []  
-        self.t_ret_mea_history = []
-        self.t_ret_history = [] 
-
-        self.lastDACVoltage = '0.00'
-        self.lastSPtemp = '0.00'
-        self.lastFlowRate = '0.00'
-        self.lastreturnTemperature = '0.00'
-        
+        # Acquisition, modelling, commands and CSV logging run in the GUI-free engine. It is polled on the control
+        # loop thread and publishes on an event bus; each view drains its own queue on the GUI thread in updateDisplay
+        bus = EventBus()
+        self.logEvents = bus.subscribe('terminal', ['log'], LOG_QUEUE_DEPTH, 'drop-oldest')
+        self.readingEvents = bus.subscribe('labels', ['reading'], READING_QUEUE_DEPTH, 'drop-oldest')
+        self.sampleEvents = bus.subscribe('spreadsheet', ['sample'], SAMPLE_QUEUE_DEPTH, 'drop-oldest')
+        self.engine = ControllerEngine(port, BAUD_RATE, echoSerial=True, log=publishLog(bus), bus=bus)
+        self.engine.replayPath = replayPath  # Recorded session replayed instead of the Arduino (replaySource.py)
+        self.engine.replaySpeed = replaySpeed
+        # Arduino telemetry rate [Hz], averaging window and samples per line; None keeps 1 Hz, 4, 1
+        self.engine.setSampling(sampleRate, avgWindow, batchSamples)
+        # Telemetry poll, model step and setVoltage run every CONTROL_PERIOD on their own thread, whatever the event
+        # loop is doing; GUI calls into the engine take controlLoop.lock
+        self.controlLoop = ControlLoop(self.engine.poll, CONTROL_PERIOD, log=self.engine.log)
+        self.engine.controlLoop = self.controlLoop  # Its statistics are published with the engine's statsSnapshot
+        self.engine.database_path = SAMPLE_DATABASE
+        self.engine.logSegments = LOG_SEGMENTS
+
         self.hasBeenInitialized = False
 
         self.model_initialized = False
@@ -139,51 +252,134 @@ class MainWindow(QtWidgets.QMainWindow):
         self.initButton = None
         self.dateInput = None
         self.terminal = None
-        self.tableWidget = None
-        self.currentBuildingModel = None
+        self.tableView = None
 
         self.dacVoltageInput = QtWidgets.QLineEdit()
         self.targetTempInput = QtWidgets.QLineEdit()
         self.toleranceInput = QtWidgets.QLineEdit()
 
-        self.headers_written = False
-        self.simulated_time = datetime.now()  # Initialize simulated time
-        self.data_storage = [] 
-        self.csv_buffer = deque()  # Buffer for batch writing to CSV
-        self.batch_size = 100  # Define batch size for writing to CSV
-        
-        self.csv_file_path = None  
-        self.csv_lock_path = None 
-        self.csv_writer = None  # CSV writer object
+        # Most recent HISTORY_WINDOW_SAMPLES samples for the table and graphs; the full run is in the CSV log
+        self.sampleStore = SampleStore(HISTORY_WINDOW_SAMPLES)
+        self.displayStore = self.sampleStore  # Store shown by the table and graph: live samples or a history query
+        self.sessionLoader = None  # SessionLoaderThread while a previous run is being opened
+        self.openedStore = None
+        self.exportThread = None  # ExportThread while an export is running
+
+        self.pendingLabelText = {}  # Latest text per measurement label, applied on the next label frame
+        self.graphBackend = None  # Created the first time the graph tab is shown
+        self.canvas = None
     
         self.setWindowTitle("ArduinoUI")
         self.setWindowIcon(QIcon('C:/Users/hvaclab/Desktop/GUI Testing/icon.ico'))
+        self.renderScheduler = RenderScheduler(parent=self)
         self.setupUI()
-        applyOneDarkProTheme(QApplication.instance())
+
+        # Views are repainted by the scheduler, at most once per frame budget and only while visible
+        self.renderScheduler.register('terminal', self.terminalLog.flush, self.terminal, LABEL_FRAME_MS)
+        self.renderScheduler.register('labels', self.renderLabels, self.measurementGroup, LABEL_FRAME_MS)
+        self.renderScheduler.register('table', self.renderTable, self.tableView, TABLE_FRAME_MS)
+        self.renderScheduler.register('graph', self.updateGraph, self.graphTab, GRAPH_FRAME_MS)
+        self.renderScheduler.register('csvStatus', self.renderCSVStatus, self.csvStatusLabel, GRAPH_FRAME_MS)
+        self.tabWidget.currentChanged.connect(self.onTabChanged)
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.updateDisplay)
-        self.timer.start(100)
+        self.timer.start(LABEL_FRAME_MS)
 
         self.loadingTimer = QTimer(self)
         self.loadingTimer.timeout.connect(self.updateLoadingBar)
         self.loadingStep = 0  
 
-        self.graphUpdateTimer = QTimer(self)
-        self.graphUpdateTimer.timeout.connect(self.updateGraph)
-        self.graphUpdateTimer.start(1000)
-
-        self.initSerialConnection()
+        self.streamServer = None
+        self.metricsServer = None
+        self.ringReader = None  # SharedRingReader while the samples come from a separate acquisition process
+        self.ringNotifier = None
+        if attachRing is None:
+            self.initSerialConnection()
+            if streamPort is not None:
+                self.startStreamServer(streamPort)
+            self.controlLoop.start()
+            if metricsPort is not None:
+                self.startMetricsServer(metricsPort)
         self.updateButton.setEnabled(False)
         self.stopButton.setEnabled(False)
         self.virtualHeaterButton.setEnabled(True)
         self.dacVoltageInput.setEnabled(False)
         self.targetTempInput.setEnabled(False)
         self.toleranceInput.setEnabled(False)
+        if attachRing is not None:
+            self.attachSharedRing(attachRing)
+
+    def startMetricsServer(self, port):
+        from metricsServer import MetricsServer, engineMetrics, controlLoopMetrics, renderMetrics
+        try:
+            self.metricsServer = MetricsServer([engineMetrics(self.engine), controlLoopMetrics(self.controlLoop),
+                                                renderMetrics(self.renderScheduler)], port, METRICS_HOST)
+        except OSError as e:
+            self.logToTerminal(f"> Cannot serve metrics on {METRICS_HOST}:{port}: {e}", messageType="error")
+            return
+        self.metricsServer.start()
+        self.logToTerminal(f"> Metrics served at http://{METRICS_HOST}:{self.metricsServer.port}/metrics")
+
+    def startStreamServer(self, port):
+        from streamServer import StreamServer
+        try:
+            self.streamServer = StreamServer(self.engine.bus, port, STREAM_HOST)
+        except OSError as e:
+            self.logToTerminal(f"> Cannot stream samples on {STREAM_HOST}:{port}: {e}", messageType="error")
+            return
+        self.streamServer.start()
+        self.logToTerminal(f"> Samples streamed live at http://{STREAM_HOST}:{self.streamServer.port}/")
+
+    def attachSharedRing(self, name):
+        """
+        Shows the samples of a separate acquisition process (sharedRing.py). Control, logging, metrics and the live
+        stream run in that process, so a freeze or crash of this window does not affect them.
+        """
+        from sharedRing import SharedRingReader
+        for widget in (self.initButton, self.stopButton, self.updateButton, self.virtualHeaterButton,
+                       self.dacVoltageInput, self.targetTempInput, self.toleranceInput):
+            widget.setEnabled(False)
+        try:
+            self.ringReader = SharedRingReader(name)
+        except (FileNotFoundError, ValueError) as e:
+            self.logToTerminal(f"> Cannot attach to shared memory ring {name}: {e}", messageType="error")
+            return
+        # The writer sends a datagram after every sample; the timer in updateDisplay reads the ring as well
+        self.ringNotifier = QSocketNotifier(self.ringReader.fileno(), QSocketNotifier.Read, self)
+        self.ringNotifier.activated.connect(self.readSharedRing)
+        self.logToTerminal(f"> Attached to the acquisition process (pid {self.ringReader.writerPid}) through shared "
+                           f"memory ring {name}; control and logging run in that process.")
+        self.readSharedRing()
+
+    def readSharedRing(self):
+        """
+        Copies the samples appended by the acquisition process into the table and graph history.
+        """
+        segments = self.ringReader.read()
+        if not segments:
+            return
+        for rows in segments:
+            self.sampleStore.extend(rows)
+        latest = dict(zip(STORE_COLUMNS, segments[-1][-1]))
+        self.updateReadingLabels({
+            't_sup': latest['t_sup'],
+            't_ret_mea': latest['t_ret_mea'],
+            'dacVoltage': latest['dac_voltage'],
+            'model_return_temp': None if np.isnan(latest['t_ret_model']) else latest['t_ret_model'],
+            'flowRateLPS': latest['flow_rate']
+        })
+        if self.displayStore is self.sampleStore:
+            self.renderScheduler.markDirty('table', 'graph')
 
     def initSerialConnection(self): 
+        if self.engine.replayPath:
+            # The replay starts with "Initialize", once the building model and the CSV log are set up
+            self.logToTerminal(f"> Replay of {self.engine.replayPath} ready; click Initialize to start.")
+            return
         try:
-            self.arduinoSerial = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+            with self.controlLoop.lock:
+                self.engine.connect()
             self.logToTerminal("> Serial connection established. System initialized.")
         except serial.SerialException as e:
             self.logToTerminal(f"> Error connecting to Arduino: {e}", messageType="error")
@@ -192,7 +388,8 @@ class MainWindow(QtWidgets.QMainWindow):
     def retrySerialConnection(self, retries=5, delay=2):
         if retries > 0:
             try:
-                self.arduinoSerial = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+                with self.controlLoop.lock:
+                    self.engine.connect()
                 self.logToTerminal("> Serial connection re-established.")
             except serial.SerialException as e:
                 self.logToTerminal(f"> Retry {6 - retries} failed: {e}", messageType="error")
@@ -219,6 +416,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def setupUI(self):
         self.setFont(QFont("Verdana", 12))
         tabWidget = QTabWidget(self)
+        self.tabWidget = tabWidget
 
         # Set a larger window size to accommodate the graphs
         self.setMinimumSize(1800, 1000)
@@ -247,6 +445,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.measurementGroup = self.createMeasurementGroup()
         self.controlGroup = self.createControlGroup()
         self.terminal = self.createTerminal()
+        self.terminalLog = TerminalLog(self.terminal)
         controlsLayout.addWidget(self.measurementGroup)
         controlsLayout.addWidget(self.controlGroup)
         controlsLayout.addWidget(self.terminal, 1)
@@ -277,8 +476,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.dateInput = QLineEdit()
         self.dateInput.setPlaceholderText("Date (YYYY-MM-DD)")
         self.dateInput.setMaximumWidth(300)
-        self.exportCSVButton = QPushButton("Export to CSV")
-        self.exportCSVButton.clicked.connect(self.exportToCSV)
+        self.exportCSVButton = QPushButton("Export Data")
+        self.exportCSVButton.clicked.connect(self.exportData)
         self.exportCSVButton.setStyleSheet("font-size: 10pt;")
         
         headerLayout.addWidget(self.projectNumberInput)
@@ -286,23 +485,34 @@ class MainWindow(QtWidgets.QMainWindow):
         headerLayout.addWidget(self.dateInput)
         headerLayout.addWidget(self.exportCSVButton)
 
+        self.historyButton = QPushButton("Browse History")
+        self.historyButton.clicked.connect(self.browseHistory)
+        self.historyButton.setStyleSheet("font-size: 10pt;")
+        self.historyButton.setEnabled(SAMPLE_DATABASE is not None)
+        self.liveButton = QPushButton("Back to Live Data")
+        self.liveButton.clicked.connect(lambda: self.showStore(self.sampleStore))
+        self.liveButton.setStyleSheet("font-size: 10pt;")
+        self.liveButton.setVisible(False)
+        self.openSessionButton = QPushButton("Open Session")
+        self.openSessionButton.clicked.connect(self.openSession)
+        self.openSessionButton.setStyleSheet("font-size: 10pt;")
+        headerLayout.addWidget(self.openSessionButton)
+        headerLayout.addWidget(self.historyButton)
+        headerLayout.addWidget(self.liveButton)
+
         tableLayout.addLayout(headerLayout)
 
         # Adjust the table to include all necessary columns
-        self.tableWidget = QTableWidget()
-        self.tableWidget.setColumnCount(12)  # Updated count according to the new columns
-        self.tableWidget.setHorizontalHeaderLabels([
-            "Time", "Supply Temperature", "DAC Voltage", "SP Temperature", "Flow Rate", 
-            "Return Temperature", "Heat Flow HB", "Heat Flow BA", "Heat Flow HP", 
-            "HF Internal Gains", "HF Booster Heater", "Building Temperature"
-        ])
+        self.tableView = QTableView()
+        self.tableModel = SampleTableModel(self.sampleStore, self)
+        self.tableView.setModel(self.tableModel)
 
         # Adjust column widths to ensure proper display
         for i in range(12):
-            self.tableWidget.setColumnWidth(i, 151)  # Adjust width as needed
+            self.tableView.setColumnWidth(i, 151)  # Adjust width as needed
 
-        self.tableWidget.setStyleSheet("""
-            QTableWidget {
+        self.tableView.setStyleSheet("""
+            QTableView {
                 border: none;
                 background-color: #282C34;
                 color: #ABB2BF;
@@ -311,7 +521,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 selection-color: #ABB2BF;
                 font-size: 9pt;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
             QHeaderView::section {
@@ -341,7 +551,14 @@ class MainWindow(QtWidgets.QMainWindow):
         """)
 
 
-        tableLayout.addWidget(self.tableWidget)
+        tableLayout.addWidget(self.tableView)
+
+        # CSV writer health: queue depth and write latency of the background writer thread
+        self.csvStatusLabel = QLabel("CSV log: not open")
+        self.csvStatusLabel.setAlignment(Qt.AlignRight)
+        self.csvStatusLabel.setStyleSheet("color: #ABB2BF; font-size: 9pt;")
+        tableLayout.addWidget(self.csvStatusLabel)
+
         spreadsheetLayout.addWidget(tableFrame)
         spreadsheetTab.setLayout(spreadsheetLayout)
 
@@ -349,20 +566,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.graphLayout = QVBoxLayout()
         self.graphTab.setLayout(self.graphLayout)
 
-        self.figure = Figure(facecolor='#282C34')
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.setStyleSheet("QWidget {background-color: #282C34; color: #ABB2BF;}")
-
-        self.setupGraph()
-        self.updateGraph()
-
-        self.graphLayout.addWidget(self.canvas)
         tabWidget.addTab(controlsTab, "Controls Monitor")
         tabWidget.addTab(spreadsheetTab, "Data Spreadsheet")
         tabWidget.addTab(self.graphTab, "Temperature Graph")
         
         self.setCentralWidget(tabWidget)
-        applyOneDarkProTheme(QApplication.instance())
         
     def createMeasurementGroup(self):
         group = QGroupBox("Instructions and Real-time Measurements")
@@ -485,11 +693,9 @@ class MainWindow(QtWidgets.QMainWindow):
             ambient_temp = float(self.ambientTempInput.text())
             t_start_h = float(self.initialReturnTempInput.text())
 
-            if not -40 <= ambient_temp <= 40:
-                self.logToTerminal("Ambient temperature out of expected range: -40 to 40°C", messageType="warning")
-                return False
-            if not 10 <= t_start_h <= 90:
-                self.logToTerminal("Initial return temperature out of expected range: 10 to 90°C", messageType="warning")
+            message = validateModelSettings(ambient_temp, t_start_h)
+            if message:
+                self.logToTerminal(message, messageType="warning")
                 return False
 
             return True
@@ -549,7 +755,7 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             ambient_temp = float(self.ambientTempInput.text())
             default_q_design_e = float(self.designHeatingPowerInput.text())
-            q_design_e, _, _ = self.adjustDesignParameters(ambient_temp, default_q_design_e)
+            q_design_e, _, _ = adjustDesignParameters(ambient_temp, default_q_design_e)
             self.designHeatingPowerInput.setText(f"{q_design_e:.2f}")
         except ValueError:
             # Do not show an error message here to avoid interrupting user input
@@ -695,31 +901,12 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         try:
-            default_q_design_e = 11590  # Use this constant value for the calculations
-            q_design_e, t_flow_design, boostHeat = self.adjustDesignParameters(ambient_temp, default_q_design_e)
-            mass_flow = max(self.currentMassFlow / 3600.0, 0.001)  # Convert from l/h to kg/s, ensure non-zero
+            # Start the temperature histories with the initial return temperature
+            with self.controlLoop.lock:
+                q_design_e = self.engine.initializeBuildingModel(ambient_temp, float(self.initialReturnTempInput.text()))
 
             # Update the design heating power input in the UI
             self.designHeatingPowerInput.setText(f"{q_design_e:.2f}")
-
-            # Proper initialization of CalcParameters
-            calc_params = CalcParameters(
-                t_a=ambient_temp,
-                q_design=q_design_e,
-                t_flow_design=t_flow_design,
-                mass_flow=mass_flow,
-                boostHeat=boostHeat,
-                maxPowBooHea=self.boostHeatPower,
-                const_flow=True,  
-                tau_b=209125, 
-                tau_h=1957,
-                t_b=20 
-            )
-            self.currentBuildingModel = calc_params.createBuilding()
-            
-            # Initialize temperature histories
-            self.t_sup_history = []
-            self.t_ret_history = [float(self.initialReturnTempInput.text())]  # Start with the initial return temperature
             
             self.updateButton.setEnabled(True)
 
@@ -727,126 +914,88 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             self.logToTerminal(f"> Failed to initialize building model: {e}", messageType="error")
         
-    def tempToVoltage(self, temp):
-        min_temp = 0
-        max_temp = 100
-        min_voltage = 0
-        max_voltage = 5
-
-        voltage = ((temp - min_temp) / (max_temp - min_temp)) * (max_voltage - min_voltage) + min_voltage
-
-        correction_factor = 1
-        corrected_voltage = voltage * correction_factor
-
-        corrected_voltage = max(min(corrected_voltage, max_voltage), min_voltage)
-
-        return corrected_voltage
-
-    def adjustDesignParameters(self, ambient_temp, default_q_design_e=11590):
-        heat_pump_sizes = {
-            -10: (1.0, 11590, 55),
-            -7: (0.885, 11590, 52),
-            2: (0.538, 11590, 42),
-            7: (0.346, 11590, 36),
-            12: (0.154, 11590, 30)
-        }
-
-        closest_temp = None
-        for temp in sorted(heat_pump_sizes.keys()):
-            if ambient_temp >= temp:
-                closest_temp = temp
-            else:
-                break
-
-        if closest_temp is None:
-            closest_temp = min(heat_pump_sizes.keys())
-
-        partLoadR, base_q_design, t_flow_design = heat_pump_sizes[closest_temp]
-        new_q_design_e = partLoadR * base_q_design  # Adjust q_design based on part load ratio
-        boostHeat = ambient_temp <= -10
-
-        print(f"Ambient Temp: {ambient_temp}, Part Load Ratio: {partLoadR}, Design Heating Power: {new_q_design_e}, Target Flow Temp: {t_flow_design}")
-
-        return new_q_design_e, t_flow_design, boostHeat
-
     def updateDisplay(self):
-        try:
-            if self.arduinoSerial and self.arduinoSerial.in_waiting:
-                serialData = self.arduinoSerial.readline().decode('utf-8').strip()
-                print(f"Received serial data: {serialData}")
-
-                if ':' in serialData:
-                    dataFields = serialData.split(',')
-                    dataDict = {}
-                    for field in dataFields:
-                        if ':' in field:
-                            key, value = field.split(':')
-                            dataDict[key.strip()] = value.strip()
-
-                    if 'STemp' in dataDict:
-                        try:
-                            t_sup = float(dataDict['STemp'])
-                            self.updateBuildingModel(t_sup)
-                            self.temperatureLabel.setText(f"{t_sup:.2f}°C")
-                        except ValueError as e:
-                            print(f"Error converting temperature: {e}")
-
-                    if 'RTemp' in dataDict:
-                        try:
-                            t_ret_mea = float(dataDict['RTemp'])
-                            self.t_ret_mea_history.append(t_ret_mea)
-                            self.returnTemperatureLabel.setText(f"{t_ret_mea:.2f}°C")
-                        except ValueError as e:
-                            print(f"Error converting return temperature: {e}")
-
-                    dacVoltage = dataDict.get('DACVolt', self.lastDACVoltage)
-                    self.dacVoltageLabel.setText(f"{dacVoltage} V")
-                    self.lastDACVoltage = dacVoltage
-                    
-                    if self.currentBuildingModel:
-                        model_return_temp = self.currentBuildingModel.t_ret
-                        if model_return_temp >= 0:
-                            self.SPVoltageLabel.setText(f"{model_return_temp:.2f} °C")
-                            self.lastSPtemp = model_return_temp
-                        else:
-                            self.SPVoltageLabel.setText("")
-                    else:
-                        model_return_temp = None  # Ensure model_return_temp is always defined
-
-                    flowRate = dataDict.get('FlowRate', self.lastFlowRate)
-                    self.flowRateLabel.setText(f"{flowRate} L/s")
-                    self.lastFlowRate = flowRate
-
-                    if 'FlowRate' in dataDict:
-                        flowRateLPS = float(dataDict['FlowRate'])
-                        self.currentMassFlow = flowRateLPS * 3600
-                        self.flowRateLabel.setText(f"{flowRateLPS:.3f} L/s")
-
-                        if self.currentBuildingModel:
-                            q_hb = self.currentBuildingModel.q_dot_hb
-                            q_ba = self.currentBuildingModel.q_dot_ba
-                            q_hp = self.currentBuildingModel.q_dot_hp
-                            q_int = self.currentBuildingModel.q_dot_int
-                            q_bh = self.currentBuildingModel.q_dot_bh
-                            t_b = self.currentBuildingModel.MassB.T
-
-                        if self.currentBuildingModel:
-                            self.addToSpreadsheet(
-                                self.simulated_time.strftime('%H:%M:%S'), 
-                                dataDict['STemp'], 
-                                dacVoltage, 
-                                model_return_temp if model_return_temp is not None else "N/A", 
-                                flowRate, 
-                                dataDict.get('RTemp', 'N/A'), 
-                                q_hb, q_ba, q_hp, q_int, q_bh, t_b
-                            )
-
-                        self.simulated_time += timedelta(seconds=1)  # Increment simulated time by one second
-
-                    self.updateGraph()
+        """
+        Handles the log messages, readings and sample records published by the engine on the control loop thread.
+        """
+        for event in self.logEvents.drain():
+            self.logToTerminal(event.message, event.messageType)
+        for event in self.readingEvents.drain():
+            self.updateReadingLabels(event.readings)
+        for event in self.sampleEvents.drain():
+            self.addToSpreadsheet(event.record, event.timestamp)
+        if self.ringReader is not None:
+            self.readSharedRing()
+            self.renderScheduler.markDirty('csvStatus')
+        if (self.engine.csv_writer or self.engine.ackTracker.commandsSent or self.engine.sequenceTracker.received
+                or self.controlLoop.iterations):
+            self.renderScheduler.markDirty('csvStatus')
+
+    def renderCSVStatus(self):
+        if self.ringReader is not None:
+            from sharedRing import formatRingStats
+            self.csvStatusLabel.setText(f"Acquisition process: {formatRingStats(self.ringReader.stats())}")
+            return
+        snapshot = self.engine.statsSnapshot  # Published by the control loop thread; read without its lock
+        stats, commands = snapshot['csv'], snapshot['commands']
+        samples, latency, control = snapshot['samples'], snapshot['latency'], snapshot['control']
+        if stats is None:
+            text = "CSV log: not open"
+        elif stats['error']:
+            text = f"CSV log: write failed ({stats['error']})"
+        else:
+            text = (f"CSV log: {stats['rowsWritten']} rows written, {stats['queueDepth']} queued, "
+                    f"write latency {stats['lastWriteLatency'] * 1000:.1f} ms (max {stats['maxWriteLatency'] * 1000:.1f} ms)")
+        if commands['commandsSent']:
+            text += (f" | Commands: {commands['acknowledged']} acknowledged, {commands['timedOut']} lost, "
+                     f"round trip {commands['p50RTT'] * 1000:.1f} ms (p99 {commands['p99RTT'] * 1000:.1f} ms)")
+        if samples['received']:
+            text += (f" | Samples: {samples['received']} received, {samples['lost']} lost "
+                     f"({samples['lossRate'] * 100:.2f}%) in {samples['gaps']} gaps, {samples['duplicates']} duplicates")
+        if control and control['iterations']:
+            text += (f" | Control loop: compute {control['p50ComputeTime'] * 1000:.1f} ms "
+                     f"(p99 {control['p99ComputeTime'] * 1000:.1f} ms), late {control['p99Lateness'] * 1000:.1f} ms "
+                     f"p99, {control['missed']} missed deadlines")
+        if latency['count']:
+            text += (f" | Sample to DAC: {latency['p50'] * 1000:.2f} ms (p99 {latency['p99'] * 1000:.2f} ms, "
+                     f"p999 {latency['p999'] * 1000:.2f} ms)")
+        # Read without the queues' locks, which the control loop thread takes to publish
+        dropped = {queue['name']: queue['dropped'] for queue in self.engine.bus.counters() if queue['dropped']}
+        if dropped:
+            text += " | Dropped events: " + ", ".join(f"{name} {count}" for name, count in dropped.items())
+        if self.streamServer is not None:
+            stream = self.streamServer.stats()
+            text += f" | Live stream: {stream['subscribers']} viewers ({stream['decimated']} decimated)"
+        self.csvStatusLabel.setText(text)
+
+    def updateReadingLabels(self, readings):
+        """
+        Shows the latest telemetry readings reported by the engine in the measurement labels.
+        """
+        if 't_sup' in readings:
+            self.setLabelText(self.temperatureLabel, f"{readings['t_sup']:.2f}°C")
+        if 't_ret_mea' in readings:
+            self.setLabelText(self.returnTemperatureLabel, f"{readings['t_ret_mea']:.2f}°C")
+        self.setLabelText(self.dacVoltageLabel, f"{readings['dacVoltage']} V")
+        if 'model_return_temp' in readings:
+            model_return_temp = readings['model_return_temp']
+            self.setLabelText(self.SPVoltageLabel, f"{model_return_temp:.2f} °C" if model_return_temp is not None else "")
+        if 'flowRateLPS' in readings:
+            self.setLabelText(self.flowRateLabel, f"{readings['flowRateLPS']:.3f} L/s")
+        else:
+            self.setLabelText(self.flowRateLabel, f"{readings['flowRate']} L/s")
 
-        except serial.SerialException as e:
-            self.logToTerminal(f"> Error reading from serial: {e}", messageType="error")
+    def setLabelText(self, label, text):
+        """
+        Queues a measurement label update; only the latest text per label is painted on the next label frame.
+        """
+        self.pendingLabelText[label] = text
+        self.renderScheduler.markDirty('labels')
+
+    def renderLabels(self):
+        for label, text in self.pendingLabelText.items():
+            label.setText(text)
+        self.pendingLabelText.clear()
             
     def updateSettings(self):
         """
@@ -860,112 +1009,38 @@ class MainWindow(QtWidgets.QMainWindow):
 
         try:
             ambient_temp = float(self.ambientTempInput.text())
-            default_q_design_e = 11590  # Use this constant value for the calculations
-            q_design_e, t_flow_design, boostHeat = self.adjustDesignParameters(ambient_temp, default_q_design_e)
-            mass_flow = max(self.currentMassFlow / 3600.0, 0.001)  # Convert from L/h to kg/s to ensure non-zero mass flow
+
+            # Recalculate parameters and update the building model
+            with self.controlLoop.lock:
+                q_design_e = self.engine.updateSettings(ambient_temp)
 
             # Update the design heating power input in the UI
             self.designHeatingPowerInput.setText(f"{q_design_e:.2f}")
 
-            # Recalculate parameters and update the building model
-            calc_params = CalcParameters(
-                t_a=ambient_temp,
-                q_design=q_design_e,
-                t_flow_design=t_flow_design,
-                mass_flow=mass_flow,
-                boostHeat=boostHeat,
-                maxPowBooHea=self.boostHeatPower,
-                const_flow=True,  
-                tau_b=209125, 
-                tau_h=1957,
-                t_b=20 
-            )
-            self.currentBuildingModel = calc_params.createBuilding()
-
             # Log updated settings
             self.logToTerminal("> Settings updated successfully.", messageType="info")
         except Exception as e:
             self.logToTerminal(f"> Failed to update settings: {e}", messageType="error")
 
-
-    def updateBuildingModel(self, new_t_sup, retry_count=3):
-        if not hasattr(self, 't_sup_history'):
-            self.t_sup_history = []
-        if not hasattr(self, 't_ret_history'):
-            self.t_ret_history = []
-        if not hasattr(self, 't_ret_mea_history'):
-            self.t_ret_mea_history = []
-
-        self.t_sup_history.append(new_t_sup)
-
-        # Use the latest measured return temperature if available
-        last_t_ret_mea = self.t_ret_mea_history[-1] if self.t_ret_mea_history else new_t_sup - 5
-
-        if self.currentBuildingModel is None:
-            return
-
-        try:
-            mass_flow = max(self.currentMassFlow / 3600.0, 0.001)
-
-            self.currentBuildingModel.doStep(
-                t_sup=new_t_sup, 
-                t_ret_mea=last_t_ret_mea, 
-                m_dot=mass_flow, 
-                stepSize=1, 
-                q_dot_int=0 
-            )
-
-            new_t_ret = self.currentBuildingModel.t_ret
-
-            if new_t_ret < 0:
-                raise ValueError(f"Calculated return temperature is negative ({new_t_ret:.2f}°C).")
-
-            self.t_ret_history.append(new_t_ret)
-
-            dac_voltage = self.tempToVoltage(new_t_ret)
-            self.sendSerialCommand(f"setVoltage {dac_voltage:.2f}")
-
-        except Exception as e:
-            self.logToTerminal(f"Failed to update building model: {e}", messageType="error")
-            if retry_count > 0:
-                self.logToTerminal(f"Retrying building model initialization... {retry_count} retries left", messageType="warning")
-                # Avoid prompting for CSV save again during retries
-                self.initializeBuildingModel()
-                self.initButtonClicked(retry_count - 1)
-            else:
-                self.logToTerminal("Exceeded maximum retries for building model initialization.", messageType="error")
-            
     def sendSerialCommand(self, command):
-        if self.arduinoSerial and self.arduinoSerial.isOpen():
-            self.arduinoSerial.write((command + '\n').encode()) 
-        else:
-            self.logToTerminal("> Error: Serial connection not established.", messageType="error")
+        with self.controlLoop.lock:
+            self.engine.sendSerialCommand(command)
 
     def sendArduinoCommand(self, commandType, value=None):
-        if commandType in ['setVoltage', 'setTemp', 'setTolerance']:
-            if value is not None:
-                command = f"{commandType} {value}"
-            else:
-                print(f"Value required for command type: {commandType}")
-                return
-        elif commandType in ['activateVirtualHeater']:
-            command = commandType
-        else:
-            print(f"Unknown command type: {commandType}")
-            return
-        
-        self.sendSerialCommand(command)
+        with self.controlLoop.lock:
+            self.engine.sendArduinoCommand(commandType, value)
 
     def initButtonClicked(self, retry_count):
         """
         Handles the initialization button click event.
 
-        This function establishes the serial connection, starts the update timer,
+        This function establishes the serial connection, resumes the control loop,
         initializes the building model, and enables relevant UI components.
         """
-        if self.arduinoSerial is None or not self.arduinoSerial.isOpen():
+        if not self.engine.isConnected():
             try:
-                self.arduinoSerial = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+                with self.controlLoop.lock:
+                    self.engine.connect()
                 if self.hasBeenInitialized:
                     self.logToTerminal("> Serial connection re-established. System re-initialized.")
                 else:
@@ -975,8 +1050,8 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.logToTerminal(f"> Error connecting to Arduino: {e}", messageType="error")
                 return
 
-        if not self.timer.isActive():
-            self.timer.start(100)
+        if not self.controlLoop.isActive():
+            self.controlLoop.resume()
 
         self.stopButton.setEnabled(True)
         self.virtualHeaterButton.setEnabled(True)
@@ -985,7 +1060,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.toleranceInput.setEnabled(True)
 
         # Check if the CSV file path is already set before calling saveCSVFileDialog
-        if not self.csv_file_path:
+        if not self.engine.csv_file_path:
             self.saveCSVFileDialog()
 
         self.initializeBuildingModel()
@@ -997,11 +1072,11 @@ class MainWindow(QtWidgets.QMainWindow):
         dacVoltage = 0
         self.sendSerialCommand(f"setVoltage {dacVoltage}")
 
-        if self.timer.isActive():
-            self.timer.stop()
+        self.controlLoop.pause()
 
-        if self.arduinoSerial and self.arduinoSerial.isOpen():
-            self.arduinoSerial.close()
+        with self.controlLoop.lock:
+            disconnected = self.engine.disconnect()
+        if disconnected:
             self.logToTerminal("> Serial connection closed.")
 
         self.updateButton.setEnabled(False)
@@ -1024,16 +1099,11 @@ class MainWindow(QtWidgets.QMainWindow):
         return terminal
 
     def logToTerminal(self, message, messageType="info"):
-        messageStyles = {
-            "info": "color: #FFFFFF;",
-            "warning": "color: #E5C07B;",
-            "error": "color: #E06C75;",
-            "update": "color: #61AFEF;",
-            "init": "color: #98C379;"
-        }
-        style = messageStyles.get(messageType, "color: #ABB2BF;")
-        formattedMessage = f"<p style='{style}'>{message}</p>"
-        self.terminal.appendHtml(formattedMessage)
+        """
+        Queues a message for the terminal; queued messages are written in one batch on the next terminal frame.
+        """
+        self.terminalLog.log(message, messageType)
+        self.renderScheduler.markDirty('terminal')
 
     def saveCSVFileDialog(self):
         options = QFileDialog.Options()
@@ -1045,285 +1115,236 @@ class MainWindow(QtWidgets.QMainWindow):
             filePath += '.csv'
 
         if filePath:
-            self.setCSVFilePath(filePath)
+            with self.controlLoop.lock:
+                self.engine.setCSVFilePath(filePath)
             self.logToTerminal(f"> CSV file set to save at: {filePath}")
             self.initCSVFile()  # Initialize CSV file with headers
         else:
             self.logToTerminal("> CSV file save canceled.", messageType="warning")
 
-    def setCSVFilePath(self, file_path):
-        self.csv_file_path = file_path
-        self.csv_lock_path = file_path + ".lock"
-        self.headers_written = False
-
     def initCSVFile(self):
-        if not self.csv_file_path:
-            self.logToTerminal("CSV file path not set.", messageType="error")
+        with self.controlLoop.lock:
+            self.engine.initCSVFile(self.csvMetadata())
+
+    def csvMetadata(self):
+        return [
+            ('Project Number', self.projectNumberInput.text()),
+            ('Client Name', self.clientNameInput.text()),
+            ('Date', self.dateInput.text())
+        ]
+
+    def addToSpreadsheet(self, new_entry, timestamp):
+        """
+        Stores a sample record logged by the engine; the table and graph pick it up on their next frame.
+        """
+        self.sampleStore.append(timestamp, new_entry)
+        if self.displayStore is self.sampleStore:
+            self.renderScheduler.markDirty('table', 'graph')
+
+    def browseHistory(self):
+        """
+        Queries the sample database and shows the result in the table and graph until "Back to Live Data".
+        """
+        from historyBrowser import HistoryDialog
+
+        if self.engine.csv_writer:
+            with self.controlLoop.lock:
+                requests = self.engine.requestCSVFlush()  # Include the samples still queued for the database
+            self.engine.waitForCSVFlush(requests)  # Without the lock, so the control loop keeps running
+        dialog = HistoryDialog(SAMPLE_DATABASE, HISTORY_WINDOW_SAMPLES, self)
+        if dialog.exec_() != QtWidgets.QDialog.Accepted:
             return
+        historyStore = SampleStore(max(len(dialog.rows), 1))
+        historyStore.extend(dialog.rows)
+        self.showStore(historyStore)
+        self.logToTerminal(f"> Showing {len(historyStore)} samples from history: {dialog.description}")
 
-        # Lock the file and open it in append mode
-        self.csv_lock = FileLock(self.csv_lock_path)
-        self.csv_lock.acquire()
-        self.csv_file = open(self.csv_file_path, 'a', newline='', encoding='utf-8')
-        self.csv_writer = csv.writer(self.csv_file)
-
-        # Write headers if not already written
-        if not self.headers_written:
-            self.csv_writer.writerow(['Project Number', self.projectNumberInput.text()])
-            self.csv_writer.writerow(['Client Name', self.clientNameInput.text()])
-            self.csv_writer.writerow(['Date', self.dateInput.text()])
-            self.csv_writer.writerow([])  # Empty row to separate the metadata from the column headers
-            self.csv_writer.writerow([
-                'Time', 'Supply Temperature', 'DAC Voltage', 'SP Temperature', 'Flow Rate',
-                'Return Temperature', 'Heat Flow HB', 'Heat Flow BA', 'Heat Flow HP',
-                'HF Internal Gains', 'HF Booster Heater', 'Building Temperature'
-            ])
-            self.headers_written = True
-
-    def addToSpreadsheet(self, timestamp, temperature, dacVoltage, model_return_temp, flowRate, returnTemperature, q_hb, q_ba, q_hp, q_int, q_bh, t_b):
-        try:
-            temperature = float(temperature) if temperature != 'N/A' else None
-            dacVoltage = float(dacVoltage) if dacVoltage != 'N/A' else None
-            model_return_temp = float(model_return_temp) if model_return_temp != 'N/A' else None
-            flowRate = float(flowRate) if flowRate != 'N/A' else None
-            returnTemperature = float(returnTemperature) if returnTemperature != 'N/A' else None
-            q_hb = float(q_hb) if q_hb != 'N/A' else None
-            q_ba = float(q_ba) if q_ba != 'N/A' else None
-            q_hp = float(q_hp) if q_hp != 'N/A' else None
-            q_int = float(q_int) if q_int != 'N/A' else None
-            q_bh = float(q_bh) if q_bh != 'N/A' else None
-            t_b = float(t_b) if t_b != 'N/A' else None
-
-            new_entry = [
-                timestamp, temperature, dacVoltage, model_return_temp, flowRate, returnTemperature,
-                q_hb, q_ba, q_hp, q_int, q_bh, t_b
-            ]
-
-            self.data_storage.append(new_entry)
-
-            self.tableWidget.setRowCount(len(self.data_storage))
-            for row, data in enumerate(self.data_storage):
-                for col, value in enumerate(data):
-                    if col == 0:  # Time column
-                        item = QTableWidgetItem(value)
-                    else:
-                        item = QTableWidgetItem(f"{float(value):.3f}" if value is not None else 'N/A')
-                    self.tableWidget.setItem(row, col, item)
-
-            if self.csv_file_path:
-                self.csv_buffer.append(new_entry)
-                if len(self.csv_buffer) >= self.batch_size:
-                    self.flushCSVBuffer()
-
-            last_row_index = self.tableWidget.rowCount() - 1
-            last_item = self.tableWidget.item(last_row_index, 0)
-            if last_item:
-                self.tableWidget.scrollToItem(last_item)
-
-        except ValueError as e:
-            self.logToTerminal(f"Error processing data for spreadsheet: {e}", messageType="error")
-
-    def flushCSVBuffer(self):
-        if not self.csv_file_path:
-            self.logToTerminal("CSV file path not set.", messageType="error")
+    def openSession(self):
+        """
+        Loads a previous run into the table and graph on a background thread, until "Back to Live Data".
+        """
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filePath, _ = QFileDialog.getOpenFileName(
+            self, "Open Session", "", "Sessions (*.csv header.json index.json);;All Files (*)", options=options)
+        if not filePath or self.sessionLoader is not None:
             return
 
-        if not self.csv_lock_path:
-            self.logToTerminal("CSV lock file path not set.", messageType="error")
+        self.openedStore = None
+        self.sessionLoadStart = time.perf_counter()
+        self.sessionLoader = SessionLoaderThread(filePath, self)
+        self.sessionLoader.metadataLoaded.connect(self.onSessionMetadata)
+        self.sessionLoader.chunkLoaded.connect(self.onSessionChunk)
+        self.sessionLoader.loadFailed.connect(
+            lambda message: self.logToTerminal(f"> Failed to open session: {message}", messageType="error"))
+        self.sessionLoader.finished.connect(self.onSessionLoaded)
+        self.openSessionButton.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.setVisible(True)
+        self.logToTerminal(f"> Opening session {filePath}...")
+        self.sessionLoader.start()
+
+    def onSessionMetadata(self, metadata):
+        for name, value in metadata:
+            self.logToTerminal(f"> {name}: {value}")
+
+    def onSessionChunk(self, rows, fraction):
+        from sessionLoader import OPEN_SESSION_MAX_SAMPLES
+
+        if self.openedStore is None:
+            # Sized from the first chunk's share of the file
+            estimate = int(len(rows) / max(fraction, 1e-6) * 1.05) + 1
+            self.openedStore = SampleStore(min(max(estimate, len(rows)), OPEN_SESSION_MAX_SAMPLES))
+            self.showStore(self.openedStore)
+        self.openedStore.extend(rows)
+        self.progressBar.setValue(int(fraction * 100))
+        self.renderScheduler.markDirty('table', 'graph')
+
+    def onSessionLoaded(self):
+        self.progressBar.setVisible(False)
+        self.openSessionButton.setEnabled(True)
+        store = self.openedStore
+        if store is not None:
+            elapsed = time.perf_counter() - self.sessionLoadStart
+            self.logToTerminal(f"> Session opened: {store.buffer.totalAppended} samples in {elapsed:.1f} s")
+            if store.buffer.totalAppended > len(store):
+                self.logToTerminal(f"> Only the last {len(store)} samples are shown.", messageType="warning")
+        self.sessionLoader = None
+
+    def showStore(self, store):
+        self.displayStore = store
+        self.tableModel.store = store
+        self.liveButton.setVisible(store is not self.sampleStore)
+        self.renderScheduler.markDirty('table', 'graph')
+        self.renderScheduler.renderDue(force=True)
+
+    def renderTable(self):
+        self.tableModel.refresh()
+        self.tableView.scrollToBottom()
+
+    def exportData(self):
+        """
+        Exports the recorded run (or the opened session or history query shown) on a background thread.
+        The format follows the file name: .csv, .csv.zst (zstd-compressed CSV) or .session (columnar session).
+        """
+        from exportJob import ExportJob, EXPORT_FORMATS, exportFormatFor
+
+        if self.exportThread is not None:
+            self.logToTerminal("> An export is already running.", messageType="warning")
             return
 
-        if self.csv_writer:
-            while self.csv_buffer:
-                self.csv_writer.writerow(self.csv_buffer.popleft())
-            self.csv_file.flush()
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filters = [fileFilter for _, fileFilter in EXPORT_FORMATS]
+        filePath, selectedFilter = QFileDialog.getSaveFileName(
+            self, "Export Data", "", ";;".join(filters + ["All Files (*)"]), options=options)
+        if not filePath:
+            self.logToTerminal("> Export canceled.", messageType="warning")
+            return
 
-    def exportToCSV(self):
-        if not self.csv_file_path:
-            self.saveCSVFileDialog()
+        # Ensure the file has the extension of the selected format, unless it already has a supported one
+        if not any(filePath.endswith(suffix) for suffix, _ in EXPORT_FORMATS):
+            filePath += next((suffix for suffix, fileFilter in EXPORT_FORMATS if fileFilter == selectedFilter),
+                             exportFormatFor(filePath))
+        if filePath in (self.engine.csv_file_path, self.engine.session_path):
+            self.logToTerminal("> Cannot export over the log being recorded.", messageType="error")
+            return
 
-        if self.csv_file_path:
-            try:
-                self.finalizeLogging()
-                if not self.headers_written:
-                    self.csv_writer.writerow(['Project Number', self.projectNumberInput.text()])
-                    self.csv_writer.writerow(['Client Name', self.clientNameInput.text()])
-                    self.csv_writer.writerow(['Date', self.dateInput.text()])
-                    self.csv_writer.writerow([])
-                    headers = [self.tableWidget.horizontalHeaderItem(i).text() for i in range(self.tableWidget.columnCount())]
-                    self.csv_writer.writerow(headers)
-                    self.headers_written = True
-
-                self.flushCSVBuffer()
-                self.logToTerminal("> Data exported to CSV successfully.")
-            except Exception as e:
-                self.logToTerminal(f"> Failed to export data to CSV: {e}", messageType="error")
-        else:
-            self.logToTerminal("> CSV export canceled.", messageType="warning")
+        try:
+            source = self.exportSource()
+        except (OSError, ValueError) as e:
+            self.logToTerminal(f"> Failed to export data: {e}", messageType="error")
+            return
+
+        self.exportThread = ExportThread(ExportJob(source, filePath), self)
+        self.exportThread.progressed.connect(
+            lambda rowsWritten, totalRows: self.progressBar.setValue(int(rowsWritten * 100 / max(totalRows, 1))))
+        self.exportThread.exportFailed.connect(
+            lambda message: self.logToTerminal(f"> Failed to export data: {message}", messageType="error"))
+        self.exportThread.finished.connect(self.onExportFinished)
+        self.exportCSVButton.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.setVisible(True)
+        self.logToTerminal(f"> Exporting {len(source)} samples to {filePath}...")
+        self.exportThread.start()
+
+    def exportSource(self):
+        """
+        Rows to export: the columnar session being recorded when live data is shown (flushed first, so it holds
+        every sample up to now), otherwise a copy of the samples shown.
+        """
+        from exportJob import RowSnapshot
+
+        if self.displayStore is self.sampleStore and self.engine.session_writer:
+            from sessionStore import Session
+            with self.controlLoop.lock:
+                requests = self.engine.requestCSVFlush()
+            self.engine.waitForCSVFlush(requests)
+            return Session(self.engine.session_path)
+        return RowSnapshot(self.displayStore.rows(), self.csvMetadata(), SAMPLE_COLUMNS, self.engine.modelParameters)
+
+    def onExportFinished(self):
+        thread = self.exportThread
+        self.exportThread = None
+        self.exportCSVButton.setEnabled(True)
+        self.progressBar.setVisible(False)
+        if thread.rowsWritten is not None:
+            self.logToTerminal(f"> Exported {thread.rowsWritten} samples to {thread.job.path} "
+                               f"in {thread.elapsed:.1f} s.")
+
+    def onTabChanged(self, index):
+        # The graph is built the first time its tab is shown, even before any sample has arrived
+        if self.graphBackend is None and self.tabWidget.widget(index) is self.graphTab:
+            self.renderScheduler.markDirty('graph')
+        self.renderScheduler.renderDue(force=True)
 
     def setupGraph(self):
         """
-        Sets up the graph layout and axes.
+        Creates the configured graph backend and adds its widget to the graph tab.
+        The plotting library is only imported here, on first use.
         """
-        # Increase the figure size (width, height)
-        self.figure = Figure(figsize=(10, 18), facecolor='#282C34')
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.setStyleSheet("QWidget {background-color: #282C34; color: #ABB2BF;}")
-
-        # Create a 3-row subplot layout for different graphs with larger height and increased spacing
-        gs = self.figure.add_gridspec(3, 1, height_ratios=[1, 1, 1], hspace=0.15, wspace=0.2)
-
-        self.ax_temp = self.figure.add_subplot(gs[0, 0])  # Temperature graph
-        self.ax_heat_flow = self.figure.add_subplot(gs[1, 0])  # Heat flow graph
-        self.ax_building_temp = self.figure.add_subplot(gs[2, 0])  # Building temperature graph
-
-        # Temperature graph
-        self.ax_temp.set_title('Temperature Profile Over Time', color='#ABB2BF')
-        self.ax_temp.set_xlabel('Time [hours]', color='#ABB2BF')
-        self.ax_temp.set_ylabel('Temperature [°C]', color='#ABB2BF')
-        self.ax_temp.tick_params(axis='x', colors='white')
-        self.ax_temp.tick_params(axis='y', colors='white')
-        self.ax_temp.grid(True, color='#4B4B4B')
-
-        # Heat flow graph
-        self.ax_heat_flow.set_title('Heat Flow Profile Over Time', color='#ABB2BF')
-        self.ax_heat_flow.set_xlabel('Time [hours]', color='#ABB2BF')
-        self.ax_heat_flow.set_ylabel('Heat Flow [W]', color='#ABB2BF')
-        self.ax_heat_flow.tick_params(axis='x', colors='white')
-        self.ax_heat_flow.tick_params(axis='y', colors='white')
-        self.ax_heat_flow.grid(True, color='#4B4B4B')
-
-        # Building temperature graph
-        self.ax_building_temp.set_title('Building Temperature Over Time', color='#ABB2BF')
-        self.ax_building_temp.set_xlabel('Time [hours]', color='#ABB2BF')
-        self.ax_building_temp.set_ylabel('Temperature [°C]', color='#ABB2BF')
-        self.ax_building_temp.tick_params(axis='x', colors='white')
-        self.ax_building_temp.tick_params(axis='y', colors='white')
-        self.ax_building_temp.grid(True, color='#4B4B4B')
-
-        # Adding the canvas to the layout
+        from graphBackends import createGraphBackend
+
+        self.graphBackend = createGraphBackend(GRAPH_BACKEND)
+        self.canvas = self.graphBackend.widget
         self.graphLayout.addWidget(self.canvas)
+        self.renderScheduler.setFrameBudget('graph', self.graphBackend.frameBudgetMs)
     
     def updateGraph(self):
         """
-        Update the graphs with new data from the table widget.
+        Update the graphs with the samples of the displayed store (live samples or a history query).
         """
-        # Clear previous plots
-        self.ax_temp.clear()
-        self.ax_heat_flow.clear()
-        self.ax_building_temp.clear()
-
-        # Set font properties for bold and larger text
-        title_font = {'size': 20, 'weight': 'bold'}
-        label_font = {'size': 12}
-        tick_font = {'size': 10}
-        legend_font = {'size': 10}
-
-        # Set titles and labels with updated styles
-        self.ax_temp.set_title('Two Mass Model Graph Outputs', color='white', fontdict=title_font)
-        self.ax_temp.set_ylabel('Temperature [°C]', color='white', fontdict=label_font)
-        self.ax_temp.tick_params(axis='x', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_temp.tick_params(axis='y', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_temp.grid(True, color='#ABB2BF')
-
-        self.ax_heat_flow.set_ylabel('Heat Flow [W]', color='white', fontdict=label_font)
-        self.ax_heat_flow.tick_params(axis='x', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_heat_flow.tick_params(axis='y', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_heat_flow.grid(True, color='#ABB2BF')
-
-        self.ax_building_temp.set_xlabel('Time [hours]', color='white', fontdict=label_font)
-        self.ax_building_temp.set_ylabel('Temperature [°C]', color='white', fontdict=label_font)
-        self.ax_building_temp.tick_params(axis='x', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_building_temp.tick_params(axis='y', colors='white', labelsize=tick_font['size'], width=2)
-        self.ax_building_temp.grid(True, color='#ABB2BF')
-
-        # Initialize data lists
-        time_data, t_sup_data, t_ret_mea_data, t_b_data = [], [], [], []
-        q_flow_hp_data, q_flow_hb_data, q_flow_ba_data, q_flow_int_data, q_flow_bh_data = [], [], [], [], []
-
-        # Process each row in the table widget
-        for row in range(self.tableWidget.rowCount()):
-            time_item = self.tableWidget.item(row, 0)
-            t_sup_item = self.tableWidget.item(row, 1)
-            model_return_temp_item = self.tableWidget.item(row, 3)
-            t_ret_mea_item = self.tableWidget.item(row, 5)
-            q_flow_hb_item = self.tableWidget.item(row, 6)
-            q_flow_ba_item = self.tableWidget.item(row, 7)
-            q_flow_hp_item = self.tableWidget.item(row, 8)
-            q_flow_int_item = self.tableWidget.item(row, 9)
-            q_flow_bh_item = self.tableWidget.item(row, 10)
-            t_b_item = self.tableWidget.item(row, 11)
-
-            # Ensure items are not None before accessing text
-            if all(item is not None for item in [time_item, t_sup_item, model_return_temp_item, t_ret_mea_item, q_flow_hb_item, q_flow_ba_item, q_flow_hp_item, q_flow_int_item, q_flow_bh_item, t_b_item]):
-                try:
-                    time_str = time_item.text()
-                    # Ensure the time format includes milliseconds
-                    if '.' in time_str:
-                        time_data.append(date2num(datetime.strptime(time_str, '%H:%M:%S.%f')))
-                    else:
-                        time_data.append(date2num(datetime.strptime(time_str, '%H:%M:%S')))
-
-                    t_sup_data.append(float(t_sup_item.text()))
-                    t_ret_mea_data.append(float(t_ret_mea_item.text()))
-                    q_flow_hp_data.append(float(q_flow_hp_item.text()))
-                    q_flow_hb_data.append(float(q_flow_hb_item.text()))
-                    q_flow_ba_data.append(float(q_flow_ba_item.text()))
-                    q_flow_int_data.append(float(q_flow_int_item.text()))
-                    q_flow_bh_data.append(float(q_flow_bh_item.text()))
-                    t_b_data.append(float(t_b_item.text()))
-                except ValueError as e:
-                    print(f"Error converting table data: {e}")
-
-        # Plot temperature data
-        self.ax_temp.plot(time_data, t_sup_data, label='Supply Temperature (t_sup)', linestyle='-', color='tab:blue')
-        self.ax_temp.plot(time_data, t_ret_mea_data, label='Return Temperature (t_ret_mea)', linestyle='--', color='tab:red')
-        self.ax_temp.legend(loc='upper right', prop=legend_font)
-        self.ax_temp.xaxis.set_major_formatter(DateFormatter('%H:%M:%S'))
-
-        # Plot heat flow data
-        self.ax_heat_flow.plot(time_data, q_flow_hp_data, label='Heat Flow HP to Transfer System (q_hp)', linestyle='-', color='tab:green')
-        self.ax_heat_flow.plot(time_data, q_flow_hb_data, label='Heat Flow to Building (q_hb)', linestyle='-', color='tab:orange')
-        self.ax_heat_flow.plot(time_data, q_flow_ba_data, label='Heat Flow Building to Ambient (q_ba)', linestyle='-', color='tab:purple')
-        self.ax_heat_flow.plot(time_data, q_flow_int_data, label='Heat Flow Internal Gains to Building (q_int)', linestyle='-', color='tab:pink')
-        self.ax_heat_flow.plot(time_data, q_flow_bh_data, label='Heat Flow Booster Heater to Heating System (q_bh)', linestyle='-', color='tab:brown')
-        self.ax_heat_flow.legend(loc='upper right', prop=legend_font)
-        self.ax_heat_flow.xaxis.set_major_formatter(DateFormatter('%H:%M:%S'))
-
-        # Plot building temperature data
-        self.ax_building_temp.plot(time_data, t_b_data, label='Building Temperature (t_b)', linestyle='-', color='tab:gray')
-        self.ax_building_temp.legend(loc='upper right', prop=legend_font)
-        self.ax_building_temp.xaxis.set_major_formatter(DateFormatter('%H:%M:%S'))
-
-        # Update canvas
-        self.canvas.draw()
-        self.canvas.flush_events()
-    
-    def closeEvent(self, event):
-        try:
-            # Flush any remaining data to the CSV
-            self.flushCSVBuffer()
+        if self.graphBackend is None:
+            self.setupGraph()
 
-            # Set DAC voltage to 0
-            dacVoltage = 0
-            self.sendSerialCommand(f"setVoltage {dacVoltage}")
+        series = {key: self.displayStore.column(key) for key in self.graphBackend.lines}
+        self.graphBackend.setData(self.displayStore.column('time'), series)
 
-            # Stop the timer if active
+    def closeEvent(self, event):
+        try:
+            # Stop the control loop, the metrics endpoint, the live stream and the display timer
+            self.controlLoop.stop()
+            if self.metricsServer is not None:
+                self.metricsServer.stop()
+            if self.streamServer is not None:
+                self.streamServer.stop()
             if self.timer.isActive():
                 self.timer.stop()
 
-            # Close the serial connection if open
-            if self.arduinoSerial and self.arduinoSerial.isOpen():
-                self.arduinoSerial.close()
-                self.logToTerminal("> Serial connection closed.")
-
-            # Release the lock and close the file
-            if hasattr(self, 'csv_lock') and self.csv_lock:
-                self.csv_lock.release()
-                self.csv_file.close()
-                # Delete the lock file if it exists
-                if os.path.exists(self.csv_lock_path):
-                    os.remove(self.csv_lock_path)
-                    self.logToTerminal("> CSV lock file deleted.")
+            if self.sessionLoader is not None:
+                self.sessionLoader.requestInterruption()
+                self.sessionLoader.wait()
+            if self.exportThread is not None:
+                self.exportThread.requestInterruption()  # The partial export is removed
+                self.exportThread.wait()
+
+            # Flush remaining data to the CSV, set DAC voltage to 0, close the serial connection and release the lock;
+            # an acquisition process attached to keeps running
+            if self.ringReader is not None:
+                self.ringNotifier.setEnabled(False)
+                self.ringReader.close()
+            else:
+                self.engine.shutdown()
 
             # Confirm application close with the user
             reply = QtWidgets.QMessageBox.question(
@@ -1340,11 +1361,60 @@ class MainWindow(QtWidgets.QMainWindow):
             self.logToTerminal(f"Error during close event: {e}", messageType="error")
             event.ignore()
 
+def parseArguments():
+    parser = argparse.ArgumentParser(description="Arduino heat pump controller GUI")
+    parser.add_argument('--port', default=ARDUINO_PORT, help="Serial port of the Arduino")
+    parser.add_argument('--replay', help="Replay a recorded CSV log or columnar session instead of the Arduino")
+    parser.add_argument('--replay-speed', type=parseReplaySpeed, default=1.0,
+                        help="'realtime', a speed-up factor such as 10x, or 'max' (as fast as the pipeline runs)")
+    parser.add_argument('--sample-rate', type=int, choices=range(1, MAX_BATCH_SAMPLE_RATE + 1), metavar='HZ',
+                        help=f"Arduino telemetry rate, 1 to {MAX_SAMPLE_RATE} Hz, or up to {MAX_BATCH_SAMPLE_RATE} Hz "
+                             f"with --batch (default: the firmware's 1 Hz)")
+    parser.add_argument('--avg-window', type=int, choices=range(1, MAX_AVG_WINDOW + 1), metavar='SAMPLES',
+                        help=f"Samples in the Arduino's running average, 1 to {MAX_AVG_WINDOW} (default: 4)")
+    parser.add_argument('--batch', type=int, choices=range(1, MAX_BATCH_SAMPLES + 1), metavar='SAMPLES',
+                        help=f"Samples per telemetry line, 1 to {MAX_BATCH_SAMPLES}; above 1 the Arduino sends "
+                             f"batches with a single header (default: 1, one line per sample)")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT, metavar='PORT',
+                        help=f"Serve Prometheus metrics at http://{METRICS_HOST}:PORT/metrics")
+    parser.add_argument('--stream-port', type=int, default=STREAM_PORT, metavar='PORT',
+                        help=f"Stream the samples live at http://{STREAM_HOST}:PORT/")
+    parser.add_argument('--attach', default=ATTACH_RING, metavar='NAME',
+                        help="Show the samples of controller-daemon.py --shared-ring NAME instead of running the "
+                             "controller in this process")
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help="Print FIRST_SAMPLE on the first accepted telemetry line and exit (used by startup-benchmark.py)")
+    args, qtArgs = parser.parse_known_args()
+    error = validateSampling(args.sample_rate, args.avg_window, args.batch)
+    if error:
+        parser.error(error)
+    return args, qtArgs
+
+def exitOnFirstSample(mainWindow):
+    showReadings = mainWindow.updateReadingLabels
+
+    def onReading(readings):
+        showReadings(readings)
+        print("FIRST_SAMPLE", flush=True)
+        mainWindow.updateReadingLabels = showReadings
+        mainWindow.controlLoop.stop()
+        mainWindow.timer.stop()
+        mainWindow.engine.shutdown()
+        QApplication.instance().quit()
+
+    # Readings reach the GUI thread through updateDisplay
+    mainWindow.updateReadingLabels = onReading
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    args, qtArgs = parseArguments()
+    app = QApplication(sys.argv[:1] + qtArgs)
     splash = show_splash_screen()
     applyOneDarkProTheme(app)
-    mainWindow = MainWindow()
+    mainWindow = MainWindow(port=args.port, replayPath=args.replay, replaySpeed=args.replay_speed,
+                            sampleRate=args.sample_rate, avgWindow=args.avg_window, batchSamples=args.batch, metricsPort=args.metrics_port,
+                            streamPort=args.stream_port, attachRing=args.attach)
+    if args.benchmark_startup:
+        exitOnFirstSample(mainWindow)
     mainWindow.show()
     splash.finish(mainWindow)
     sys.exit(app.exec_())
@@ -0,0 +1,129 @@
+"""
+    Maps the device timestamps of read-temp.ino (RTC seconds plus millis() fraction) to the host clock.
+
+    A sample taken at device time d is read by the host at h = d + offset + drift * d + delay, where the delay
+    (serial transfer, buffering, a busy host) is never negative and only sometimes small. ClockSync keeps the
+    smallest h - d of every CLOCK_WINDOW seconds of device time: drift is the least-squares slope of these minima,
+    and offset the lowest line with that slope that stays below all of them. Both are refitted once per window,
+    so a sample costs O(1). The host time of a sample is then its device time on that line, however late it was
+    read, and a host that is briefly overloaded does not shift the logged times.
+"""
+
+from collections import deque
+
+CLOCK_WINDOW = 2.0  # Device time over which the smallest delay is kept [s]
+CLOCK_WINDOWS = 150  # Window minima the offset and drift are fitted to (5 minutes)
+CLOCK_DRIFT_SPAN = 30.0  # Device time the minima must span before a drift is estimated [s]
+CLOCK_JUMP = 0.5  # Deviation from the fit taken as a step of the device clock (board restart, RTC set) [s]
+
+
+class ClockSync:
+    def __init__(self, window=CLOCK_WINDOW, windows=CLOCK_WINDOWS, driftSpan=CLOCK_DRIFT_SPAN, jump=CLOCK_JUMP):
+        """
+        :param window: Device time over which the smallest delay is kept [s]
+        :param windows: Window minima the offset and drift are fitted to
+        :param driftSpan: Device time the minima must span before a drift is estimated [s]
+        :param jump: Deviation from the fit taken as a step of the device clock [s]
+        """
+        self.window = window
+        self.driftSpan = driftSpan
+        self.jump = jump
+        self.minima = deque(maxlen=windows)  # (device time, host - device time) with the smallest delay per window
+        self.windowStart = None
+        self.windowMinimum = None
+        self.reference = None  # Device time the drift is counted from [s]
+        self.offset = None  # Host - device time at the reference [s]
+        self.drift = 0.0  # Host seconds per device second - 1
+
+        self.samples = 0
+        self.resets = 0
+        self.lastDelay = 0.0
+        self.maxDelay = 0.0
+
+    def reset(self):
+        """
+        Forgets the fit, e.g. when the port is reopened and the board restarts. The counters are kept.
+        """
+        self.minima.clear()
+        self.windowStart = None
+        self.windowMinimum = None
+        self.reference = None
+        self.offset = None
+        self.drift = 0.0
+
+    def predict(self, deviceTime):
+        """
+        Expected host - device time for a sample read without delay.
+        """
+        return self.offset + self.drift * (deviceTime - self.reference)
+
+    def update(self, deviceTime, hostTime):
+        """
+        Registers a sample taken at deviceTime [s] and read at hostTime [s].
+        Returns the host time the sample was taken at [s].
+        """
+        difference = hostTime - deviceTime
+        if self.offset is not None and difference - self.predict(deviceTime) < -self.jump:
+            self.resets += 1  # Read well before it was taken: the device clock stepped forward
+            self.reset()
+        if self.offset is None:
+            self.reference = deviceTime
+            self.offset = difference
+            self.windowStart = deviceTime
+
+        if deviceTime - self.windowStart >= self.window:
+            self.closeWindow()
+            self.windowStart = deviceTime
+        if self.windowMinimum is None or difference < self.windowMinimum[1]:
+            self.windowMinimum = (deviceTime, difference)
+
+        # A smaller delay than any before lowers the line at once
+        delay = difference - self.predict(deviceTime)
+        if delay < 0:
+            self.offset += delay
+            delay = 0.0
+        self.samples += 1
+        self.lastDelay = delay
+        self.maxDelay = max(self.maxDelay, delay)
+        return deviceTime + self.predict(deviceTime)
+
+    def closeWindow(self):
+        if self.windowMinimum is None:
+            return
+        deviceTime, difference = self.windowMinimum
+        self.windowMinimum = None
+        if difference - self.predict(deviceTime) > self.jump:
+            self.resets += 1  # Every sample of the window late: the device clock stepped back
+            self.reset()
+            self.reference = deviceTime
+            self.offset = difference
+        self.minima.append((deviceTime, difference))
+        self.fit()
+
+    def fit(self):
+        times = [deviceTime - self.reference for deviceTime, _ in self.minima]
+        differences = [difference for _, difference in self.minima]
+        if times[-1] - times[0] >= self.driftSpan:
+            meanTime = sum(times) / len(times)
+            meanDifference = sum(differences) / len(differences)
+            variance = sum((t - meanTime) ** 2 for t in times)
+            self.drift = sum((t - meanTime) * (d - meanDifference) for t, d in zip(times, differences)) / variance
+        self.offset = min(d - self.drift * t for t, d in zip(times, differences))
+
+    def stats(self):
+        return {
+            'samples': self.samples,
+            'offset': self.offset,
+            'drift': self.drift * 1e6,
+            'lastDelay': self.lastDelay,
+            'maxDelay': self.maxDelay,
+            'resets': self.resets
+        }
+
+
+def formatClockStats(stats):
+    if stats['offset'] is None:
+        return "no device timestamps"
+    return (f"device clock {-stats['offset']:+.3f} s from the host, drift {-stats['drift']:+.1f} ppm, "
+            f"read delay {stats['lastDelay'] * 1000:.1f} ms (max {stats['maxDelay'] * 1000:.1f} ms), "
+            f"{stats['resets']} resets")
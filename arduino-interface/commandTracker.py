@@ -0,0 +1,126 @@
+"""
+    Sequence numbers and acknowledgements of the commands sent to read-temp.ino.
+
+    Every command is sent as '#<seq> <command>' and answered by the Arduino with 'ACK <seq>' once it has been
+    applied, or 'NAK <seq> <reason>' if it was rejected. AckTracker numbers the commands, matches the replies to
+    them and measures the round-trip latency; commands that are not answered within ACK_TIMEOUT are counted as lost.
+"""
+
+import time
+from collections import OrderedDict, deque
+
+ACK_TIMEOUT = 2.0  # Time after which an unanswered command counts as lost [s]
+MAX_SEQUENCE = 65535  # Sequence numbers run from 1 to MAX_SEQUENCE and wrap around
+RTT_HISTORY = 1000  # Round-trip times kept for the percentiles
+
+
+def parseReply(line):
+    """
+    Splits an 'ACK <seq>' or 'NAK <seq> <reason>' line into (accepted, seq, reason); None for any other line.
+    """
+    kind, _, rest = line.partition(' ')
+    if kind not in ('ACK', 'NAK'):
+        return None
+    sequence, _, reason = rest.strip().partition(' ')
+    if not sequence.isdigit():
+        return None
+    return kind == 'ACK', int(sequence), reason
+
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(fraction * len(sortedValues)), len(sortedValues) - 1)] if sortedValues else 0.0
+
+
+class AckTracker:
+    def __init__(self, timeout=ACK_TIMEOUT, clock=time.monotonic):
+        """
+        :param timeout: Time after which an unanswered command counts as lost [s]
+        :param clock: Monotonic time source [s]
+        """
+        self.timeout = timeout
+        self.clock = clock
+        self.sequence = 0
+        self.pending = OrderedDict()  # seq -> (command, send time), oldest first
+
+        self.commandsSent = 0
+        self.acknowledged = 0
+        self.rejected = 0
+        self.timedOut = 0
+        self.unexpected = 0  # Replies to unknown or already expired sequence numbers
+        self.lastRTT = 0.0
+        self.maxRTT = 0.0
+        self.totalRTT = 0.0
+        self.recentRTTs = deque(maxlen=RTT_HISTORY)
+
+    def send(self, command):
+        """
+        Registers a command and returns the line to write to the Arduino (without the newline).
+        """
+        self.sequence = self.sequence % MAX_SEQUENCE + 1
+        self.pending.pop(self.sequence, None)  # Only left over if MAX_SEQUENCE commands were sent within the timeout
+        self.pending[self.sequence] = (command, self.clock())
+        self.commandsSent += 1
+        return f"#{self.sequence} {command}"
+
+    def handleReply(self, line):
+        """
+        Matches an ACK/NAK line to its command.
+        Returns (accepted, command, reason, round-trip time [s]), or None if the line is not a reply to a pending
+        command.
+        """
+        reply = parseReply(line)
+        if reply is None:
+            return None
+        accepted, sequence, reason = reply
+        if sequence not in self.pending:
+            self.unexpected += 1
+            return None
+        command, sentAt = self.pending.pop(sequence)
+        rtt = self.clock() - sentAt
+        self.lastRTT = rtt
+        self.maxRTT = max(self.maxRTT, rtt)
+        self.totalRTT += rtt
+        self.recentRTTs.append(rtt)
+        if accepted:
+            self.acknowledged += 1
+        else:
+            self.rejected += 1
+        return accepted, command, reason, rtt
+
+    def expire(self):
+        """
+        Drops the commands that have waited longer than the timeout. Returns their [(seq, command)].
+        """
+        now = self.clock()
+        expired = []
+        while self.pending:
+            sequence, (command, sentAt) = next(iter(self.pending.items()))
+            if now - sentAt < self.timeout:
+                break
+            del self.pending[sequence]
+            expired.append((sequence, command))
+        self.timedOut += len(expired)
+        return expired
+
+    def stats(self):
+        answered = self.acknowledged + self.rejected
+        recent = sorted(self.recentRTTs)
+        return {
+            'commandsSent': self.commandsSent,
+            'acknowledged': self.acknowledged,
+            'rejected': self.rejected,
+            'timedOut': self.timedOut,
+            'unexpected': self.unexpected,
+            'pending': len(self.pending),
+            'lastRTT': self.lastRTT,
+            'meanRTT': self.totalRTT / answered if answered else 0.0,
+            'p50RTT': percentile(recent, 0.5),
+            'p99RTT': percentile(recent, 0.99),
+            'maxRTT': self.maxRTT
+        }
+
+
+def formatAckStats(stats):
+    return (f"{stats['commandsSent']} commands, {stats['acknowledged']} acknowledged, {stats['rejected']} rejected, "
+            f"{stats['timedOut']} lost; round trip {stats['p50RTT'] * 1000:.1f} ms "
+            f"(p99 {stats['p99RTT'] * 1000:.1f} ms, max {stats['maxRTT'] * 1000:.1f} ms)")
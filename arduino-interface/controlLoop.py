@@ -0,0 +1,130 @@
+"""
+    Fixed-period control loop: the telemetry poll, the building model step and the setVoltage command run on a
+    dedicated thread instead of a GUI timer, so their timing does not depend on what the Qt event loop is doing.
+
+    Iteration k is released at origin + k * period (not "period after the previous one ended"), so the schedule does
+    not drift by the compute time of every iteration. An iteration that ends after the release of the next one has
+    missed its deadline; releases that already passed by then are skipped rather than run back to back. Compute time,
+    lateness (wake-up after the release) and missed deadlines are recorded for every iteration.
+"""
+
+import time
+import threading
+from collections import deque
+from commandTracker import percentile
+
+CONTROL_PERIOD = 0.1  # Control loop period [s]
+CONTROL_HISTORY = 1000  # Iterations kept for the percentiles
+
+
+class ControlLoop(threading.Thread):
+    def __init__(self, step, period=CONTROL_PERIOD, log=None, clock=time.monotonic):
+        """
+        :param step: Callable run once per period, e.g. ControllerEngine.poll
+        :param period: Time between two releases [s]; 0 runs the iterations back to back
+        :param log: Optional log(message, messageType) function for failed iterations
+        :param clock: Monotonic time source [s]
+        """
+        super(ControlLoop, self).__init__(name='control-loop', daemon=True)
+        self.step = step
+        self.period = period
+        self.log = log
+        self.clock = clock
+        self.lock = threading.RLock()  # Held during every iteration; take it to call the engine from another thread
+        self.active = threading.Event()  # Cleared while paused
+        self.stopping = threading.Event()
+
+        # Statistics, written by the loop thread while it holds the lock
+        self.iterations = 0
+        self.missed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.maxComputeTime = 0.0
+        self.maxLateness = 0.0
+        self.recentComputeTimes = deque(maxlen=CONTROL_HISTORY)
+        self.recentLateness = deque(maxlen=CONTROL_HISTORY)
+
+    def start(self, active=True):
+        if active:
+            self.active.set()
+        super(ControlLoop, self).start()
+
+    def pause(self):
+        """
+        Stops running iterations after the current one, e.g. while the serial port is closed.
+        """
+        self.active.clear()
+
+    def resume(self):
+        self.active.set()
+
+    def isActive(self):
+        return self.active.is_set()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.active.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.active.wait()
+            origin = self.clock()  # A new schedule after every pause
+            release = 0
+            while self.active.is_set() and not self.stopping.is_set():
+                start = self.clock()
+                releaseTime = origin + release * self.period if self.period else start
+                with self.lock:
+                    try:
+                        self.step()
+                    except Exception as e:
+                        self.errors += 1
+                        if self.log:
+                            self.log(f"> Control loop iteration failed: {e}", "error")
+                    end = self.clock()
+                    self.record(end - start, start - releaseTime)
+
+                release += 1
+                if self.period and end > origin + release * self.period:
+                    self.missed += 1
+                    late = int((end - origin) / self.period) + 1 - release  # Releases passed meanwhile
+                    self.skipped += late
+                    release += late
+                self.stopping.wait(max(origin + release * self.period - self.clock(), 0))
+
+    def record(self, computeTime, lateness):
+        self.iterations += 1
+        self.recentComputeTimes.append(computeTime)
+        self.recentLateness.append(lateness)
+        self.maxComputeTime = max(self.maxComputeTime, computeTime)
+        self.maxLateness = max(self.maxLateness, lateness)
+
+    def stats(self):
+        with self.lock:
+            computeTimes = sorted(self.recentComputeTimes)
+            lateness = sorted(self.recentLateness)
+        return {
+            'iterations': self.iterations,
+            'period': self.period,
+            'p50ComputeTime': percentile(computeTimes, 0.5),
+            'p99ComputeTime': percentile(computeTimes, 0.99),
+            'maxComputeTime': self.maxComputeTime,
+            'p50Lateness': percentile(lateness, 0.5),
+            'p99Lateness': percentile(lateness, 0.99),
+            'maxLateness': self.maxLateness,
+            'missed': self.missed,
+            'missRate': self.missed / self.iterations if self.iterations else 0.0,
+            'skipped': self.skipped,
+            'errors': self.errors
+        }
+
+
+def formatControlStats(stats):
+    schedule = f"every {stats['period'] * 1000:g} ms" if stats['period'] else "back to back"
+    return (f"{stats['iterations']} iterations {schedule}, compute "
+            f"{stats['p50ComputeTime'] * 1000:.2f} ms (p99 {stats['p99ComputeTime'] * 1000:.2f} ms, "
+            f"max {stats['maxComputeTime'] * 1000:.2f} ms), late {stats['p50Lateness'] * 1000:.2f} ms "
+            f"(p99 {stats['p99Lateness'] * 1000:.2f} ms, max {stats['maxLateness'] * 1000:.2f} ms), "
+            f"{stats['missed']} missed deadlines ({stats['missRate'] * 100:.2f}%), {stats['skipped']} periods skipped, "
+            f"{stats['errors']} errors")
@@ -0,0 +1,321 @@
+"""
+    Headless controller: runs acquisition, the two mass model, Arduino commands and CSV logging without Qt.
+    Example: python controller-daemon.py --port /dev/ttyACM0 --csv bench1.csv --ambient-temp 7
+    Replay:  python controller-daemon.py --replay bench1.session --replay-speed max --csv replay1.csv
+    10 Hz:   python controller-daemon.py --port /dev/ttyACM0 --csv bench1.csv --sample-rate 10 --avg-window 20
+    250 Hz:  python controller-daemon.py --port /dev/ttyACM0 --csv bench1.csv --sample-rate 250 --batch 25
+    GUI in its own process: python controller-daemon.py --port /dev/ttyACM0 --csv bench1.csv --shared-ring hp1
+                            python arduino-gui.py --attach hp1
+"""
+
+import sys
+import time
+import signal
+import argparse
+import serial
+from controllerEngine import (ControllerEngine, BAUD_RATE, MAX_SAMPLE_RATE, MAX_AVG_WINDOW, MAX_BATCH_SAMPLE_RATE,
+                              MAX_BATCH_SAMPLES, validateModelSettings, validateSampling)
+from csvWriter import CSV_FLUSH_ROWS, CSV_FLUSH_INTERVAL, CSV_FSYNC_POLICY, FSYNC_POLICIES
+from replaySource import parseReplaySpeed, formatReplayStats
+from commandTracker import formatAckStats
+from sequenceTracker import formatSequenceStats
+from clockSync import formatClockStats
+from controlLoop import ControlLoop, CONTROL_PERIOD, formatControlStats
+from latencyTrace import formatLatencyStats
+from eventBus import formatBusStats
+
+SUPERVISOR_INTERVAL = 0.1  # Interval of the reconnect, replay end and statistics checks of the main thread [s]
+
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Arduino heat pump controller")
+    parser.add_argument('--port', default='COM4', help="Serial port of the Arduino")
+    parser.add_argument('--baud', type=int, default=BAUD_RATE, help="Serial baud rate")
+    parser.add_argument('--csv', help="CSV log file; no log is written if omitted")
+    parser.add_argument('--project', default='', help="Project number written to the CSV preamble")
+    parser.add_argument('--client', default='', help="Client name written to the CSV preamble")
+    parser.add_argument('--date', default=time.strftime('%Y-%m-%d'), help="Date written to the CSV preamble")
+    parser.add_argument('--csv-flush-rows', type=int, default=CSV_FLUSH_ROWS, help="Queued rows that trigger a CSV write")
+    parser.add_argument('--csv-flush-interval', type=float, default=CSV_FLUSH_INTERVAL,
+                        help="Maximum time a row waits before it is written [s]; bounds the data lost on a crash")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=CSV_FSYNC_POLICY,
+                        help="When written CSV batches are synced to disk")
+    parser.add_argument('--segments', action='store_true',
+                        help="Write the CSV log as rotating zstd-compressed segments (bench1.segments) instead of one file")
+    parser.add_argument('--segment-size-mb', type=float, help="Uncompressed CSV size that starts a new segment [MB]")
+    parser.add_argument('--segment-hours', type=float, help="Sample time spanned by one segment [h]")
+    parser.add_argument('--database', help="SQLite database that also receives the samples (requires --csv)")
+    parser.add_argument('--stats-interval', type=float, default=60.0,
+                        help="Interval between CSV writer statistics messages [s]; 0 disables them")
+    parser.add_argument('--ambient-temp', type=float, default=7.0, help="Ambient temperature of the building model [°C]")
+    parser.add_argument('--initial-return-temp', type=float, default=25.0, help="Initial SP temperature [°C]")
+    parser.add_argument('--poll-interval', type=float, default=CONTROL_PERIOD,
+                        help="Period of the control loop (telemetry poll, model step, setVoltage) [s]")
+    parser.add_argument('--retries', type=int, default=5, help="Serial connection attempts before giving up")
+    parser.add_argument('--replay', help="Replay a recorded CSV log or columnar session instead of the Arduino")
+    parser.add_argument('--replay-speed', type=parseReplaySpeed, default=1.0,
+                        help="'realtime', a speed-up factor such as 10x, or 'max' (as fast as the pipeline runs)")
+    parser.add_argument('--sample-rate', type=int, choices=range(1, MAX_BATCH_SAMPLE_RATE + 1), metavar='HZ',
+                        help=f"Arduino telemetry rate, 1 to {MAX_SAMPLE_RATE} Hz, or up to {MAX_BATCH_SAMPLE_RATE} Hz "
+                             f"with --batch (default: the firmware's 1 Hz)")
+    parser.add_argument('--avg-window', type=int, choices=range(1, MAX_AVG_WINDOW + 1), metavar='SAMPLES',
+                        help=f"Samples in the Arduino's running average, 1 to {MAX_AVG_WINDOW} (default: 4)")
+    parser.add_argument('--batch', type=int, choices=range(1, MAX_BATCH_SAMPLES + 1), metavar='SAMPLES',
+                        help=f"Samples per telemetry line, 1 to {MAX_BATCH_SAMPLES}; above 1 the Arduino sends "
+                             f"batches with a single header (default: 1, one line per sample)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="Serve Prometheus metrics at http://HOST:PORT/metrics (default: no metrics endpoint)")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="Interface of the metrics endpoint; 0.0.0.0 to be scraped from other machines")
+    parser.add_argument('--stream-port', type=int, metavar='PORT',
+                        help="Stream the samples live at http://HOST:PORT/ (Server-Sent Events at /stream; "
+                             "default: no stream)")
+    parser.add_argument('--stream-host', default='127.0.0.1',
+                        help="Interface of the live stream; 0.0.0.0 to let other machines watch")
+    parser.add_argument('--shared-ring', metavar='NAME',
+                        help="Publish the samples in a shared memory ring for arduino-gui.py --attach NAME "
+                             "(default: none)")
+    parser.add_argument('--ring-capacity', type=int, metavar='SAMPLES',
+                        help="Samples held by the shared memory ring (default: 65536, about 4 minutes at 250 Hz)")
+    parser.add_argument('--verbose', action='store_true', help="Print every received telemetry line")
+    parser.add_argument('--exit-after-first-sample', action='store_true',
+                        help="Print FIRST_SAMPLE on the first accepted telemetry line and exit (used by startup-benchmark.py)")
+    return parser.parse_args(argv)
+
+
+def logMessage(message, messageType="info"):
+    stream = sys.stderr if messageType in ("warning", "error") else sys.stdout
+    print(f"[{time.strftime('%H:%M:%S')}] {messageType.upper()}: {message}", file=stream, flush=True)
+
+
+def connectWithRetries(engine, retries, delay=2):
+    for attempt in range(1, retries + 1):
+        try:
+            engine.connect()
+            logMessage("> Serial connection established. System initialized.")
+            return True
+        except serial.SerialException as e:
+            logMessage(f"> Retry {attempt} failed: {e}", "error")
+            time.sleep(delay)
+    logMessage("> Failed to establish serial connection after multiple attempts.", "error")
+    return False
+
+
+def logCSVStats(engine):
+    stats = engine.csvStats()
+    if stats:
+        logMessage(f"> CSV writer: {stats['rowsWritten']} rows in {stats['batchesWritten']} batches, "
+                   f"queue depth {stats['queueDepth']}, write latency {stats['lastWriteLatency'] * 1000:.1f} ms "
+                   f"(max {stats['maxWriteLatency'] * 1000:.1f} ms)")
+
+
+def logCommandStats(engine):
+    stats = engine.commandStats()
+    if stats['commandsSent']:
+        logMessage(f"> Commands: {formatAckStats(stats)}")
+
+
+def logSequenceStats(engine):
+    stats = engine.sequenceStats()
+    if stats['received']:
+        logMessage(f"> Telemetry: {formatSequenceStats(stats)}", "warning" if stats['lost'] else "info")
+
+
+def logClockStats(engine):
+    stats = engine.clockStats()
+    if stats['samples']:
+        logMessage(f"> Clock: {formatClockStats(stats)}")
+
+
+def logControlStats(controlLoop):
+    stats = controlLoop.stats()
+    if stats['iterations']:
+        logMessage(f"> Control loop: {formatControlStats(stats)}", "warning" if stats['missed'] else "info")
+
+
+def logLatencyStats(engine):
+    stats = engine.latencyStats()
+    if stats['total']['count']:
+        logMessage(f"> Sample to DAC latency (p50/p99/p999): {formatLatencyStats(stats)}")
+
+
+def logReplayStats(engine):
+    stats = engine.replayStats()
+    if stats:
+        logMessage(f"> Replay: {formatReplayStats(stats)}")
+
+
+def logStreamStats(streamServer):
+    if streamServer:
+        from streamServer import formatStreamStats
+        logMessage(f"> Live stream: {formatStreamStats(streamServer.stats())}")
+
+
+def logBusStats(engine):
+    stats = engine.bus.stats()
+    if stats:
+        logMessage(f"> Event queues: {formatBusStats(stats)}",
+                   "warning" if any(queue['dropped'] for queue in stats) else "info")
+
+
+def startStreamServer(engine, port, host):
+    """
+    Starts the live sample stream (streamServer.py) if a port is given. Returns the server, or None.
+    """
+    if port is None:
+        return None
+    from streamServer import StreamServer
+    try:
+        streamServer = StreamServer(engine.bus, port, host)
+    except OSError as e:
+        logMessage(f"> Cannot stream samples on {host}:{port}: {e}", "error")
+        return None
+    streamServer.start()
+    logMessage(f"> Samples streamed live at http://{host}:{streamServer.port}/")
+    return streamServer
+
+
+def startSharedRing(engine, name, capacity):
+    """
+    Publishes the samples in a shared memory ring (sharedRing.py) if a name is given. Returns the writer, or None.
+    """
+    if name is None:
+        return None
+    from sharedRing import SharedRingWriter, RING_CAPACITY
+    try:
+        ring = SharedRingWriter(name, engine.bus, capacity or RING_CAPACITY)
+    except OSError as e:
+        logMessage(f"> Cannot create the shared memory ring {name}: {e}", "error")
+        return None
+    logMessage(f"> Samples published in shared memory ring {name}; attach with arduino-gui.py --attach {name}")
+    return ring
+
+
+def logRingStats(ring):
+    if ring:
+        stats = ring.stats()
+        logMessage(f"> Shared memory ring: {stats['written']} samples written, "
+                   f"GUI {'attached' if stats['readerAttached'] else 'not attached'}")
+
+
+def startMetricsServer(engine, controlLoop, port, host):
+    """
+    Starts the Prometheus endpoint (metricsServer.py) if a port is given. Returns the server, or None.
+    """
+    if port is None:
+        return None
+    from metricsServer import MetricsServer, engineMetrics, controlLoopMetrics
+    try:
+        metricsServer = MetricsServer([engineMetrics(engine), controlLoopMetrics(controlLoop)], port, host)
+    except OSError as e:
+        logMessage(f"> Cannot serve metrics on {host}:{port}: {e}", "error")
+        return None
+    metricsServer.start()
+    logMessage(f"> Metrics served at http://{host}:{metricsServer.port}/metrics")
+    return metricsServer
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    message = (validateModelSettings(args.ambient_temp, args.initial_return_temp)
+               or validateSampling(args.sample_rate, args.avg_window, args.batch))
+    if message:
+        logMessage(message, "error")
+        return 2
+
+    engine = ControllerEngine(args.port, args.baud, log=logMessage, echoSerial=args.verbose)
+    engine.replayPath = args.replay
+    engine.replaySpeed = args.replay_speed
+    engine.setSampling(args.sample_rate, args.avg_window, args.batch)
+
+    running = True
+
+    def requestStop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGINT, requestStop)
+    signal.signal(signal.SIGTERM, requestStop)
+
+    if args.exit_after_first_sample:
+        def onFirstReading(readings):
+            nonlocal running
+            print("FIRST_SAMPLE", flush=True)
+            engine.onReading = None
+            running = False
+
+        engine.onReading = onFirstReading
+
+    if not connectWithRetries(engine, args.retries):
+        return 1
+
+    if args.csv:
+        engine.setCSVFilePath(args.csv)
+        engine.csvFlushRows = args.csv_flush_rows
+        engine.csvFlushInterval = args.csv_flush_interval
+        engine.csvFsyncPolicy = args.fsync
+        engine.database_path = args.database
+        engine.logSegments = args.segments
+        engine.segmentMaxBytes = int(args.segment_size_mb * 2 ** 20) if args.segment_size_mb else None
+        engine.segmentMaxSeconds = args.segment_hours * 3600 if args.segment_hours else None
+        engine.initCSVFile([('Project Number', args.project), ('Client Name', args.client), ('Date', args.date)])
+        logMessage(f"> CSV file set to save at: {args.csv}")
+
+    engine.initializeBuildingModel(args.ambient_temp, args.initial_return_temp)
+
+    # The engine is polled on a fixed-period control thread; the main thread only supervises it
+    period = 0 if args.replay and args.replay_speed is None else args.poll_interval  # A max-speed replay runs flat out
+    controlLoop = ControlLoop(engine.poll, period, log=logMessage)
+    streamServer = startStreamServer(engine, args.stream_port, args.stream_host)
+    ring = startSharedRing(engine, args.shared_ring, args.ring_capacity)
+    controlLoop.start()
+    metricsServer = startMetricsServer(engine, controlLoop, args.metrics_port, args.metrics_host)
+    lastStats = time.monotonic()
+    try:
+        while running:
+            if not engine.isConnected():
+                controlLoop.pause()
+                with controlLoop.lock:
+                    if not connectWithRetries(engine, args.retries):
+                        break
+                controlLoop.resume()
+            with controlLoop.lock:
+                if engine.replayFinished():
+                    break
+                if args.stats_interval and time.monotonic() - lastStats >= args.stats_interval:
+                    logCSVStats(engine)
+                    logCommandStats(engine)
+                    logSequenceStats(engine)
+                    logClockStats(engine)
+                    logReplayStats(engine)
+                    logControlStats(controlLoop)
+                    logLatencyStats(engine)
+                    logStreamStats(streamServer)
+                    logRingStats(ring)
+                    logBusStats(engine)
+                    lastStats = time.monotonic()
+            time.sleep(SUPERVISOR_INTERVAL)
+    finally:
+        controlLoop.stop()
+        if metricsServer:
+            metricsServer.stop()
+        if streamServer:
+            streamServer.stop()
+        logCSVStats(engine)
+        logCommandStats(engine)
+        logSequenceStats(engine)
+        logClockStats(engine)
+        logControlStats(controlLoop)
+        logLatencyStats(engine)
+        logStreamStats(streamServer)
+        logRingStats(ring)
+        logBusStats(engine)
+        if ring:
+            ring.close()
+        engine.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
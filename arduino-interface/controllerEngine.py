@@ -0,0 +1,938 @@
+"""
+    GUI-free controller core: telemetry parsing, two mass model stepping, Arduino commands and logging.
+    Used by the Qt window (arduino-gui.py) and the headless daemon (controller-daemon.py). Both call poll() from a
+    fixed-period control loop thread (controlLoop.py). Other threads call into the engine under controlLoop.lock,
+    or read statsSnapshot and the counters without it. Log writes are queued to writer threads. Samples and state
+    changes are published on the event bus (eventBus.py) for consumers on their own threads.
+"""
+
+import os
+import csv
+import time
+import serial
+from collections import deque
+from datetime import datetime, timedelta
+from csvWriter import CSVWriterThread, CSV_FLUSH_ROWS, CSV_FLUSH_INTERVAL, CSV_FSYNC_POLICY
+from commandTracker import AckTracker
+from sequenceTracker import SequenceTracker, SEQUENCE_MODULUS
+from clockSync import ClockSync
+from latencyTrace import LatencyTrace, LatencyHistogram
+from eventBus import EventBus, SampleEvent, ReadingEvent, CommandEvent, StateEvent
+
+BAUD_RATE = 115200  # Must match Serial.begin() in read-temp.ino
+MAX_SAMPLE_RATE = 100  # maxSampleRate in read-temp.ino [Hz]
+MAX_AVG_WINDOW = 100  # maxAvgSamples in read-temp.ino [samples]
+MAX_BATCH_SAMPLE_RATE = 250  # maxBatchSampleRate in read-temp.ino [Hz]
+MAX_BATCH_SAMPLES = 25  # maxBatchSamples in read-temp.ino
+BATCH_PREFIX = "BATCH "  # Batched telemetry, e.g. 'BATCH 1234 1718000000.250 dt,STemp,DACVolt,FlowRate,RTemp;0,...'
+SAMPLE_RATE_REPLY = "New sample rate: "  # Confirmation of setRate, e.g. 'New sample rate: 10 Hz'
+AVG_WINDOW_REPLY = "New averaging window: "
+
+MODEL_HISTORY_LENGTH = 3600  # Temperature history samples kept by the engine (ring buffers)
+DEFAULT_Q_DESIGN_E = 11590  # Design heating power used for the model calculations [W]
+BOOST_HEAT_POWER = 6000  # Maximum booster heater power [W]
+STATS_SNAPSHOT_INTERVAL = 0.25  # Interval of the statistics snapshot published by poll() for other threads [s]
+
+SAMPLE_COLUMNS = [
+    'Time', 'Supply Temperature', 'DAC Voltage', 'SP Temperature', 'Flow Rate',
+    'Return Temperature', 'Heat Flow HB', 'Heat Flow BA', 'Heat Flow HP',
+    'HF Internal Gains', 'HF Booster Heater', 'Building Temperature'
+]
+
+
+def printLog(message, messageType="info"):
+    print(message)
+
+
+def parseTelemetryLine(serialData):
+    """
+    Splits a telemetry line such as 'STemp:45.20, DACVolt:2.10, ..., Seq:1234, Time:1718000000.250' into a dict of
+    raw string values.
+    """
+    dataDict = {}
+    for field in serialData.split(','):
+        if ':' in field:
+            key, value = field.split(':', 1)
+            dataDict[key.strip()] = value.strip()
+    return dataDict
+
+
+def parseTelemetryBatch(serialData):
+    """
+    Unpacks a batch line 'BATCH 1234 1718000000.250 dt,STemp,...;0,45.20,...;10,45.21,...' (sequence number and
+    device time of the first sample, field names once, then one entry per sample) into
+    [(time after the first sample [ms], dict of raw string values)]; each sample gets its own 'Seq' and 'Time'.
+    Raises ValueError if it is malformed.
+    """
+    header, *samples = serialData[len(BATCH_PREFIX):].split(';')
+    *firstSample, fields = header.split()
+    names = [name.strip() for name in fields.split(',')]
+    if names[0] != 'dt':
+        raise ValueError(f"Batch header does not start with the time offset: {header}")
+    batch = []
+    for sample in samples:
+        values = sample.split(',')
+        if len(values) != len(names):
+            raise ValueError(f"Batch sample has {len(values)} of {len(names)} fields: {sample}")
+        batch.append((int(values[0]), dict(zip(names[1:], values[1:]))))
+    if firstSample:
+        first = int(firstSample[0])
+        for index, (_, dataDict) in enumerate(batch):
+            dataDict['Seq'] = str((first + index) % SEQUENCE_MODULUS)
+    if len(firstSample) > 1:
+        firstTime = float(firstSample[1])
+        for offset, dataDict in batch:
+            dataDict['Time'] = f"{firstTime + offset / 1000:.3f}"
+    return batch
+
+
+def validateSampling(sampleRate=None, avgWindow=None, batchSamples=None):
+    """
+    Returns an error message if the requested sampling is not supported by read-temp.ino, otherwise None.
+    """
+    batched = batchSamples is not None and batchSamples > 1
+    maxRate = MAX_BATCH_SAMPLE_RATE if batched else MAX_SAMPLE_RATE
+    if sampleRate is not None and not (1 <= sampleRate <= maxRate and sampleRate == int(sampleRate)):
+        if MAX_SAMPLE_RATE < sampleRate <= MAX_BATCH_SAMPLE_RATE:
+            return f"Sample rates above {MAX_SAMPLE_RATE} Hz need batched telemetry (batch size > 1)"
+        return f"Sample rate must be a whole number of 1 to {maxRate} Hz"
+    if avgWindow is not None and not (1 <= avgWindow <= MAX_AVG_WINDOW and avgWindow == int(avgWindow)):
+        return f"Averaging window must be 1 to {MAX_AVG_WINDOW} samples"
+    if batchSamples is not None and not (1 <= batchSamples <= MAX_BATCH_SAMPLES and batchSamples == int(batchSamples)):
+        return f"Batch size must be 1 to {MAX_BATCH_SAMPLES} samples"
+    return None
+
+
+def validateModelSettings(ambient_temp, t_start_h):
+    """
+    Returns a warning message if the virtual heater settings are out of range, otherwise None.
+    """
+    if not -40 <= ambient_temp <= 40:
+        return "Ambient temperature out of expected range: -40 to 40°C"
+    if not 10 <= t_start_h <= 90:
+        return "Initial return temperature out of expected range: 10 to 90°C"
+    return None
+
+
+def tempToVoltage(temp):
+    min_temp = 0
+    max_temp = 100
+    min_voltage = 0
+    max_voltage = 5
+
+    voltage = ((temp - min_temp) / (max_temp - min_temp)) * (max_voltage - min_voltage) + min_voltage
+
+    correction_factor = 1
+    corrected_voltage = voltage * correction_factor
+
+    corrected_voltage = max(min(corrected_voltage, max_voltage), min_voltage)
+
+    return corrected_voltage
+
+
+def adjustDesignParameters(ambient_temp, default_q_design_e=DEFAULT_Q_DESIGN_E):
+    heat_pump_sizes = {
+        -10: (1.0, 11590, 55),
+        -7: (0.885, 11590, 52),
+        2: (0.538, 11590, 42),
+        7: (0.346, 11590, 36),
+        12: (0.154, 11590, 30)
+    }
+
+    closest_temp = None
+    for temp in sorted(heat_pump_sizes.keys()):
+        if ambient_temp >= temp:
+            closest_temp = temp
+        else:
+            break
+
+    if closest_temp is None:
+        closest_temp = min(heat_pump_sizes.keys())
+
+    partLoadR, base_q_design, t_flow_design = heat_pump_sizes[closest_temp]
+    new_q_design_e = partLoadR * base_q_design  # Adjust q_design based on part load ratio
+    boostHeat = ambient_temp <= -10
+
+    print(f"Ambient Temp: {ambient_temp}, Part Load Ratio: {partLoadR}, Design Heating Power: {new_q_design_e}, Target Flow Temp: {t_flow_design}")
+
+    return new_q_design_e, t_flow_design, boostHeat
+
+
+def toFloat(value):
+    return float(value) if value != 'N/A' and value is not None else None
+
+
+class ControllerEngine:
+    def __init__(self, port, baudRate=BAUD_RATE, log=printLog, echoSerial=False, bus=None):
+        """
+        :param port: Serial port of the Arduino
+        :param baudRate: Serial baud rate
+        :param log: Callable(message, messageType) receiving operator messages, e.g. eventBus.publishLog(bus)
+        :param echoSerial: Print every received telemetry line to stdout
+        :param bus: EventBus the samples, readings, commands and state changes are published on; a new one if None
+        """
+        self.port = port
+        self.baudRate = baudRate
+        self.log = log
+        self.echoSerial = echoSerial
+        self.bus = bus if bus is not None else EventBus()
+
+        # Client callbacks, called on the polling thread: onReading(readings) for every telemetry line,
+        # onSample(record, timestamp) for every logged sample (timestamp in seconds since the epoch)
+        self.onReading = None
+        self.onSample = None
+
+        self.arduinoSerial = None
+        self.currentMassFlow = 0.0
+        self.boostHeatPower = BOOST_HEAT_POWER
+        self.currentBuildingModel = None
+        self.ambientTemp = None
+        self.initialReturnTemp = None
+
+        self.t_sup_history = deque(maxlen=MODEL_HISTORY_LENGTH)
+        self.t_ret_mea_history = deque(maxlen=MODEL_HISTORY_LENGTH)
+        self.t_ret_history = deque(maxlen=MODEL_HISTORY_LENGTH)
+
+        self.lastDACVoltage = '0.00'
+        self.lastSPtemp = '0.00'
+        self.lastFlowRate = '0.00'
+
+        self.simulated_time = datetime.now()  # Initialize simulated time
+
+        # Device timestamps mapped to the host clock: monotonic time plus its offset to the wall clock at connection
+        self.clock = time.monotonic
+        self.wallClockOffset = time.time() - self.clock()
+        self.clockSync = ClockSync()
+
+        # Telemetry rate the model is stepped at [Hz]; follows the rate confirmed by the Arduino
+        self.sampleRate = 1.0
+        # Sampling requested with setSampling(), sent once the Arduino streams telemetry (None keeps its setting)
+        self.requestedSampleRate = None
+        self.requestedAvgWindow = None
+        self.requestedBatchSamples = None
+        self.samplingSent = False
+
+        # Sequence numbers, acknowledgements and round-trip times of the commands sent to the Arduino
+        self.ackTracker = AckTracker()
+        self.ackTimeoutReported = False
+        # Sequence numbers of the telemetry samples: lost and repeated samples, kept across reconnects
+        self.sequenceTracker = SequenceTracker()
+        # Latency histograms from a received line to its setVoltage write, recorded in the session header
+        self.latencyTrace = LatencyTrace()
+        # Counters for monitoring (metricsServer.py), kept across reconnects
+        self.samplesReceived = 0
+        self.parseErrors = 0
+        self.serialConnects = 0
+        self.stepTimes = LatencyHistogram()  # Duration of the model's doStep() [s]
+
+        self.headers_written = False
+        self.csv_file_path = None
+        self.csv_lock_path = None
+        self.csv_lock = None
+        self.csv_file = None
+        self.csv_writer = None  # Background CSVWriterThread while the log is open
+
+        # CSV writer settings, applied when the log is opened
+        self.csvFlushRows = CSV_FLUSH_ROWS
+        self.csvFlushInterval = CSV_FLUSH_INTERVAL
+        self.csvFsyncPolicy = CSV_FSYNC_POLICY
+        self.csvErrorReported = False
+
+        # Commit samples to a checksummed journal (bench1.journal) before the CSV log, see sampleJournal.py
+        self.useJournal = True
+
+        # Write the CSV log as rotating zstd-compressed segments (bench1.csv -> bench1.segments) instead of one file
+        self.logSegments = False
+        self.segmentMaxBytes = None  # None uses the segmentLog defaults
+        self.segmentMaxSeconds = None
+
+        # Columnar session recorded next to the CSV log (bench1.csv -> bench1.session)
+        self.recordSession = True
+        self.session_path = None
+        self.session_writer = None
+        self.modelParameters = {}
+
+        # Optional SQLite database shared by all sessions; set database_path to enable it
+        self.database_path = None
+        self.database_writer = None
+
+        # Replay a recorded session instead of reading the Arduino; set replayPath to enable it
+        self.replayPath = None
+        self.replaySpeed = 1.0  # Playback speed factor; None replays as fast as the pipeline processes the lines
+        self.replayReported = False
+
+        # Statistics published by poll() for readers on other threads (the GUI's status line), replaced as a whole
+        self.controlLoop = None  # ControlLoop calling poll(), whose timing statistics go into the snapshot
+        self.lastStatsSnapshot = None
+        self.publishStatsSnapshot()
+
+    def isConnected(self):
+        return self.arduinoSerial is not None and self.arduinoSerial.isOpen()
+
+    def connect(self):
+        """
+        Opens the serial connection (or the replayed session). Raises serial.SerialException on failure.
+        """
+        if self.replayPath:
+            from replaySource import ReplaySerial
+            self.arduinoSerial = ReplaySerial(self.replayPath, self.replaySpeed)
+            if self.arduinoSerial.startTime is not None:
+                self.simulated_time = datetime.fromtimestamp(self.arduinoSerial.startTime)  # Log the recorded times
+            self.sampleRate = self.arduinoSerial.sampleRate
+            self.replayReported = False
+            self.bus.publish(StateEvent('connected', True))
+            return
+        self.arduinoSerial = serial.Serial(self.port, self.baudRate, timeout=1)
+        self.serialConnects += 1
+        self.samplingSent = False  # The board restarts when the port is opened
+        self.ackTimeoutReported = False
+        self.sequenceTracker.restart()
+        self.clockSync.reset()
+        self.wallClockOffset = time.time() - self.clock()
+        self.bus.publish(StateEvent('connected', True))
+
+    @property
+    def samplePeriod(self):
+        """
+        Time between two telemetry lines [s], the step size of the building model.
+        """
+        return 1.0 / self.sampleRate
+
+    def setSampling(self, sampleRate=None, avgWindow=None, batchSamples=None):
+        """
+        Requests a telemetry rate (1..MAX_SAMPLE_RATE Hz), averaging window (1..MAX_AVG_WINDOW samples) and/or
+        batch size (samples per telemetry line, 1..MAX_BATCH_SAMPLES; rates up to MAX_BATCH_SAMPLE_RATE Hz need
+        a batch size above 1) from the Arduino. The commands are sent once telemetry arrives, as the board ignores
+        them while it starts up; the model time step changes when the Arduino confirms the new rate.
+        Raises ValueError for values out of range.
+        """
+        error = validateSampling(sampleRate, avgWindow, batchSamples)
+        if error:
+            raise ValueError(error)
+        self.requestedSampleRate = None if sampleRate is None else int(sampleRate)
+        self.requestedAvgWindow = None if avgWindow is None else int(avgWindow)
+        self.requestedBatchSamples = None if batchSamples is None else int(batchSamples)
+        self.samplingSent = False
+
+    def sendSampling(self):
+        self.samplingSent = True
+        if self.replayPath:
+            return  # A replay keeps the recorded rate
+        if self.requestedBatchSamples is not None:  # First, as rates above MAX_SAMPLE_RATE need batches
+            self.sendSerialCommand(f"setBatch {self.requestedBatchSamples}")
+        if self.requestedSampleRate is not None:
+            self.sendSerialCommand(f"setRate {self.requestedSampleRate}")
+        if self.requestedAvgWindow is not None:
+            self.sendSerialCommand(f"setAvgWindow {self.requestedAvgWindow}")
+
+    def disconnect(self):
+        if self.isConnected():
+            self.arduinoSerial.close()
+            self.bus.publish(StateEvent('connected', False))
+            return True
+        return False
+
+    def poll(self):
+        """
+        Reads and processes the telemetry lines that were waiting on the serial port when it was called. Lines that
+        arrive meanwhile are left for the next call, so a consumer slower than the sample rate cannot keep one
+        control loop iteration running; a replay bounds each call itself (ReplaySerial.sliceSeconds).
+        """
+        try:
+            if self.replayPath:
+                budget = float('inf')
+            else:
+                budget = self.arduinoSerial.in_waiting if self.arduinoSerial else 0  # Bytes read at most
+            while budget > 0 and self.arduinoSerial and self.arduinoSerial.in_waiting:
+                serialData = self.arduinoSerial.readline()
+                budget -= len(serialData)
+                self.latencyTrace.begin()
+                serialData = serialData.decode('utf-8').strip()
+                self.processLine(serialData)
+        except serial.SerialException as e:
+            self.log(f"> Error reading from serial: {e}", "error")
+        self.checkAcknowledgements()
+        self.checkCSVWriter()
+        if time.monotonic() - self.lastStatsSnapshot >= STATS_SNAPSHOT_INTERVAL:
+            self.publishStatsSnapshot()
+        if self.replayFinished() and not self.replayReported:
+            from replaySource import formatReplayStats
+            self.replayReported = True
+            self.log(f"> Replay finished: {formatReplayStats(self.arduinoSerial.stats())}")
+
+    def checkAcknowledgements(self):
+        lost = self.ackTracker.expire()
+        if lost and not self.ackTimeoutReported:
+            self.ackTimeoutReported = True  # Further losses are counted in commandStats()
+            sequence, command = lost[0]
+            self.log(f"> Command #{sequence} ({command}) was not acknowledged within {self.ackTracker.timeout:g} s",
+                     "warning")
+
+    def handleAcknowledgement(self, serialData):
+        """
+        Matches an ACK/NAK line to the command it answers. Returns False if the line is not an acknowledgement.
+        """
+        reply = self.ackTracker.handleReply(serialData)
+        if reply is None:
+            return serialData.startswith(('ACK ', 'NAK '))  # Late reply to an expired command
+        accepted, command, reason, rtt = reply
+        if not accepted:
+            self.log(f"> Arduino rejected '{command}': {reason}", "warning")
+        elif command.startswith("setRate "):
+            self.sampleRate = float(command.split()[1])
+            self.log(f"> Arduino sample rate set to {self.sampleRate:g} Hz")
+        elif command.startswith("setAvgWindow "):
+            self.log(f"> Arduino averaging window set to {command.split()[1]} samples")
+        elif command.startswith("setBatch "):
+            self.log(f"> Arduino batch size set to {command.split()[1]} samples")
+        return True
+
+    def commandStats(self):
+        """
+        Command acknowledgement statistics (sent, acknowledged, rejected, lost, round-trip times [s]).
+        """
+        return self.ackTracker.stats()
+
+    def sequenceStats(self):
+        """
+        Telemetry sample statistics (received, lost, loss rate, gaps, duplicates, late samples, board restarts).
+        """
+        return self.sequenceTracker.stats()
+
+    def clockStats(self):
+        """
+        Device clock statistics (offset to the host clock [s], drift [ppm], delay of the last and slowest read [s]).
+        """
+        return self.clockSync.stats()
+
+    def latencyStats(self):
+        """
+        Latency statistics per stage from a received line to its setVoltage write (count, mean, p50, p99, p999, max [s]).
+        """
+        return self.latencyTrace.stats()
+
+    def publishStatsSnapshot(self):
+        """
+        Replaces statsSnapshot with the current CSV writer, command, telemetry, sample-to-DAC latency and control
+        loop statistics. Called on the control loop thread, which already holds controlLoop.lock.
+        """
+        self.lastStatsSnapshot = time.monotonic()
+        self.statsSnapshot = {
+            'csv': self.csvStats(),
+            'commands': self.commandStats(),
+            'samples': self.sequenceStats(),
+            'latency': self.latencyStats()['total'],
+            'control': self.controlLoop.stats() if self.controlLoop else None
+        }
+
+    def replayFinished(self):
+        """
+        True once every line of the replayed session has been processed.
+        """
+        return bool(self.replayPath) and self.isConnected() and self.arduinoSerial.finished
+
+    def replayStats(self):
+        """
+        Replay throughput statistics (lines, lines/s, commands and their checksum, lag), or None while not replaying.
+        """
+        return self.arduinoSerial.stats() if self.replayPath and self.arduinoSerial else None
+
+    def processLine(self, serialData):
+        """
+        Parses one telemetry line (or batch of samples), steps the building model and logs the resulting samples.
+        Returns the last logged sample record, or None if the line did not produce one.
+        """
+        if self.echoSerial:
+            print(f"Received serial data: {serialData}")
+
+        if self.handleAcknowledgement(serialData):
+            return None
+        if serialData.startswith(BATCH_PREFIX):
+            return self.processBatch(serialData)
+        if ':' not in serialData:
+            return None
+        if serialData.startswith(SAMPLE_RATE_REPLY):  # Confirmation of a setRate sent without a sequence number
+            try:
+                self.sampleRate = float(serialData[len(SAMPLE_RATE_REPLY):].split()[0])
+                self.log(f"> Arduino sample rate set to {self.sampleRate:g} Hz")
+                self.bus.publish(StateEvent('sampleRate', self.sampleRate))
+            except (ValueError, IndexError) as e:
+                self.parseErrors += 1
+                print(f"Error converting sample rate: {e}")
+            return None
+        if serialData.startswith(AVG_WINDOW_REPLY):
+            self.log(f"> Arduino averaging window set to {serialData[len(AVG_WINDOW_REPLY):]}")
+            return None
+        dataDict = parseTelemetryLine(serialData)
+        self.latencyTrace.mark('parse')
+        missedSamples = self.checkSequence(dataDict)
+        if missedSamples is None:
+            return None
+        return self.processSample(dataDict, missedSamples)
+
+    def checkSequence(self, dataDict):
+        """
+        Tracks the sequence number ('Seq') of a telemetry sample. Returns the number of samples lost just before it,
+        or None if it is a repeat or arrived late and is dropped.
+        """
+        if 'Seq' not in dataDict:
+            return 0  # Firmware without sequence numbers, or a replayed log
+        try:
+            sequence = int(dataDict['Seq'])
+        except ValueError as e:
+            self.parseErrors += 1
+            print(f"Error converting sequence number: {e}")
+            return 0
+        restarts = self.sequenceTracker.restarts
+        missedSamples = self.sequenceTracker.update(sequence)
+        if missedSamples:
+            self.log(f"> Telemetry gap: {missedSamples} sample(s) lost before sample #{sequence}", "warning")
+        elif self.sequenceTracker.restarts != restarts:
+            self.log(f"> Arduino restarted counting samples at #{sequence}", "warning")
+        return missedSamples
+
+    def processBatch(self, serialData):
+        """
+        Processes the samples of a batch line in order, each at its own time offset. Only the last sample sends
+        a setVoltage command: the voltages for the earlier ones would arrive after they are superseded.
+        """
+        try:
+            batch = parseTelemetryBatch(serialData)
+        except ValueError as e:
+            self.parseErrors += 1
+            self.log(f"> Malformed telemetry batch: {e}", "warning")
+            return None
+        self.latencyTrace.mark('parse')
+        record = None
+        previousOffset = None
+        for index, (offset, dataDict) in enumerate(batch):
+            missedSamples = self.checkSequence(dataDict)
+            if missedSamples is None:
+                continue
+            if previousOffset is not None:
+                # The time moved on by one sample period after the previous sample; use the recorded spacing instead
+                self.simulated_time += timedelta(milliseconds=offset - previousOffset, seconds=-self.samplePeriod)
+            previousOffset = offset
+            record = self.processSample(dataDict, missedSamples, sendVoltage=index == len(batch) - 1) or record
+        return record
+
+    def processSample(self, dataDict, missedSamples=0, sendVoltage=True):
+        """
+        Steps the building model with one sample (dict of raw string values) and logs it.
+        Lost samples before it leave a gap of as many sample periods in the logged times and lengthen the model step.
+        Returns the logged sample record, or None.
+        """
+        readings = {}
+        self.samplesReceived += 1
+        if missedSamples:
+            self.simulated_time += timedelta(seconds=missedSamples * self.samplePeriod)
+        if 'Time' in dataDict:
+            try:
+                takenAt = self.clockSync.update(float(dataDict['Time']), self.clock() + self.wallClockOffset)
+                self.simulated_time = datetime.fromtimestamp(takenAt)  # When the sample was taken, on the host clock
+            except ValueError as e:
+                self.parseErrors += 1
+                print(f"Error converting device time: {e}")
+
+        if 'STemp' in dataDict:
+            try:
+                t_sup = float(dataDict['STemp'])
+                self.updateBuildingModel(t_sup, sendVoltage=sendVoltage,
+                                         stepSize=(1 + missedSamples) * self.samplePeriod)
+                readings['t_sup'] = t_sup
+            except ValueError as e:
+                self.parseErrors += 1
+                print(f"Error converting temperature: {e}")
+
+        if 'RTemp' in dataDict:
+            try:
+                t_ret_mea = float(dataDict['RTemp'])
+                self.t_ret_mea_history.append(t_ret_mea)
+                readings['t_ret_mea'] = t_ret_mea
+            except ValueError as e:
+                self.parseErrors += 1
+                print(f"Error converting return temperature: {e}")
+
+        dacVoltage = dataDict.get('DACVolt', self.lastDACVoltage)
+        readings['dacVoltage'] = dacVoltage
+        self.lastDACVoltage = dacVoltage
+
+        model_return_temp = None  # Ensure model_return_temp is always defined
+        if self.currentBuildingModel:
+            model_return_temp = self.currentBuildingModel.t_ret
+            if model_return_temp >= 0:
+                self.lastSPtemp = model_return_temp
+                readings['model_return_temp'] = model_return_temp
+            else:
+                readings['model_return_temp'] = None
+
+        flowRate = dataDict.get('FlowRate', self.lastFlowRate)
+        readings['flowRate'] = flowRate
+        self.lastFlowRate = flowRate
+
+        record = None
+        if 'FlowRate' in dataDict:
+            flowRateLPS = float(dataDict['FlowRate'])
+            self.currentMassFlow = flowRateLPS * 3600
+            readings['flowRateLPS'] = flowRateLPS
+
+            if self.currentBuildingModel:
+                model = self.currentBuildingModel
+                # Milliseconds above 1 Hz, also for the lines logged before the Arduino confirms a requested rate
+                fastRate = max(self.sampleRate, self.requestedSampleRate or 0) > 1
+                timeFormat = '%H:%M:%S.%f' if fastRate else '%H:%M:%S'
+                record = self.addSample(
+                    self.simulated_time.strftime(timeFormat)[:12],
+                    dataDict.get('STemp', 'N/A'),
+                    dacVoltage,
+                    model_return_temp if model_return_temp is not None else "N/A",
+                    flowRate,
+                    dataDict.get('RTemp', 'N/A'),
+                    model.q_dot_hb, model.q_dot_ba, model.q_dot_hp, model.q_dot_int, model.q_dot_bh, model.MassB.T
+                )
+
+            self.simulated_time += timedelta(seconds=self.samplePeriod)  # Increment simulated time by one sample
+
+            if not self.samplingSent:
+                self.sendSampling()
+
+        self.bus.publish(ReadingEvent(readings))
+        if self.onReading:
+            self.onReading(readings)
+        return record
+
+    def createBuildingModel(self, ambient_temp):
+        from bamLoadBasedTesting.twoMassModel import CalcParameters
+
+        q_design_e, t_flow_design, boostHeat = adjustDesignParameters(ambient_temp, DEFAULT_Q_DESIGN_E)
+        mass_flow = max(self.currentMassFlow / 3600.0, 0.001)  # Convert from l/h to kg/s, ensure non-zero
+
+        calc_params = CalcParameters(
+            t_a=ambient_temp,
+            q_design=q_design_e,
+            t_flow_design=t_flow_design,
+            mass_flow=mass_flow,
+            boostHeat=boostHeat,
+            maxPowBooHea=self.boostHeatPower,
+            const_flow=True,
+            tau_b=209125,
+            tau_h=1957,
+            t_b=20
+        )
+        self.currentBuildingModel = calc_params.createBuilding()
+        self.ambientTemp = ambient_temp
+
+        self.modelParameters = {
+            't_a': ambient_temp, 'q_design': q_design_e, 't_flow_design': t_flow_design, 'mass_flow': mass_flow,
+            'boostHeat': boostHeat, 'maxPowBooHea': self.boostHeatPower, 'tau_b': 209125, 'tau_h': 1957, 't_b': 20
+        }
+        for writer, name in self.storeWriters():
+            writer.setModelParameters(self.modelParameters)
+        return q_design_e
+
+    def initializeBuildingModel(self, ambient_temp, initial_return_temp):
+        """
+        Creates a fresh building model and resets the temperature histories.
+        Returns the design heating power used for the model.
+        """
+        q_design_e = self.createBuildingModel(ambient_temp)
+        self.initialReturnTemp = initial_return_temp
+
+        # Initialize temperature histories
+        self.t_sup_history.clear()
+        self.t_ret_history.clear()
+        self.t_ret_history.append(initial_return_temp)  # Start with the initial return temperature
+        self.bus.publish(StateEvent('model', (ambient_temp, initial_return_temp)))
+        return q_design_e
+
+    def updateSettings(self, ambient_temp):
+        """
+        Recalculates the model parameters for a new ambient temperature, keeping the histories.
+        """
+        return self.createBuildingModel(ambient_temp)
+
+    def updateBuildingModel(self, new_t_sup, retry_count=3, sendVoltage=True, stepSize=None):
+        self.t_sup_history.append(new_t_sup)
+
+        # Use the latest measured return temperature if available
+        last_t_ret_mea = self.t_ret_mea_history[-1] if self.t_ret_mea_history else new_t_sup - 5
+
+        if self.currentBuildingModel is None:
+            return
+
+        try:
+            mass_flow = max(self.currentMassFlow / 3600.0, 0.001)
+
+            stepStart = time.perf_counter()
+            self.currentBuildingModel.doStep(
+                t_sup=new_t_sup,
+                t_ret_mea=last_t_ret_mea,
+                m_dot=mass_flow,
+                stepSize=stepSize or self.samplePeriod,
+                q_dot_int=0
+            )
+            self.stepTimes.record(time.perf_counter() - stepStart)
+
+            new_t_ret = self.currentBuildingModel.t_ret
+
+            if new_t_ret < 0:
+                raise ValueError(f"Calculated return temperature is negative ({new_t_ret:.2f}°C).")
+
+            self.t_ret_history.append(new_t_ret)
+
+            if sendVoltage:
+                self.latencyTrace.mark('step')
+                dac_voltage = tempToVoltage(new_t_ret)
+                self.sendSerialCommand(f"setVoltage {dac_voltage:.2f}")
+
+        except Exception as e:
+            self.log(f"Failed to update building model: {e}", "error")
+            if retry_count > 0:
+                self.log(f"Retrying building model initialization... {retry_count} retries left", "warning")
+                self.reinitialize()
+            else:
+                self.log("Exceeded maximum retries for building model initialization.", "error")
+
+    def reinitialize(self):
+        """
+        Re-creates the building model from the last settings and re-opens the serial connection if needed.
+        """
+        try:
+            if self.ambientTemp is not None:
+                self.initializeBuildingModel(self.ambientTemp, self.initialReturnTemp)
+            if not self.isConnected():
+                self.connect()
+            self.log("Retry successful. Model Initialized.", "info")
+        except Exception as e:
+            self.log(f"> Failed to initialize building model: {e}", "error")
+
+    def sendSerialCommand(self, command):
+        """
+        Sends a command with a sequence number, so its acknowledgement can be matched (a replay does not answer).
+        """
+        if self.isConnected():
+            if not self.replayPath:
+                command = self.ackTracker.send(command)
+            self.latencyTrace.mark('enqueue')
+            self.arduinoSerial.write((command + '\n').encode())
+            self.latencyTrace.mark('write')
+            self.bus.publish(CommandEvent(command))
+        else:
+            self.log("> Error: Serial connection not established.", "error")
+
+    def sendArduinoCommand(self, commandType, value=None):
+        if commandType in ['setVoltage', 'setTemp', 'setTolerance']:
+            if value is not None:
+                command = f"{commandType} {value}"
+            else:
+                print(f"Value required for command type: {commandType}")
+                return
+        elif commandType in ['activateVirtualHeater']:
+            command = commandType
+        else:
+            print(f"Unknown command type: {commandType}")
+            return
+
+        self.sendSerialCommand(command)
+
+    def addSample(self, timestamp, temperature, dacVoltage, model_return_temp, flowRate, returnTemperature, q_hb, q_ba, q_hp, q_int, q_bh, t_b):
+        """
+        Converts a sample to a record of floats, queues it for the CSV log, publishes it and hands it to onSample.
+        """
+        try:
+            new_entry = [timestamp] + [toFloat(value) for value in [
+                temperature, dacVoltage, model_return_temp, flowRate, returnTemperature,
+                q_hb, q_ba, q_hp, q_int, q_bh, t_b
+            ]]
+        except ValueError as e:
+            self.log(f"Error processing data for spreadsheet: {e}", "error")
+            return None
+
+        timestamp = self.simulated_time.timestamp()
+        if self.csv_writer:
+            self.csv_writer.submitSample(new_entry, timestamp)
+        storeWriters = self.storeWriters()
+        if storeWriters:
+            from sampleStore import storeRow
+            row = storeRow(timestamp, new_entry)
+            for writer, name in storeWriters:
+                writer.submit(row)
+
+        self.bus.publish(SampleEvent(new_entry, timestamp))
+        if self.onSample:
+            self.onSample(new_entry, timestamp)
+        return new_entry
+
+    def setCSVFilePath(self, file_path):
+        self.csv_file_path = file_path
+        self.csv_lock_path = file_path + ".lock"
+        self.headers_written = False
+
+        from sessionStore import sessionPathFor
+        self.session_path = sessionPathFor(file_path) if self.recordSession else None
+
+    def initCSVFile(self, metadata=()):
+        """
+        Locks and opens the CSV log, writes the metadata preamble and column headers and starts the writer thread.
+        :param metadata: (name, value) pairs written above the column headers
+        """
+        if not self.csv_file_path:
+            self.log("CSV file path not set.", "error")
+            return
+
+        from filelock import FileLock
+
+        self.csv_lock = FileLock(self.csv_lock_path)
+        self.csv_lock.acquire()
+        writerArgs = dict(flushRows=self.csvFlushRows, flushInterval=self.csvFlushInterval, fsyncPolicy=self.csvFsyncPolicy)
+
+        if self.logSegments:
+            from segmentLog import SegmentWriterThread, segmentsPathFor
+            segmentArgs = {name: value for name, value in (('maxBytes', self.segmentMaxBytes),
+                                                           ('maxSeconds', self.segmentMaxSeconds)) if value}
+            self.csv_writer = SegmentWriterThread(segmentsPathFor(self.csv_file_path), metadata, SAMPLE_COLUMNS,
+                                                  **segmentArgs, **writerArgs)
+            self.headers_written = True  # Every segment starts with the preamble
+        else:
+            if self.useJournal:
+                from sampleJournal import recoverJournal, journalPathFor
+                recovered = recoverJournal(journalPathFor(self.csv_file_path), self.csv_file_path, metadata,
+                                           SAMPLE_COLUMNS)
+                if recovered is not None:
+                    self.log(f"> Recovered {recovered} samples from the journal of an interrupted run.", "warning")
+                    self.headers_written = True  # Continue the interrupted log
+
+            # Open the file in append mode
+            self.csv_file = open(self.csv_file_path, 'a', newline='', encoding='utf-8')
+
+            # Write headers if not already written
+            if not self.headers_written:
+                headerWriter = csv.writer(self.csv_file)
+                for name, value in metadata:
+                    headerWriter.writerow([name, value])
+                headerWriter.writerow([])  # Empty row to separate the metadata from the column headers
+                headerWriter.writerow(SAMPLE_COLUMNS)
+                self.csv_file.flush()
+                self.headers_written = True
+
+            if self.useJournal:
+                from sampleJournal import JournaledCSVWriterThread, journalPathFor
+                self.csv_writer = JournaledCSVWriterThread(self.csv_file, journalPathFor(self.csv_file_path),
+                                                           **writerArgs)
+            else:
+                self.csv_writer = CSVWriterThread(self.csv_file, **writerArgs)
+        self.csvErrorReported = False
+        self.csv_writer.start()
+
+        if self.session_path:
+            from sessionStore import SessionWriterThread
+            self.session_writer = SessionWriterThread(self.session_path, metadata, SAMPLE_COLUMNS, **writerArgs)
+            self.session_writer.start()
+
+        if self.database_path:
+            import sqlite3
+            from sqliteStore import SQLiteWriterThread
+            try:
+                self.database_writer = SQLiteWriterThread(
+                    self.database_path, os.path.basename(self.csv_file_path), metadata, **writerArgs)
+                self.database_writer.start()
+            except sqlite3.Error as e:
+                self.log(f"> Error opening sample database {self.database_path}: {e}", "error")
+
+        if self.modelParameters:
+            for writer, name in self.storeWriters():
+                writer.setModelParameters(self.modelParameters)
+        self.bus.publish(StateEvent('csvFile', self.csv_file_path))
+
+    def storeWriters(self):
+        """
+        Open writers that record STORE_COLUMNS rows (columnar session, SQLite database), as (writer, name) pairs.
+        """
+        return [(writer, name) for writer, name in ((self.session_writer, "session"), (self.database_writer, "database"))
+                if writer]
+
+    def flushCSVBuffer(self, timeout=5.0):
+        """
+        Waits until every queued row is on disk. Returns False if the writers did not finish within the timeout.
+        """
+        return self.waitForCSVFlush(self.requestCSVFlush(), timeout)
+
+    def requestCSVFlush(self):
+        """
+        Asks the CSV, session and database writers to write every queued row, without waiting for them.
+        Returns the requests to pass to waitForCSVFlush(), e.g. after releasing the control loop's lock.
+        """
+        if not self.csv_file_path:
+            self.log("CSV file path not set.", "error")
+            return None
+
+        if not self.csv_writer:
+            return None
+        if self.session_writer:
+            self.session_writer.setLatencyHistograms(self.latencyTrace.export())  # Exported with the session
+        return [self.csv_writer.requestFlush()] + [writer.requestFlush() for writer, name in self.storeWriters()]
+
+    @staticmethod
+    def waitForCSVFlush(requests, timeout=5.0):
+        """
+        Waits for the flush requests of requestCSVFlush(). Returns False if there were none or they did not all
+        finish within the timeout.
+        """
+        if requests is None:
+            return False
+        deadline = time.monotonic() + timeout
+        return all([request.wait(max(deadline - time.monotonic(), 0)) for request in requests])
+
+    def checkCSVWriter(self):
+        """
+        Reports a failed write of the writer threads once, from the calling (acquisition) thread.
+        """
+        if self.csvErrorReported:
+            return
+        for writer, name in [(self.csv_writer, "CSV log")] + self.storeWriters():
+            if writer and writer.error:
+                self.csvErrorReported = True
+                self.log(f"> Error writing {name}: {writer.error}", "error")
+
+    def csvStats(self):
+        """
+        Writer statistics (queue depth, rows written, write latencies), or None while no log is open.
+        """
+        return self.csv_writer.stats() if self.csv_writer else None
+
+    def closeCSVFile(self):
+        """
+        Writes the queued rows, stops the writer thread, releases the lock, closes the CSV log and deletes the lock file.
+        """
+        if self.csv_lock:
+            if self.csv_writer:
+                self.csv_writer.close()
+            if self.session_writer:
+                self.session_writer.setLatencyHistograms(self.latencyTrace.export())
+            for writer, name in self.storeWriters():
+                writer.close()
+            self.checkCSVWriter()
+            self.session_writer = None
+            self.database_writer = None
+            self.csv_lock.release()
+            if self.csv_file:
+                self.csv_file.close()
+            self.csv_file = None
+            self.csv_lock = None
+            self.csv_writer = None
+            # Delete the lock file if it exists
+            if os.path.exists(self.csv_lock_path):
+                os.remove(self.csv_lock_path)
+                self.log("> CSV lock file deleted.")
+            self.bus.publish(StateEvent('csvFile', None))
+
+    def shutdown(self):
+        """
+        Flushes the log, sets the DAC output to 0 V and closes the serial connection and CSV file.
+        """
+        if self.csv_file_path:
+            self.flushCSVBuffer()
+        self.sendSerialCommand("setVoltage 0")
+        if self.disconnect():
+            self.log("> Serial connection closed.")
+        self.closeCSVFile()
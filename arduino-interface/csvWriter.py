@@ -0,0 +1,168 @@
+"""
+    Background log writers: rows are queued by the acquisition thread and written by a dedicated thread,
+    so disk I/O never stalls acquisition. BatchWriterThread does the queueing, batching and syncing;
+    subclasses implement writeRows() and syncFile() for a storage format (CSV here, columnar sessions in sessionStore.py).
+
+    A batch is written when CSV_FLUSH_ROWS rows are queued or the oldest queued row is CSV_FLUSH_INTERVAL seconds old.
+    Rows lost on a crash are therefore bounded by the flush interval (plus one write latency); with the 'batch'
+    fsync policy that bound also holds for power loss.
+"""
+
+import os
+import csv
+import time
+import queue
+import threading
+
+CSV_FLUSH_ROWS = 100
+CSV_FLUSH_INTERVAL = 1.0  # [s]
+
+# fsync policies: 'never' leaves syncing to the OS, 'batch' syncs after every written batch,
+# 'interval' syncs at most every CSV_FSYNC_INTERVAL seconds
+FSYNC_POLICIES = ('never', 'batch', 'interval')
+CSV_FSYNC_POLICY = 'batch'
+CSV_FSYNC_INTERVAL = 10.0  # [s]
+
+_STOP = object()
+
+
+class BatchWriterThread(threading.Thread):
+    def __init__(self, name, flushRows=CSV_FLUSH_ROWS, flushInterval=CSV_FLUSH_INTERVAL,
+                 fsyncPolicy=CSV_FSYNC_POLICY, fsyncInterval=CSV_FSYNC_INTERVAL):
+        """
+        :param name: Thread name
+        :param flushRows: Queued rows that trigger a write
+        :param flushInterval: Maximum age of a queued row before it is written [s]
+        :param fsyncPolicy: One of FSYNC_POLICIES
+        :param fsyncInterval: Minimum time between two fsyncs for the 'interval' policy [s]
+        """
+        super(BatchWriterThread, self).__init__(name=name, daemon=True)
+        if fsyncPolicy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsyncPolicy}")
+        self.flushRows = flushRows
+        self.flushInterval = flushInterval
+        self.fsyncPolicy = fsyncPolicy
+        self.fsyncInterval = fsyncInterval
+        self.queue = queue.SimpleQueue()  # Unbounded: a slow disk delays the log, never acquisition
+        self.lastFsync = time.monotonic()
+        self.error = None
+
+        # Statistics, written by the writer thread only
+        self.rowsWritten = 0
+        self.batchesWritten = 0
+        self.lastWriteLatency = 0.0
+        self.maxWriteLatency = 0.0
+
+    def submit(self, row):
+        self.queue.put(row)
+
+    def submitSample(self, record, timestamp):
+        """
+        Queues a sample record as logged by ControllerEngine; writers that index by sample time override this.
+        """
+        self.submit(record)
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every row submitted so far is written (and synced unless the policy is 'never').
+        """
+        return self.requestFlush().wait(timeout)
+
+    def requestFlush(self):
+        """
+        Queues a flush of every row submitted so far; returns a threading.Event set once it is done.
+        """
+        done = threading.Event()
+        self.queue.put(done)
+        return done
+
+    def close(self, timeout=None):
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+    def queueDepth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {
+            'queueDepth': self.queueDepth(),
+            'rowsWritten': self.rowsWritten,
+            'batchesWritten': self.batchesWritten,
+            'lastWriteLatency': self.lastWriteLatency,
+            'maxWriteLatency': self.maxWriteLatency,
+            'error': self.error
+        }
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, list):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flushInterval
+                if len(batch) < self.flushRows:
+                    continue
+
+            # Row limit reached, time limit reached, or a flush/stop request (which also forces an fsync)
+            isRequest = item is not None and not isinstance(item, list)
+            if batch or isRequest:
+                self.writeBatch(batch, forceSync=isRequest)
+                batch = []
+            deadline = None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def writeBatch(self, batch, forceSync=False):
+        start = time.monotonic()
+        try:
+            if batch:
+                self.writeRows(batch)
+            if self.fsyncPolicy == 'batch' or (self.fsyncPolicy == 'interval' and (
+                    forceSync or start - self.lastFsync >= self.fsyncInterval)):
+                self.syncFile()
+                self.lastFsync = time.monotonic()
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return
+        if batch:
+            self.lastWriteLatency = time.monotonic() - start
+            self.maxWriteLatency = max(self.maxWriteLatency, self.lastWriteLatency)
+            self.rowsWritten += len(batch)
+            self.batchesWritten += 1
+
+    def writeRows(self, batch):
+        """
+        Writes a batch of rows and flushes them to the operating system.
+        """
+        raise NotImplementedError
+
+    def syncFile(self):
+        raise NotImplementedError
+
+
+class CSVWriterThread(BatchWriterThread):
+    def __init__(self, file, **writerArgs):
+        """
+        :param file: Text file opened for writing (newline='')
+        :param writerArgs: Batching and fsync settings, see BatchWriterThread
+        """
+        super(CSVWriterThread, self).__init__("CSVWriter", **writerArgs)
+        self.file = file
+        self.writer = csv.writer(file)
+
+    def writeRows(self, batch):
+        self.writer.writerows(batch)
+        self.file.flush()
+
+    def syncFile(self):
+        os.fsync(self.file.fileno())
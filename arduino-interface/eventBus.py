@@ -0,0 +1,222 @@
+"""
+    In-process publish/subscribe between the controller's pipeline stages.
+
+    The engine publishes typed events on the control loop thread: a logged sample (SampleEvent), the readings of a
+    telemetry line (ReadingEvent), a command written to the Arduino (CommandEvent), a log message (LogEvent) and
+    a change of the connection, log file or model (StateEvent). Each consumer (the GUI's terminal, labels and
+    spreadsheet, the live stream, ...) subscribes to the topics it needs and gets its own bounded queue, drained at
+    its own pace, on its own thread if it likes (SubscriberThread). A slow consumer therefore only fills its own
+    queue; what happens then is the overflow policy of that subscription:
+
+        'drop-oldest'  the oldest queued event makes room (a display that only needs recent data)
+        'drop-newest'  the new event is discarded (keeps a contiguous prefix)
+        'block'        the publisher waits up to blockTimeout for room, then drops the new event; only for
+                       consumers that must see everything and keep up on average
+
+    Publishing costs one lock and one append per subscriber. Depth, peak depth and drops of every queue are kept
+    for tuning (EventBus.stats(), the daemon's statistics and the metrics endpoint).
+"""
+
+import time
+import threading
+from collections import deque, namedtuple
+
+SampleEvent = namedtuple('SampleEvent', 'record timestamp')  # Record as logged; timestamp [s since the epoch]
+ReadingEvent = namedtuple('ReadingEvent', 'readings')  # Dict of the latest telemetry values and model outputs
+CommandEvent = namedtuple('CommandEvent', 'command')  # Command line as written to the serial port
+LogEvent = namedtuple('LogEvent', 'message messageType')
+StateEvent = namedtuple('StateEvent', 'state value')  # e.g. ('connected', True), ('csvFile', 'bench1.csv')
+
+TOPICS = {SampleEvent: 'sample', ReadingEvent: 'reading', CommandEvent: 'command', LogEvent: 'log',
+          StateEvent: 'state'}
+OVERFLOW_POLICIES = ('drop-oldest', 'drop-newest', 'block')
+QUEUE_DEPTH = 1000  # Default bound of a subscriber's queue [events]
+BLOCK_TIMEOUT = 0.1  # Longest wait of a publisher for a 'block' subscriber [s]
+
+
+class Subscription:
+    def __init__(self, name, topics, maxDepth=QUEUE_DEPTH, overflow='drop-oldest', blockTimeout=BLOCK_TIMEOUT):
+        """
+        :param name: Name of the consumer, for the statistics
+        :param topics: Topics delivered to this queue (values of TOPICS)
+        :param maxDepth: Events queued at most
+        :param overflow: One of OVERFLOW_POLICIES
+        :param blockTimeout: Longest wait of a publisher for the 'block' policy [s]
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        unknown = set(topics) - set(TOPICS.values())
+        if unknown:
+            raise ValueError(f"Unknown topics: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.topics = tuple(topics)
+        self.maxDepth = maxDepth
+        self.overflow = overflow
+        self.blockTimeout = blockTimeout
+        self.queue = deque()
+        self.condition = threading.Condition(threading.Lock())
+
+        # Statistics, updated under the condition's lock
+        self.delivered = 0
+        self.dropped = 0
+        self.peakDepth = 0
+
+    def put(self, event):
+        with self.condition:
+            if len(self.queue) >= self.maxDepth:
+                if self.overflow == 'drop-oldest':
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.overflow == 'drop-newest' or not self.condition.wait_for(
+                        lambda: len(self.queue) < self.maxDepth, self.blockTimeout):
+                    self.dropped += 1
+                    return
+            self.queue.append(event)
+            self.delivered += 1
+            self.peakDepth = max(self.peakDepth, len(self.queue))
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Next event, waiting up to `timeout` seconds (None: forever); None if there is none by then.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.queue, timeout):
+                return None
+            event = self.queue.popleft()
+            self.condition.notify_all()  # Room for a blocked publisher
+            return event
+
+    def drain(self, limit=None):
+        """
+        Takes up to `limit` queued events (all if None) without waiting. Taking all of them swaps the queue, so a
+        publisher waiting for the lock is held up for a constant time however many events are queued.
+        """
+        with self.condition:
+            if limit is None or limit >= len(self.queue):
+                events, self.queue = self.queue, deque()
+            else:
+                events = [self.queue.popleft() for _ in range(limit)]
+            if events:
+                self.condition.notify_all()
+        return list(events)
+
+    def depth(self):
+        return len(self.queue)
+
+    def counters(self):
+        """
+        Name, depth, delivered and dropped events, read without the lock, so a publisher is never held up; the
+        values may be one event apart from each other.
+        """
+        return {'name': self.name, 'depth': len(self.queue), 'delivered': self.delivered, 'dropped': self.dropped}
+
+    def stats(self):
+        with self.condition:
+            return {
+                'name': self.name,
+                'topics': self.topics,
+                'depth': len(self.queue),
+                'peakDepth': self.peakDepth,
+                'maxDepth': self.maxDepth,
+                'overflow': self.overflow,
+                'delivered': self.delivered,
+                'dropped': self.dropped
+            }
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()  # Guards changes of the subscriber lists; publish() reads a snapshot
+        self.subscribers = {topic: () for topic in TOPICS.values()}
+        self.subscriptions = ()
+        self.published = dict.fromkeys(TOPICS.values(), 0)
+
+    def subscribe(self, name, topics, maxDepth=QUEUE_DEPTH, overflow='drop-oldest', blockTimeout=BLOCK_TIMEOUT):
+        """
+        Returns a new Subscription receiving the events of `topics` published from now on. See Subscription.
+        """
+        subscription = Subscription(name, topics, maxDepth, overflow, blockTimeout)
+        with self.lock:
+            for topic in subscription.topics:
+                self.subscribers[topic] += (subscription,)
+            self.subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                self.subscribers[topic] = tuple(other for other in self.subscribers[topic] if other is not subscription)
+            self.subscriptions = tuple(other for other in self.subscriptions if other is not subscription)
+
+    def publish(self, event):
+        """
+        Queues an event for every subscriber of its topic. Raises KeyError for a type that is not in TOPICS.
+        """
+        topic = TOPICS[type(event)]
+        self.published[topic] += 1
+        for subscription in self.subscribers[topic]:
+            subscription.put(event)
+
+    def stats(self):
+        return [subscription.stats() for subscription in self.subscriptions]
+
+    def counters(self):
+        """
+        Subscription.counters() of every subscription, for readers that must not take the queues' locks.
+        """
+        return [subscription.counters() for subscription in self.subscriptions]
+
+
+def publishLog(bus):
+    """
+    A log(message, messageType) function publishing LogEvents, for ControllerEngine(log=...).
+    """
+    def log(message, messageType="info"):
+        bus.publish(LogEvent(message, messageType))
+    return log
+
+
+class SubscriberThread(threading.Thread):
+    def __init__(self, subscription, handle, name=None):
+        """
+        Runs a consumer on its own thread: handle(event) for every event of the subscription, in order.
+        :param subscription: Subscription to consume
+        :param handle: Callable taking one event; exceptions are counted in self.errors and the event is skipped
+        :param name: Thread name; defaults to the subscription's name
+        """
+        super(SubscriberThread, self).__init__(name=name or subscription.name, daemon=True)
+        self.subscription = subscription
+        self.handle = handle
+        self.stopping = threading.Event()
+        self.handled = 0
+        self.errors = 0
+        self.lastError = None
+
+    def run(self):
+        while not self.stopping.is_set():
+            event = self.subscription.get(timeout=0.1)
+            if event is None:
+                continue
+            try:
+                self.handle(event)
+                self.handled += 1
+            except Exception as e:
+                self.errors += 1
+                self.lastError = e
+
+    def stop(self, timeout=None):
+        """
+        Handles the events already queued, then ends the thread.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_alive() and self.subscription.depth() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+def formatBusStats(stats):
+    return ", ".join(f"{queue['name']} {queue['depth']}/{queue['maxDepth']} queued (peak {queue['peakDepth']}, "
+                     f"{queue['dropped']} dropped)" for queue in stats)
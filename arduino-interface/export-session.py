@@ -0,0 +1,52 @@
+"""
+    Exports a recorded columnar session (bench1.session) or compressed segment log (bench1.segments)
+    to a single CSV log in the controller's format, or prints a summary of it.
+    Sessions can also be exported to zstd-compressed CSV (.csv.zst) or a new columnar session (.session).
+    Example: python export-session.py bench1.session bench1-export.csv
+"""
+
+import sys
+import time
+import argparse
+from segmentLog import SegmentLog, SEGMENTS_SUFFIX
+from sessionStore import Session
+from exportJob import ExportJob
+
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description="Export a columnar session or segment log to CSV")
+    parser.add_argument('session', help="Session or segment directory")
+    parser.add_argument('csv', nargs='?', help="CSV file (.csv, .csv.zst or .session for sessions) to write; "
+                                               "prints a summary if omitted")
+    return parser.parse_args(argv)
+
+
+def openLog(path):
+    if path.rstrip('/\\').endswith(SEGMENTS_SUFFIX):
+        return SegmentLog(path)
+    return Session(path)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    start = time.perf_counter()
+    log = openLog(args.session)
+    print(f"Opened {len(log)} samples in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for name, value in log.metadata:
+        print(f"{name}: {value}")
+    for name, value in getattr(log, 'modelParameters', {}).items():
+        print(f"Model {name}: {value}")
+
+    if args.csv:
+        start = time.perf_counter()
+        if isinstance(log, Session):
+            ExportJob(log, args.csv).run()
+        else:
+            log.exportCSV(args.csv)
+        print(f"Exported to {args.csv} in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
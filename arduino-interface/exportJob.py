@@ -0,0 +1,290 @@
+"""
+    Streaming export of recorded samples to CSV (.csv), zstd-compressed CSV (.csv.zst) or a columnar session
+    (.session), for the "Export Data" button and export-session.py.
+
+    Rows are read from the source (a recorded Session, or a snapshot of the samples shown) in chunks and formatted
+    to CSV text with vectorized numpy code: every column is rendered into a byte matrix at once through four-digit
+    lookup tables, with no per-value Python work (about 8x faster than csv.writer). The output is written to
+    a temporary file and renamed when complete, so a cancelled or failed export never leaves a partial file behind.
+"""
+
+import io
+import os
+import csv
+import shutil
+import numpy as np
+from sessionStore import COLUMN_SUFFIX, COLUMN_DTYPE, localOffsets, newHeader, writeHeader
+from sampleStore import STORE_COLUMNS, hasSubSecondSpacing
+
+EXPORT_CHUNK_ROWS = 8192  # Rows formatted at a time; small enough for the text buffer to stay in the CPU cache
+EXPORT_DECIMALS = 6  # Decimals written for the sample values; trailing zeros are dropped
+FIXED_POINT_LIMIT = 1e12  # Chunks with larger values are formatted with repr() instead
+ZSTD_LEVEL = 3
+EXPORT_FORMATS = [  # (suffix, file dialog filter), the first is the default
+    ('.csv', "CSV Files (*.csv)"),
+    ('.csv.zst', "Compressed CSV (*.csv.zst)"),
+    ('.session', "Columnar Session (*.session)")
+]
+
+
+def wordTable(texts):
+    # Four characters per entry, packed into one uint32 so a digit group is written with a single gather
+    return np.frombuffer(''.join(texts).replace(' ', '\0').encode('ascii'), dtype=np.uint32)
+
+
+# Text of 0..9999 in four-digit groups, indexed by the group value (+ 10000 for the variant without padding zeros)
+# Zero bytes are padding and are removed from the finished text.
+DIGITS = wordTable(f"{value:04d}" for value in range(10000))
+LEADING_DIGITS = np.concatenate((DIGITS, wordTable(f"{value:4d}" if value else "    " for value in range(10000))))
+UNIT_DIGITS = LEADING_DIGITS.copy()
+UNIT_DIGITS[10000] = wordTable(["0   "])[0]  # Integer part of values below 1
+FRACTION_DIGITS = np.concatenate((DIGITS, wordTable(f"{value:04d}".rstrip('0').ljust(4) for value in range(10000))))
+
+
+def exportFormatFor(path):
+    """
+    Export format suffix of an output path; '.csv' when it has none of the supported suffixes.
+    """
+    for suffix, _ in sorted(EXPORT_FORMATS, key=lambda item: -len(item[0])):
+        if path.endswith(suffix):
+            return suffix
+    return EXPORT_FORMATS[0][0]
+
+
+def wordColumn(text, offset):
+    """
+    uint32 view of four bytes per row at a byte offset of a (rows, width) text buffer (not necessarily aligned).
+    """
+    return np.ndarray((len(text),), dtype=np.uint32, buffer=text, offset=offset, strides=(text.shape[1],))
+
+
+def timeWidth(milliseconds):
+    return 12 if milliseconds else 8
+
+
+def writeTimes(text, times, milliseconds=False):
+    """
+    Writes the local time of day (HH:MM:SS, or HH:MM:SS.mmm truncated to the millisecond) of epoch times
+    to the first timeWidth(milliseconds) bytes of each row.
+    """
+    secondsOfDay = (times.astype(np.int64) + localOffsets(times)) % 86400
+    for position, (divisor, modulus) in zip((0, 1, 3, 4, 6, 7), ((36000, 10), (3600, 10), (600, 6), (60, 10),
+                                                                    (10, 6), (1, 10))):
+        text[:, position] = secondsOfDay // divisor % modulus + ord('0')
+    text[:, [2, 5]] = ord(':')
+    if milliseconds:
+        # Same rounding as sampleStore.timeOfDayText()
+        fraction = (np.fmod(times, 1.0) * 1000 + 0.0005).astype(np.int64)
+        text[:, 8] = ord('.')
+        for position, divisor in zip((9, 10, 11), (100, 10, 1)):
+            text[:, position] = fraction // divisor % 10 + ord('0')
+
+
+class FixedPointColumn:
+    def __init__(self, values, decimals):
+        """
+        A column of values rounded to `decimals` decimals and split into integer and fraction parts.
+        Raises OverflowError if a value reaches FIXED_POINT_LIMIT.
+        """
+        self.values = values
+        self.missing = np.isnan(values)
+        magnitude = np.where(self.missing, 0.0, np.abs(values))
+        if len(values) and not magnitude.max() < FIXED_POINT_LIMIT:  # Also true for infinity
+            raise OverflowError("Value too large for fixed-point formatting")
+        self.scale = 10 ** decimals
+        self.fractionGroups = -(-decimals // 4)
+        self.integer, fraction = np.divmod(np.rint(magnitude * self.scale).astype(np.int64), self.scale)
+        self.fraction = fraction * 10 ** (4 * self.fractionGroups - decimals)  # Four digits per group
+        self.integerGroups = -(-len(str(int(self.integer.max(initial=0)))) // 4)
+
+    @property
+    def width(self):
+        # Sign, integer groups, decimal point, fraction groups
+        return 1 + 4 * self.integerGroups + 1 + 4 * self.fractionGroups
+
+    def write(self, text, offset):
+        """
+        Writes the column to the text buffer at a byte offset; unused bytes are set to zero.
+        """
+        np.multiply(self.values * -self.scale > 0.5, ord('-'), out=text[:, offset], casting='unsafe')
+        position = offset + 1
+        for group in range(self.integerGroups):
+            power = 10000 ** (self.integerGroups - 1 - group)
+            table = UNIT_DIGITS if power == 1 else LEADING_DIGITS
+            if group == 0:
+                index = self.integer // power + 10000  # Highest group, never padded with zeros
+            else:
+                index = self.integer // power % 10000 + (self.integer < power * 10000) * 10000
+            wordColumn(text, position)[:] = table[index]
+            position += 4
+
+        np.multiply(self.fraction > 0, ord('.'), out=text[:, position], casting='unsafe')
+        position += 1
+        for group in range(self.fractionGroups):
+            power = 10000 ** (self.fractionGroups - 1 - group)
+            if power == 1:
+                index = self.fraction % 10000 + 10000  # Trailing zeros of the last group are always dropped
+            else:
+                higher, lower = np.divmod(self.fraction, power)
+                index = higher % 10000 + (lower == 0) * 10000  # ... and of a group followed by zeros only
+            wordColumn(text, position)[:] = FRACTION_DIGITS[index]
+            position += 4
+        if self.missing.any():
+            text[self.missing, offset:position] = 0
+
+
+def formatRows(rows, decimals=EXPORT_DECIMALS, milliseconds=False):
+    """
+    CSV text (bytes, '\\r\\n' line ends as written by the csv module) of (rows, STORE_COLUMNS) sample rows:
+    local time of day (with milliseconds if requested), then the values with at most `decimals` decimals
+    and empty fields for NaN.
+    """
+    if not len(rows):
+        return b''
+    try:
+        columns = [FixedPointColumn(rows[:, column], decimals) for column in range(1, rows.shape[1])]
+    except OverflowError:
+        return formatRowsWithRepr(rows, milliseconds)
+
+    position = timeWidth(milliseconds)
+    text = np.empty((len(rows), position + sum(1 + column.width for column in columns) + 2), dtype=np.uint8)
+    writeTimes(text, rows[:, 0], milliseconds)
+    for column in columns:
+        text[:, position] = ord(',')
+        column.write(text, position + 1)
+        position += 1 + column.width
+    text[:, position] = ord('\r')
+    text[:, position + 1] = ord('\n')
+    text = text.ravel()
+    return text[text != 0].tobytes()
+
+
+def formatRowsWithRepr(rows, milliseconds=False):
+    times = np.empty((len(rows), timeWidth(milliseconds)), dtype=np.uint8)
+    writeTimes(times, rows[:, 0], milliseconds)
+    lines = [timeText.tobytes().decode('ascii') + "," + ",".join('' if value != value else repr(value) for value in row)
+             for timeText, row in zip(times, rows[:, 1:].tolist())]
+    return ("\r\n".join(lines) + "\r\n").encode('ascii')
+
+
+class RowSnapshot:
+    def __init__(self, rows, metadata=(), columnTitles=None, modelParameters=None):
+        """
+        In-memory export source with the interface of a Session, e.g. a copy of the samples shown in the table.
+        :param rows: (rows, STORE_COLUMNS) array
+        """
+        self.data = rows
+        self.metadata = list(metadata)
+        self.columnTitles = list(columnTitles or STORE_COLUMNS)
+        self.modelParameters = modelParameters or {}
+        self.latencyHistograms = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def rows(self, start=0, stop=None):
+        return self.data[start:stop]
+
+
+class ExportJob:
+    def __init__(self, source, path, chunkRows=EXPORT_CHUNK_ROWS, decimals=EXPORT_DECIMALS, level=ZSTD_LEVEL):
+        """
+        :param source: Session or RowSnapshot; only the rows it holds now are exported, so a session that is
+                       still being recorded can keep growing
+        :param path: Output file (or directory for '.session'); the suffix selects the format
+        :param chunkRows: Rows formatted and written at a time
+        :param decimals: Decimals of the values in CSV output
+        :param level: zstd compression level for '.csv.zst'
+        """
+        self.source = source
+        self.path = path
+        self.format = exportFormatFor(path)
+        self.rowCount = len(source)
+        self.chunkRows = chunkRows
+        self.decimals = decimals
+        self.level = level
+        self.rowsWritten = 0
+
+    def chunks(self, progress=None, cancelled=None):
+        """
+        Yields the source rows chunk by chunk; stops early once cancelled() returns True.
+        :param progress: Optional callable(rowsWritten, totalRows), called after each chunk
+        """
+        for start in range(0, self.rowCount, self.chunkRows):
+            if cancelled and cancelled():
+                return
+            stop = min(start + self.chunkRows, self.rowCount)
+            yield self.source.rows(start, stop)
+            self.rowsWritten = stop
+            if progress:
+                progress(stop, self.rowCount)
+
+    def run(self, progress=None, cancelled=None):
+        """
+        Writes the export. Returns the number of rows written, or None if it was cancelled.
+        :param progress: Optional callable(rowsWritten, totalRows)
+        :param cancelled: Optional callable returning True to stop; nothing is written then
+        """
+        temporaryPath = self.path + '.tmp'
+        removePath(temporaryPath)
+        self.rowsWritten = 0
+        try:
+            if self.format == '.session':
+                self.writeSession(temporaryPath, progress, cancelled)
+            elif self.format == '.csv.zst':
+                import zstandard
+                compressor = zstandard.ZstdCompressor(level=self.level, threads=-1)
+                with open(temporaryPath, 'wb') as rawFile, compressor.stream_writer(rawFile, closefd=False) as file:
+                    self.writeCSV(file, progress, cancelled)
+            else:
+                with open(temporaryPath, 'wb') as file:
+                    self.writeCSV(file, progress, cancelled)
+            if self.rowsWritten < self.rowCount:
+                removePath(temporaryPath)
+                return None
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)  # A session directory cannot be replaced by renaming
+            os.replace(temporaryPath, self.path)
+        except BaseException:
+            removePath(temporaryPath)
+            raise
+        return self.rowCount
+
+    def writeCSV(self, file, progress, cancelled):
+        # Same preamble as ControllerEngine.initCSVFile: metadata, an empty row, the column headers
+        preamble = io.StringIO()
+        writer = csv.writer(preamble)
+        for name, value in self.source.metadata:
+            writer.writerow([name, value])
+        writer.writerow([])
+        writer.writerow(self.source.columnTitles)
+        file.write(preamble.getvalue().encode('utf-8'))
+
+        milliseconds = None  # Decided by the first chunk, so the whole file has one time format
+        for rows in self.chunks(progress, cancelled):
+            if milliseconds is None:
+                milliseconds = hasSubSecondSpacing(rows[:, 0])
+            file.write(formatRows(rows, self.decimals, milliseconds))
+
+    def writeSession(self, directory, progress, cancelled):
+        os.makedirs(directory)
+        header = newHeader(self.source.metadata, self.source.columnTitles, self.source.modelParameters)
+        if self.source.latencyHistograms:
+            header['latency'] = self.source.latencyHistograms
+        writeHeader(directory, header)
+        files = [open(os.path.join(directory, key + COLUMN_SUFFIX), 'wb') for key in STORE_COLUMNS]
+        try:
+            for rows in self.chunks(progress, cancelled):
+                rows = np.asarray(rows, dtype=COLUMN_DTYPE)
+                for index, file in enumerate(files):
+                    file.write(rows[:, index].tobytes())
+        finally:
+            for file in files:
+                file.close()
+
+
+def removePath(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
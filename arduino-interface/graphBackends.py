@@ -0,0 +1,173 @@
+"""
+    Pluggable rendering backends for the Graph tab.
+    Every backend exposes a Qt widget and setData(timeSeconds, series) and draws the panels described by GRAPH_PANELS.
+    Plotting libraries are imported when a backend is created, not when this module is imported.
+"""
+
+import time
+
+BACKGROUND_COLOR = '#282C34'
+TEXT_COLOR = 'white'
+GRID_COLOR = '#ABB2BF'
+
+# Hex values of the matplotlib 'tab:' colours, for backends that do not know them
+TAB_COLORS = {
+    'tab:blue': '#1F77B4',
+    'tab:orange': '#FF7F0E',
+    'tab:green': '#2CA02C',
+    'tab:red': '#D62728',
+    'tab:purple': '#9467BD',
+    'tab:brown': '#8C564B',
+    'tab:pink': '#E377C2',
+    'tab:gray': '#7F7F7F'
+}
+
+# Panel and line layout shared by all backends: (series key, legend label, linestyle, colour)
+GRAPH_PANELS = [
+    {
+        'title': 'Two Mass Model Graph Outputs',
+        'ylabel': 'Temperature [°C]',
+        'lines': [
+            ('t_sup', 'Supply Temperature (t_sup)', '-', 'tab:blue'),
+            ('t_ret_mea', 'Return Temperature (t_ret_mea)', '--', 'tab:red')
+        ]
+    },
+    {
+        'ylabel': 'Heat Flow [W]',
+        'lines': [
+            ('q_hp', 'Heat Flow HP to Transfer System (q_hp)', '-', 'tab:green'),
+            ('q_hb', 'Heat Flow to Building (q_hb)', '-', 'tab:orange'),
+            ('q_ba', 'Heat Flow Building to Ambient (q_ba)', '-', 'tab:purple'),
+            ('q_int', 'Heat Flow Internal Gains to Building (q_int)', '-', 'tab:pink'),
+            ('q_bh', 'Heat Flow Booster Heater to Heating System (q_bh)', '-', 'tab:brown')
+        ]
+    },
+    {
+        'xlabel': 'Time [hours]',
+        'ylabel': 'Temperature [°C]',
+        'lines': [
+            ('t_b', 'Building Temperature (t_b)', '-', 'tab:gray')
+        ]
+    }
+]
+
+
+def formatTimeOfDay(timestamp):
+    """
+    Formats a time axis value (seconds since the epoch) as local HH:MM:SS.
+    """
+    return time.strftime('%H:%M:%S', time.localtime(timestamp))
+
+
+class MatplotlibGraphBackend:
+    name = 'matplotlib'
+    frameBudgetMs = 1000
+
+    def __init__(self):
+        """
+        Agg-rendered figure with persistent Line2D objects; a redraw only swaps line data and rescales the axes.
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+        self.figure = Figure(figsize=(10, 18), facecolor=BACKGROUND_COLOR)
+        self.widget = FigureCanvas(self.figure)
+        self.widget.setStyleSheet("QWidget {background-color: #282C34; color: #ABB2BF;}")
+
+        # Create a 3-row subplot layout for different graphs with larger height and increased spacing
+        gs = self.figure.add_gridspec(len(GRAPH_PANELS), 1, hspace=0.15, wspace=0.2)
+        timeFormatter = FuncFormatter(lambda x, pos: formatTimeOfDay(x))
+
+        self.axes = []
+        self.lines = {}
+        for row, panel in enumerate(GRAPH_PANELS):
+            ax = self.figure.add_subplot(gs[row, 0])
+            ax.set_facecolor(BACKGROUND_COLOR)
+            if 'title' in panel:
+                ax.set_title(panel['title'], color=TEXT_COLOR, fontdict={'size': 20, 'weight': 'bold'})
+            if 'xlabel' in panel:
+                ax.set_xlabel(panel['xlabel'], color=TEXT_COLOR, fontdict={'size': 12})
+            ax.set_ylabel(panel['ylabel'], color=TEXT_COLOR, fontdict={'size': 12})
+            ax.tick_params(axis='x', colors=TEXT_COLOR, labelsize=10, width=2)
+            ax.tick_params(axis='y', colors=TEXT_COLOR, labelsize=10, width=2)
+            ax.grid(True, color=GRID_COLOR)
+            ax.xaxis.set_major_formatter(timeFormatter)
+
+            for key, label, linestyle, color in panel['lines']:
+                self.lines[key], = ax.plot([], [], label=label, linestyle=linestyle, color=color)
+            ax.legend(loc='upper right', prop={'size': 10})
+            self.axes.append(ax)
+
+    def setData(self, timeSeconds, series):
+        for key, line in self.lines.items():
+            line.set_data(timeSeconds, series[key])
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        self.widget.draw_idle()
+
+
+class PyQtGraphBackend:
+    name = 'pyqtgraph'
+    frameBudgetMs = 33  # ~30 fps
+
+    def __init__(self):
+        """
+        Qt scene-graph plots (pyqtgraph) for live streaming. Rendering stays on the CPU raster engine,
+        long series are peak-downsampled and clipped to the visible range before they are drawn.
+        """
+        import pyqtgraph as pg
+
+        class TimeOfDayAxis(pg.AxisItem):
+            def tickStrings(self, values, scale, spacing):
+                return [formatTimeOfDay(value) for value in values]
+
+        pg.setConfigOptions(antialias=False, useOpenGL=False, background=BACKGROUND_COLOR, foreground=GRID_COLOR)
+        self.widget = pg.GraphicsLayoutWidget()
+
+        self.plots = []
+        self.lines = {}
+        for row, panel in enumerate(GRAPH_PANELS):
+            plot = self.widget.addPlot(row=row, col=0, axisItems={'bottom': TimeOfDayAxis(orientation='bottom')})
+            if 'title' in panel:
+                plot.setTitle(panel['title'], color=TEXT_COLOR, size='20pt', bold=True)
+            if 'xlabel' in panel:
+                plot.setLabel('bottom', panel['xlabel'], color=TEXT_COLOR)
+            plot.setLabel('left', panel['ylabel'], color=TEXT_COLOR)
+            plot.showGrid(x=True, y=True, alpha=0.3)
+            plot.setDownsampling(auto=True, mode='peak')
+            plot.setClipToView(True)
+            legend = plot.addLegend(offset=(-10, 10))  # Negative x offset anchors the legend top-right
+            legend.setLabelTextColor(TEXT_COLOR)
+            if self.plots:
+                plot.setXLink(self.plots[0])
+
+            for key, label, linestyle, color in panel['lines']:
+                style = pg.QtCore.Qt.DashLine if linestyle == '--' else pg.QtCore.Qt.SolidLine
+                pen = pg.mkPen(TAB_COLORS.get(color, color), width=1.5, style=style)
+                self.lines[key] = plot.plot([], [], name=label, pen=pen, connect='finite')  # NaN leaves a gap
+            self.plots.append(plot)
+
+    def setData(self, timeSeconds, series):
+        for key, line in self.lines.items():
+            line.setData(timeSeconds, series[key])
+
+
+GRAPH_BACKENDS = {
+    MatplotlibGraphBackend.name: MatplotlibGraphBackend,
+    PyQtGraphBackend.name: PyQtGraphBackend
+}
+
+
+def createGraphBackend(name):
+    """
+    Creates the named backend, falling back to matplotlib when pyqtgraph is not installed.
+    """
+    if name == PyQtGraphBackend.name:
+        try:
+            import pyqtgraph
+        except ImportError:
+            print("pyqtgraph is not installed, falling back to the matplotlib graph backend")
+            name = MatplotlibGraphBackend.name
+    return GRAPH_BACKENDS[name]()
@@ -0,0 +1,79 @@
+"""
+    History browser dialog: queries the SQLite sample database (sqliteStore.py) for the table and graphs.
+"""
+
+import time
+import sqlite3
+from PyQt5.QtWidgets import QDialog, QFormLayout, QComboBox, QLineEdit, QLabel, QDialogButtonBox
+from sqliteStore import SampleDatabase, parseCondition
+
+
+class HistoryDialog(QDialog):
+    def __init__(self, databasePath, limit, parent=None):
+        """
+        :param databasePath: SQLite sample database
+        :param limit: Maximum number of samples loaded (the most recent matching ones)
+        """
+        super(HistoryDialog, self).__init__(parent)
+        self.setWindowTitle("Browse History")
+        self.database = SampleDatabase(databasePath)
+        self.limit = limit
+        self.rows = None
+        self.description = ""
+
+        layout = QFormLayout(self)
+        self.sessionInput = QComboBox()
+        self.sessionInput.addItem("All sessions", None)
+        for session in self.database.sessions():
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(session['started']))
+            self.sessionInput.addItem(f"{session['name']} ({started}, {session['samples']} samples)", session['id'])
+        self.fromInput = QLineEdit()
+        self.fromInput.setPlaceholderText("HH:MM (optional)")
+        self.toInput = QLineEdit()
+        self.toInput.setPlaceholderText("HH:MM (optional)")
+        self.conditionInput = QLineEdit()
+        self.conditionInput.setPlaceholderText("e.g. t_sup > 50 (optional)")
+        self.errorLabel = QLabel()
+        self.errorLabel.setStyleSheet("color: #E06C75;")
+
+        layout.addRow("Session:", self.sessionInput)
+        layout.addRow("From time of day:", self.fromInput)
+        layout.addRow("To time of day:", self.toInput)
+        layout.addRow("Filter:", self.conditionInput)
+        layout.addRow(self.errorLabel)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.button(QDialogButtonBox.Ok).setText("Load")
+        buttons.accepted.connect(self.load)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def load(self):
+        """
+        Runs the query; the dialog stays open with an error message if the input is invalid.
+        """
+        sessionId = self.sessionInput.currentData()
+        fromText, toText, conditionText = (field.text().strip() for field in
+                                           (self.fromInput, self.toInput, self.conditionInput))
+        try:
+            timeOfDay = None
+            if fromText or toText:
+                timeOfDay = (fromText or '00:00', toText or '23:59:59')
+            conditions = [parseCondition(conditionText)] if conditionText else []
+            self.rows = self.database.query(sessionIds=None if sessionId is None else [sessionId],
+                                            timeOfDay=timeOfDay, conditions=conditions, limit=self.limit)
+        except (ValueError, sqlite3.Error) as e:
+            self.errorLabel.setText(str(e))
+            return
+
+        parts = [self.sessionInput.currentText()]
+        if timeOfDay:
+            parts.append(f"{timeOfDay[0]}-{timeOfDay[1]}")
+        if conditionText:
+            parts.append(conditionText)
+        self.description = ", ".join(parts)
+        self.accept()
+
+    def done(self, result):
+        self.database.close()
+        super(HistoryDialog, self).done(result)
@@ -0,0 +1,128 @@
+"""
+    End-to-end latency from a telemetry line to the setVoltage command it causes.
+
+    Trace points are taken when a line is read from the serial port (receive), parsed (parse), after the model step
+    (step), when the command is numbered for its acknowledgement (enqueue) and when serial.write() returns (write).
+    Every interval between two consecutive points, and receive -> write in total, goes into a LatencyHistogram:
+    HDR-style log-linear buckets with a fixed relative precision (1/64, about 1.6%) from 1 us to ~100 s, so
+    recording is O(1), memory is fixed, and p50/p99/p999 are read from the buckets of the whole run.
+    Lines that do not lead to a setVoltage (acknowledgements, the earlier samples of a batch) are not counted.
+"""
+
+import time
+
+TRACE_POINTS = ('receive', 'parse', 'step', 'enqueue', 'write')
+PREVIOUS_POINT = dict(zip(TRACE_POINTS[1:], TRACE_POINTS))
+TRACE_STAGES = tuple(f"{start}-{end}" for start, end in zip(TRACE_POINTS, TRACE_POINTS[1:])) + ('total',)
+SUB_BUCKET_BITS = 7  # 128 buckets per power of two above 128 us, half of them new: 1/64 relative precision
+MAX_LATENCY_US = 100_000_000  # Larger latencies are counted in the last bucket [us]
+
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucketIndex(valueUs):
+    if valueUs < SUB_BUCKETS:
+        return valueUs
+    shift = valueUs.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (valueUs >> shift)
+
+
+def bucketBounds(index):
+    """
+    Smallest and largest value [us] counted in a bucket.
+    """
+    if index < SUB_BUCKETS:
+        return index, index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    subBucket = index - (shift << (SUB_BUCKET_BITS - 1))
+    return subBucket << shift, ((subBucket + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (bucketIndex(MAX_LATENCY_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        valueUs = min(max(int(seconds * 1e6), 0), MAX_LATENCY_US)
+        self.counts[bucketIndex(valueUs)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Latency [s] below which `fraction` of the recorded values are (upper bound of their bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = max(int(fraction * self.count + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucketBounds(index)[1] / 1e6, self.max)
+        return self.max
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+            'p999': self.percentile(0.999),
+            'max': self.max
+        }
+
+    def export(self):
+        """
+        Statistics plus the non-empty buckets as [lowest value, highest value, count] rows [us], for the session.
+        """
+        exported = self.stats()
+        exported['bucketsUs'] = [[*bucketBounds(index), count] for index, count in enumerate(self.counts) if count]
+        return exported
+
+
+class LatencyTrace:
+    def __init__(self, clock=time.perf_counter):
+        """
+        :param clock: High-resolution time source [s]
+        """
+        self.clock = clock
+        self.points = None  # Trace point -> time, for the line being processed
+        self.histograms = {stage: LatencyHistogram() for stage in TRACE_STAGES}
+
+    def begin(self):
+        """
+        Starts the trace of a line read from the serial port; a trace that did not reach 'write' is dropped.
+        """
+        self.points = {'receive': self.clock()}
+
+    def mark(self, point):
+        """
+        Takes a trace point; ignored unless the point before it was taken, e.g. for a command sent from the GUI.
+        """
+        if self.points is not None and PREVIOUS_POINT[point] in self.points:
+            self.points[point] = self.clock()
+            if point == 'write':
+                self.finish()
+
+    def finish(self):
+        points = self.points
+        self.points = None
+        for start, end in zip(TRACE_POINTS, TRACE_POINTS[1:]):
+            self.histograms[f"{start}-{end}"].record(points[end] - points[start])
+        self.histograms['total'].record(points['write'] - points['receive'])
+
+    def stats(self):
+        return {stage: histogram.stats() for stage, histogram in self.histograms.items()}
+
+    def export(self):
+        return {stage: histogram.export() for stage, histogram in self.histograms.items()}
+
+
+def formatLatencyStats(stats, stages=TRACE_STAGES):
+    return ", ".join(f"{stage} {stats[stage]['p50'] * 1000:.2f}/{stats[stage]['p99'] * 1000:.2f}/"
+                     f"{stats[stage]['p999'] * 1000:.2f} ms" for stage in stages if stats[stage]['count'])
@@ -0,0 +1,248 @@
+"""
+    Optional HTTP endpoint publishing the controller's metrics in the Prometheus text format (GET /metrics),
+    so the benches can be monitored centrally.
+
+    The server runs on a background thread and a scrape only reads counters and the latest values the engine keeps
+    anyway. It takes neither controlLoop.lock nor the event queues' locks (EventBus.counters()), so scraping never
+    delays an iteration (only the GIL is shared, for the fraction of a millisecond a scrape takes). Histograms are
+    HDR-style LatencyHistograms (latencyTrace.py), published with the fixed buckets of PROMETHEUS_BUCKETS.
+"""
+
+import os
+import sys
+import time
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from latencyTrace import bucketBounds
+
+METRICS_HOST = '127.0.0.1'  # Use '0.0.0.0' to be scraped from other machines
+METRICS_PATH = '/metrics'
+METRICS_PREFIX = 'hp_controller_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)  # [s]
+HEAT_FLOWS = (('hb', 'q_dot_hb'), ('ba', 'q_dot_ba'), ('hp', 'q_dot_hp'), ('int', 'q_dot_int'), ('bh', 'q_dot_bh'))
+
+
+def residentMemory():
+    """
+    Resident set size of the process [bytes], or None where it cannot be read without extra packages.
+    """
+    try:
+        with open('/proc/self/statm') as statm:  # Linux
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak only
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def toFloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MetricsText:
+    def __init__(self, prefix=METRICS_PREFIX):
+        """
+        Samples are kept per metric family and rendered as one group after its HELP and TYPE lines, as the text
+        format requires, in whatever order the collectors add them (e.g. one label value after the other).
+        """
+        self.prefix = prefix
+        self.families = {}  # Name -> lines, in the order the families were first added
+
+    def describe(self, name, help, kind):
+        """
+        Lines of a metric family, starting with its HELP and TYPE lines.
+        """
+        if name not in self.families:
+            self.families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        return self.families[name]
+
+    def add(self, name, value, help, kind='gauge', labels=None):
+        """
+        Adds one sample; None values (nothing measured yet) are left out.
+        """
+        if value is None:
+            return
+        name = self.prefix + name
+        value = int(value) if isinstance(value, int) else float(value)  # Also numpy scalars
+        self.describe(name, help, kind).append(f"{name}{formatLabels(labels)} {value!r}")
+
+    def histogram(self, name, histogram, help, labels=None):
+        """
+        Adds a LatencyHistogram as a Prometheus histogram [s]. An HDR bucket is counted below a bound when its
+        largest value is, so the cumulative counts are exact to the HDR precision. The histogram may be recorded
+        to meanwhile; every count is taken from the same pass over the buckets, so they stay consistent.
+        """
+        name = self.prefix + name
+        lines = self.describe(name, help, 'histogram')
+        bounds = [int(bound * 1e6) for bound in PROMETHEUS_BUCKETS]
+        cumulative = [0] * (len(bounds) + 1)  # The last one is +Inf
+        for index, count in enumerate(histogram.counts):
+            if count:
+                highest = bucketBounds(index)[1]
+                position = 0
+                while position < len(bounds) and highest > bounds[position]:
+                    position += 1
+                cumulative[position] += count
+        total = 0
+        for bound, count in zip(PROMETHEUS_BUCKETS + ('+Inf',), cumulative):
+            total += count
+            lines.append(f"{name}_bucket{formatLabels(labels, le=str(bound))} {total}")
+        lines.append(f"{name}_sum{formatLabels(labels)} {histogram.total!r}")
+        lines.append(f"{name}_count{formatLabels(labels)} {total}")
+
+    def text(self):
+        return "\n".join(line for lines in self.families.values() for line in lines) + "\n"
+
+
+def formatLabels(labels=None, **extra):
+    labels = dict(labels or {}, **extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def engineMetrics(engine):
+    """
+    Collector for a ControllerEngine: telemetry, commands, CSV writer, event queues, model step timing and the latest
+    values.
+    """
+    def collect(metrics):
+        sequence = engine.sequenceTracker
+        metrics.add('samples_received_total', engine.samplesReceived, "Telemetry samples processed", 'counter')
+        metrics.add('samples_lost_total', sequence.lost, "Samples missing from the sequence numbers", 'counter')
+        metrics.add('samples_duplicate_total', sequence.duplicates, "Repeated telemetry samples dropped", 'counter')
+        metrics.add('parse_errors_total', engine.parseErrors, "Telemetry fields or lines that could not be parsed",
+                    'counter')
+        metrics.add('serial_reconnects_total', max(engine.serialConnects - 1, 0), "Serial port reopened", 'counter')
+        metrics.add('serial_connected', int(engine.isConnected()), "1 while the serial port is open")
+        acks = engine.ackTracker
+        metrics.add('commands_sent_total', acks.commandsSent, "Commands sent to the Arduino", 'counter')
+        metrics.add('commands_lost_total', acks.timedOut, "Commands not acknowledged in time", 'counter')
+
+        writer = engine.csv_writer
+        if writer:
+            metrics.add('csv_queue_depth', writer.queueDepth(), "Rows waiting for the CSV writer thread")
+            metrics.add('csv_rows_written_total', writer.rowsWritten, "Rows written to the CSV log", 'counter')
+            metrics.add('csv_write_latency_seconds_max', writer.maxWriteLatency, "Slowest CSV batch write")
+
+        for queue in engine.bus.counters():
+            labels = {'subscriber': queue['name']}
+            metrics.add('event_queue_depth', queue['depth'], "Events waiting in a subscriber's queue", labels=labels)
+            metrics.add('event_queue_dropped_total', queue['dropped'], "Events dropped by a subscriber's overflow policy",
+                        'counter', labels)
+
+        metrics.histogram('model_step_seconds', engine.stepTimes, "Duration of the building model's doStep()")
+        metrics.histogram('sample_to_dac_seconds', engine.latencyTrace.histograms['total'],
+                          "Latency from a telemetry line read to its setVoltage written")
+
+        history = engine.t_sup_history
+        metrics.add('supply_temperature_celsius', history[-1] if history else None, "Latest supply temperature")
+        history = engine.t_ret_mea_history
+        metrics.add('return_temperature_celsius', history[-1] if history else None,
+                    "Latest measured return temperature")
+        metrics.add('flow_rate_lps', toFloat(engine.lastFlowRate), "Latest flow rate [L/s]")
+        metrics.add('dac_voltage_volts', toFloat(engine.lastDACVoltage), "Latest DAC output voltage")
+        model = engine.currentBuildingModel
+        if model is not None:
+            metrics.add('sp_temperature_celsius', model.t_ret, "Return temperature calculated by the building model")
+            metrics.add('building_temperature_celsius', model.MassB.T, "Building mass temperature of the model")
+            for flow, attribute in HEAT_FLOWS:
+                metrics.add('heat_flow_watts', getattr(model, attribute), "Heat flows of the building model",
+                            labels={'flow': flow})
+    return collect
+
+
+def controlLoopMetrics(controlLoop):
+    """
+    Collector for a ControlLoop; reads its counters without taking its lock.
+    """
+    def collect(metrics):
+        metrics.add('control_iterations_total', controlLoop.iterations, "Control loop iterations", 'counter')
+        metrics.add('control_deadline_misses_total', controlLoop.missed, "Iterations that ended after the next release",
+                    'counter')
+        metrics.add('control_periods_skipped_total', controlLoop.skipped, "Releases skipped after an overrun", 'counter')
+        computeTimes = controlLoop.recentComputeTimes
+        metrics.add('control_compute_seconds', computeTimes[-1] if computeTimes else None,
+                    "Compute time of the last iteration")
+        metrics.add('control_compute_seconds_max', controlLoop.maxComputeTime, "Longest iteration")
+        metrics.add('control_lateness_seconds_max', controlLoop.maxLateness, "Latest start after a release")
+    return collect
+
+
+def renderMetrics(renderScheduler):
+    """
+    Collector for the GUI's RenderScheduler: repaints and their duration per view.
+    """
+    def collect(metrics):
+        for view in list(renderScheduler.views.values()):
+            labels = {'view': view.name}
+            metrics.add('redraw_total', view.renderCount, "Repaints of a view", 'counter', labels)
+            metrics.add('redraw_seconds_total', view.totalRenderDuration, "Time spent repainting a view", 'counter',
+                        labels)
+            metrics.add('redraw_seconds', view.lastRenderDuration, "Duration of the last repaint of a view",
+                        labels=labels)
+    return collect
+
+
+def processMetrics(metrics):
+    metrics.add('resident_memory_bytes', residentMemory(), "Resident memory of the controller process")
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = self.server.metricsServer.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per scrape would flood the terminal
+
+
+class MetricsServer(threading.Thread):
+    def __init__(self, collectors, port, host=METRICS_HOST):
+        """
+        Serves GET /metrics on a background thread. Raises OSError if the port cannot be bound.
+        :param collectors: Callables adding their metrics to a MetricsText, e.g. engineMetrics(engine)
+        :param port: TCP port; 0 picks a free one (see self.port)
+        :param host: Interface to listen on
+        """
+        super(MetricsServer, self).__init__(name='metrics-server', daemon=True)
+        self.collectors = list(collectors) + [processMetrics]
+        self.server = HTTPServer((host, port), MetricsRequestHandler)
+        self.server.metricsServer = self
+        self.port = self.server.server_address[1]
+        self.scrapes = 0
+        self.lastScrapeDuration = 0.0
+
+    def render(self):
+        start = time.perf_counter()
+        metrics = MetricsText()
+        for collect in self.collectors:
+            collect(metrics)
+        metrics.add('scrapes_total', self.scrapes, "Scrapes served before this one", 'counter')
+        metrics.add('scrape_seconds', self.lastScrapeDuration, "Time taken by the previous scrape")
+        self.scrapes += 1
+        self.lastScrapeDuration = time.perf_counter() - start
+        return metrics.text()
+
+    def run(self):
+        self.server.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        if self.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
@@ -17,16 +17,86 @@ float desiredVoltage = 0.0; // Desired voltage to be set on the DAC
 float dacVoltage = 0.0;
 float correctionFactor = 0.891;
 
-const int avgPeriod = 4000; // Averaging period in milliseconds
-const int avgSamples = avgPeriod / 1000; // Number of samples for averaging (1 sample per second)
-float tempSamples[avgSamples]; // Array to hold temperature samples
-float returnTempSamples[avgSamples]; // Array to hold return temperature samples
-float flowRateSamples[avgSamples]; // Array to hold flow rate samples
+const int maxSampleRate = 100; // Highest sample rate accepted by setRate in Hz (telemetry uses ~80% of 115200 baud)
+const int maxBatchSampleRate = 250; // Highest sample rate in batch mode (~26 bytes per sample)
+const int maxBatchSamples = 25; // Largest batch accepted by setBatch
+const int maxAvgSamples = 100; // Largest averaging window accepted by setAvgWindow
+int avgSamples = 4; // Number of samples in the running average (4 seconds at the default 1 Hz)
+unsigned long sampleInterval = 1000000UL; // Time between two samples in microseconds (1 Hz)
+
+// Samples are kept as raw ADC readings: the integer running sums are updated in O(1) per sample and never drift
+int tempSamples[maxAvgSamples]; // Array to hold temperature samples
+int returnTempSamples[maxAvgSamples]; // Array to hold return temperature samples
+int flowRateSamples[maxAvgSamples]; // Array to hold flow rate samples
+long tempSum = 0; // Running sums of the first avgSamples entries of the arrays
+long returnTempSum = 0;
+long flowRateSum = 0;
 int sampleIndex = 0; // Current index in the sample array
-unsigned long lastSampleTime = 0; // Last time a sample was taken
+unsigned long lastSampleTime = 0; // Last time a sample was taken (micros)
+unsigned long sampleSequence = 0; // Number of the last sample taken, sent as Seq so the host detects lost samples
+
+// Batch mode (setBatch K, K > 1): K samples are collected and sent as one line with a single header,
+// 'BATCH 1234 1718000000.250 dt,STemp,DACVolt,FlowRate,RTemp;0,45.20,3.10,0.200,40.10;10,...' with the sequence
+// number and device time of the first sample (the others follow on) and dt, the time of each sample in milliseconds
+// after the first one
+int batchSamples = 1; // Samples per telemetry line; 1 sends the classic line per sample
+int batchCount = 0; // Samples collected for the next batch
+unsigned long batchStartTime = 0; // Time of the first sample of the batch (micros)
+unsigned long batchSequence = 0; // Sequence number of the first sample of the batch
+unsigned long batchSeconds = 0; // Device time of the first sample of the batch
+unsigned int batchMilliseconds = 0;
+unsigned int batchOffsets[maxBatchSamples];
+float batchTemperatures[maxBatchSamples];
+float batchDacVoltages[maxBatchSamples];
+float batchFlowRates[maxBatchSamples];
+float batchReturnTemperatures[maxBatchSamples];
+
+// Output queue: telemetry and replies are queued here and handed to Serial as its transmit buffer empties,
+// so loop() does not wait for the link while a batch (several hundred bytes) is being sent
+class SerialQueue : public Print {
+public:
+  size_t write(uint8_t c) {
+    int next = (head + 1) % sizeof(buffer);
+    while (next == tail) {
+      pump(); // Queue full: wait for the link
+    }
+    buffer[head] = c;
+    head = next;
+    return 1;
+  }
+
+  void pump() {
+    int room = Serial.availableForWrite();
+    while (room-- > 0 && tail != head) {
+      Serial.write(buffer[tail]);
+      tail = (tail + 1) % sizeof(buffer);
+    }
+  }
 
+private:
+  uint8_t buffer[1024];
+  int head = 0;
+  int tail = 0;
+};
+
+SerialQueue serialOut;
+
+// Incoming command line, filled one character per loop() pass so a partial command never blocks sampling
+const int maxCommandLength = 48; // Longer lines are rejected
+char commandBuffer[maxCommandLength + 1];
+int commandLength = 0;
+bool commandOverflow = false;
+
+// Device clock: a sample is timestamped with the RTC second of the last tick seen plus the millis() elapsed since.
+// millis() runs off the board's crystal (~50 ppm), so it is re-aligned to the next RTC tick every sync interval.
+unsigned long rtcSeconds = 0; // Unix time of the last RTC tick seen
+unsigned long rtcTickMillis = 0; // millis() at that tick
+bool rtcSyncing = false; // Polling the RTC for its next tick
+unsigned long rtcSyncSeconds = 0; // RTC seconds when polling started
+unsigned long sampleSeconds = 0; // Device time of the last sample: RTC seconds
+unsigned int sampleMilliseconds = 0; // ... and milliseconds
 unsigned long lastSyncTime = 0; // Last time RTC was synced
-const unsigned long syncInterval = 6UL * 3600UL * 1000UL; // Sync interval (6 hours)
+const unsigned long syncInterval = 60UL * 1000UL; // Sync interval (1 minute: millis() drifts up to ~3 ms meanwhile)
 
 void setup() {
   Serial.begin(115200); // Begin Serial communication at 115200 baud rate
@@ -39,6 +109,11 @@ void setup() {
   if (rtc.lostPower()) { // Check if the RTC lost power and needs its time reset
     rtc.adjust(DateTime(F(__DATE__), F(__TIME__))); // Set RTC to the date & time this sketch was compiled
   }
+  rtcSyncing = true; // Wait for the next RTC tick, so the first samples are already timestamped
+  rtcSyncSeconds = rtc.now().unixtime();
+  while (rtcSyncing) {
+    syncClock();
+  }
 
   if (dac.begin() == 0) { // Initialize the DAC
     Serial.println("DAC initialized successfully.");
@@ -49,89 +124,122 @@ void setup() {
   }
 
   // Initialize the temperature and flow rate sample arrays with the initial sensor readings
-  float initialTemp = readTemperature(A2);
-  float initialReturnTemp = readReturnTemperature(A1);
-  float initialFlowRate = readFlowRate(A0); // Assuming A0 is used for flow rate sensor
-
-  for (int i = 0; i < avgSamples; i++) {
-    tempSamples[i] = initialTemp;
-    returnTempSamples[i] = initialReturnTemp;
-    flowRateSamples[i] = initialFlowRate;
-  }
+  fillSamples(analogRead(A2), analogRead(A1), analogRead(A0)); // Assuming A0 is used for flow rate sensor
 }
 
 void loop() {
-  if (Serial.available() > 0) { // Check if data is available to read from the serial port
-    String command = Serial.readStringUntil('\n'); // Read the incoming string until newline
-    processSerialCommand(command); // Process the received serial command
-  }
+  readSerialCommands(); // Handle the received characters without waiting for the rest of a command
+  serialOut.pump(); // Send as much of the queued output as the serial transmit buffer takes
 
-  unsigned long currentMillis = millis();
-  if (currentMillis - lastSampleTime >= 1000) { // Take a sample every second
-    lastSampleTime = currentMillis; // Set to current time to avoid drift
+  unsigned long currentMicros = micros();
+  if (currentMicros - lastSampleTime >= sampleInterval) { // Take a sample every sample interval
+    lastSampleTime += sampleInterval; // Stay on the sample grid so the rate does not drift
+    if (currentMicros - lastSampleTime >= sampleInterval) {
+      lastSampleTime = currentMicros; // More than a sample behind (e.g. waiting for a command): skip ahead
+    }
     takeSample();
+    sampleSequence++;
+    unsigned long elapsed = millis() - rtcTickMillis; // Device time: RTC seconds plus millis() since the tick
+    sampleSeconds = rtcSeconds + elapsed / 1000;
+    sampleMilliseconds = elapsed % 1000;
 
-    float temperature = calculateRunningAverage(tempSamples, avgSamples);
-    float returnTemperature = calculateRunningAverage(returnTempSamples, avgSamples);
-    float averagedFlowRate = calculateRunningAverage(flowRateSamples, avgSamples);
+    float temperature = countsToTemperature((float)tempSum / avgSamples);
+    float returnTemperature = countsToReturnTemperature((float)returnTempSum / avgSamples);
+    float averagedFlowRate = countsToFlowRate((float)flowRateSum / avgSamples);
 
     flowRate = averagedFlowRate;
 
     setDACVoltage(desiredVoltage); // Update the DAC output voltage
   
-    sendSerialData(temperature, dacVoltage, averagedFlowRate, flowRate, returnTemperature); // Send data over serial
+    if (batchSamples > 1) {
+      addToBatch(temperature, dacVoltage, flowRate, returnTemperature); // Sent once the batch is full
+    } else {
+      sendSerialData(temperature, dacVoltage, flowRate, returnTemperature); // Send data over serial
+    }
   }
 
-  if (currentMillis - lastSyncTime >= syncInterval) {
-    lastSyncTime = currentMillis;
+  syncClock(); // Re-align millis() to the RTC every sync interval
+}
+
+// Function to align millis() to the RTC: once the sync interval has passed, reads the RTC on every call
+// (one short I2C transfer, so sampling goes on) until its second ticks over
+void syncClock() {
+  unsigned long currentMillis = millis();
+  if (!rtcSyncing) {
+    if (currentMillis - lastSyncTime >= syncInterval) {
+      rtcSyncing = true;
+      rtcSyncSeconds = rtc.now().unixtime();
+    }
+    return;
+  }
+  unsigned long seconds = rtc.now().unixtime();
+  if (seconds != rtcSyncSeconds) { // The RTC second has just ticked over
+    rtcSeconds = seconds;
+    rtcTickMillis = millis();
+    lastSyncTime = rtcTickMillis;
+    rtcSyncing = false;
+  }
+}
+
+// Function to print a device time as seconds with three decimals
+void printDeviceTime(unsigned long seconds, unsigned int milliseconds) {
+  serialOut.print(seconds);
+  serialOut.print('.');
+  if (milliseconds < 100) {
+    serialOut.print('0');
   }
+  if (milliseconds < 10) {
+    serialOut.print('0');
+  }
+  serialOut.print(milliseconds);
 }
 
-// Function to read supply temperature
-float readTemperature(int pin) {
-  int supSensorValue = analogRead(pin);
-  float voltage = supSensorValue * (5.0 / 1023.0); // Convert the sensor reading to a voltage (0V to 5V)
+// Function to convert a (averaged) supply temperature sensor reading to a temperature
+float countsToTemperature(float sensorValue) {
+  float voltage = sensorValue * (5.0 / 1023.0); // Convert the sensor reading to a voltage (0V to 5V)
   float temperature = (1.01552 * ((voltage * 70.0) / 5.0)) + 0.20325; // Corrected conversion formula
   return temperature;
 }
 
-// Function to read return temperature
-float readReturnTemperature(int pin) { 
-  int retsensorValue = analogRead(pin);
-  float voltage = retsensorValue * (5.0 / 1023.0); // Convert the sensor reading to a voltage (0V to 5V)
+// Function to convert a (averaged) return temperature sensor reading to a temperature
+float countsToReturnTemperature(float sensorValue) {
+  float voltage = sensorValue * (5.0 / 1023.0); // Convert the sensor reading to a voltage (0V to 5V)
   float returnTemperature = (1.01652 * ((voltage * 70.0) / 5.0)) + 0.32448; // Corrected conversion formula
   return returnTemperature;
 }
 
-// Function to read flow rate
-float readFlowRate(int pin) {
-  float sensorVoltage = readAnalogVoltage(pin);
+// Function to convert a (averaged) flow sensor reading to a flow rate
+float countsToFlowRate(float sensorValue) {
+  float sensorVoltage = sensorValue * (5.0 / 1023.0); // Convert to voltage (assuming 5V reference)
   float flowRate = calculateFlowRate(sensorVoltage); // Calculate flow rate based on sensor voltage
   return flowRate;
 }
 
-// Function to take a sample
+// Function to take a sample: replaces the oldest sample of the window and updates the running sums
 void takeSample() {
-  tempSamples[sampleIndex] = readTemperature(A2);
-  returnTempSamples[sampleIndex] = readReturnTemperature(A1);
-  flowRateSamples[sampleIndex] = readFlowRate(A0);
+  int temp = analogRead(A2);
+  int returnTemp = analogRead(A1);
+  int flow = analogRead(A0);
+  tempSum += temp - tempSamples[sampleIndex];
+  returnTempSum += returnTemp - returnTempSamples[sampleIndex];
+  flowRateSum += flow - flowRateSamples[sampleIndex];
+  tempSamples[sampleIndex] = temp;
+  returnTempSamples[sampleIndex] = returnTemp;
+  flowRateSamples[sampleIndex] = flow;
   sampleIndex = (sampleIndex + 1) % avgSamples;
 }
 
-// Function to calculate running average
-float calculateRunningAverage(float* samples, int sampleCount) {
-  float sum = 0.0;
-  for (int i = 0; i < sampleCount; i++) {
-    sum += samples[i];
+// Function to fill the averaging window with one reading per sensor and reset the running sums
+void fillSamples(int temp, int returnTemp, int flow) {
+  for (int i = 0; i < avgSamples; i++) {
+    tempSamples[i] = temp;
+    returnTempSamples[i] = returnTemp;
+    flowRateSamples[i] = flow;
   }
-  return sum / sampleCount;
-}
-
-// Function to read analog voltage
-float readAnalogVoltage(int pin) {
-  int sensorValue = analogRead(pin);
-  float voltage = sensorValue * (5.0 / 1023.0); // Convert to voltage (assuming 5V reference)
-  return voltage;
+  tempSum = (long)temp * avgSamples;
+  returnTempSum = (long)returnTemp * avgSamples;
+  flowRateSum = (long)flow * avgSamples;
+  sampleIndex = 0;
 }
 
 // Function to calculate flow rate based on sensor voltage (Example function, implement according to your sensor)
@@ -155,32 +263,173 @@ void setDACVoltage(float voltage) {
   dacVoltage = correctedVoltage;
 }
 
-// Function to send collected data over serial
-void sendSerialData(float temperature, float dacVoltage, float averagedFlowRate, float flowRate, float returnTemperature) {
-  Serial.print("STemp:");
-  Serial.print(temperature);
-  Serial.print(", DACVolt:");
-  Serial.print(dacVoltage);
-  Serial.print(", AveragedFlowRate:");
-  Serial.print(averagedFlowRate, 3);
-  Serial.print(", FlowRate:");
-  Serial.print(flowRate, 3);
-  Serial.print(", RTemp:");
-  Serial.println(returnTemperature);
-}
-
-// Function to process commands received from the serial port
-void processSerialCommand(String command) {
-  if (command.startsWith("setTemp ")) {
-    targetTemperature = command.substring(8).toFloat();
-    Serial.print("New target temperature: ");
-    Serial.println(targetTemperature);
-  } else if (command.startsWith("setVoltage ")) {
-    desiredVoltage = command.substring(11).toFloat();
-    Serial.print("New DAC voltage: ");
-    Serial.println(desiredVoltage);
+// Function to send collected data over serial (the flow rate is the averaged one)
+void sendSerialData(float temperature, float dacVoltage, float flowRate, float returnTemperature) {
+  serialOut.print("STemp:");
+  serialOut.print(temperature);
+  serialOut.print(", DACVolt:");
+  serialOut.print(dacVoltage);
+  serialOut.print(", FlowRate:");
+  serialOut.print(flowRate, 3);
+  serialOut.print(", RTemp:");
+  serialOut.print(returnTemperature);
+  serialOut.print(", Seq:");
+  serialOut.print(sampleSequence);
+  serialOut.print(", Time:");
+  printDeviceTime(sampleSeconds, sampleMilliseconds);
+  serialOut.println();
+}
+
+// Function to add a sample to the batch; the batch is sent once it holds batchSamples samples
+void addToBatch(float temperature, float dacVoltage, float flowRate, float returnTemperature) {
+  if (batchCount == 0) {
+    batchStartTime = lastSampleTime;
+    batchSequence = sampleSequence;
+    batchSeconds = sampleSeconds;
+    batchMilliseconds = sampleMilliseconds;
+  }
+  batchOffsets[batchCount] = (lastSampleTime - batchStartTime + 500) / 1000; // Rounded to the millisecond
+  batchTemperatures[batchCount] = temperature;
+  batchDacVoltages[batchCount] = dacVoltage;
+  batchFlowRates[batchCount] = flowRate;
+  batchReturnTemperatures[batchCount] = returnTemperature;
+  batchCount++;
+  if (batchCount >= batchSamples) {
+    sendBatch();
+  }
+}
+
+// Function to send the collected samples as one batch line
+void sendBatch() {
+  serialOut.print("BATCH ");
+  serialOut.print(batchSequence);
+  serialOut.print(' ');
+  printDeviceTime(batchSeconds, batchMilliseconds);
+  serialOut.print(" dt,STemp,DACVolt,FlowRate,RTemp");
+  for (int i = 0; i < batchCount; i++) {
+    serialOut.print(';');
+    serialOut.print(batchOffsets[i]);
+    serialOut.print(',');
+    serialOut.print(batchTemperatures[i]);
+    serialOut.print(',');
+    serialOut.print(batchDacVoltages[i]);
+    serialOut.print(',');
+    serialOut.print(batchFlowRates[i], 3);
+    serialOut.print(',');
+    serialOut.print(batchReturnTemperatures[i]);
+  }
+  serialOut.println();
+  batchCount = 0;
+}
+
+// Function to read the characters waiting in the serial buffer; a complete line is handled as a command
+void readSerialCommands() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n') {
+      commandBuffer[commandLength] = '\0';
+      handleCommandLine(commandBuffer, commandOverflow);
+      commandLength = 0;
+      commandOverflow = false;
+    } else if (c != '\r') {
+      if (commandLength < maxCommandLength) {
+        commandBuffer[commandLength++] = c;
+      } else {
+        commandOverflow = true; // Keep discarding until the end of the line
+      }
+    }
+  }
+}
+
+// Function to handle a command line: '<command>' or '#<seq> <command>', which is answered with
+// 'ACK <seq>' once applied or 'NAK <seq> <reason>' instead of the text confirmation
+void handleCommandLine(char* line, bool overflow) {
+  long sequence = -1;
+  char* command = line;
+  if (line[0] == '#') {
+    sequence = strtol(line + 1, &command, 10);
+    while (*command == ' ') {
+      command++;
+    }
+  }
+
+  const char* error = overflow ? "Command too long" : processSerialCommand(command, sequence >= 0);
+  if (sequence < 0) {
+    if (error) {
+      serialOut.println(error);
+    }
+  } else if (error) {
+    serialOut.print("NAK ");
+    serialOut.print(sequence);
+    serialOut.print(' ');
+    serialOut.println(error);
+  } else {
+    serialOut.print("ACK ");
+    serialOut.println(sequence);
+  }
+}
+
+// Function to process commands received from the serial port; returns NULL or the reason it was rejected
+const char* processSerialCommand(const char* command, bool quiet) {
+  if (strncmp(command, "setTemp ", 8) == 0) {
+    targetTemperature = atof(command + 8);
+    if (!quiet) {
+      serialOut.print("New target temperature: ");
+      serialOut.println(targetTemperature);
+    }
+  } else if (strncmp(command, "setVoltage ", 11) == 0) {
+    desiredVoltage = atof(command + 11);
+    if (!quiet) {
+      serialOut.print("New DAC voltage: ");
+      serialOut.println(desiredVoltage);
+    }
     setDACVoltage(desiredVoltage); // Update the DAC voltage immediately
+  } else if (strncmp(command, "setRate ", 8) == 0) {
+    int rate = atoi(command + 8);
+    if (rate < 1 || rate > (batchSamples > 1 ? maxBatchSampleRate : maxSampleRate)) {
+      return "Invalid sample rate";
+    }
+    sampleInterval = 1000000UL / rate;
+    if (!quiet) {
+      serialOut.print("New sample rate: ");
+      serialOut.print(rate);
+      serialOut.println(" Hz");
+    }
+  } else if (strncmp(command, "setAvgWindow ", 13) == 0) {
+    int window = atoi(command + 13);
+    if (window < 1 || window > maxAvgSamples) {
+      return "Invalid averaging window";
+    }
+    // Restart the window from the current averages, so the output does not jump
+    int temp = (tempSum + avgSamples / 2) / avgSamples;
+    int returnTemp = (returnTempSum + avgSamples / 2) / avgSamples;
+    int flow = (flowRateSum + avgSamples / 2) / avgSamples;
+    avgSamples = window;
+    fillSamples(temp, returnTemp, flow);
+    if (!quiet) {
+      serialOut.print("New averaging window: ");
+      serialOut.print(avgSamples);
+      serialOut.println(" samples");
+    }
+  } else if (strncmp(command, "setBatch ", 9) == 0) {
+    int samples = atoi(command + 9);
+    if (samples < 1 || samples > maxBatchSamples) {
+      return "Invalid batch size";
+    }
+    if (samples == 1 && sampleInterval < 1000000UL / maxSampleRate) {
+      return "Sample rate too high for line mode";
+    }
+    if (batchCount > 0) {
+      sendBatch(); // Send the samples collected so far before the size changes
+    }
+    batchSamples = samples;
+    if (!quiet) {
+      serialOut.print("New batch size: ");
+      serialOut.print(batchSamples);
+      serialOut.println(" samples");
+    }
   } else {
-    Serial.println("Unknown command");
+    return "Unknown command";
   }
+  return NULL;
 }
@@ -0,0 +1,81 @@
+"""
+    Frame-rate governed repaint scheduling for the controller GUI.
+    Views are marked dirty when new data arrives and repainted at most once per frame budget.
+"""
+
+import time
+from PyQt5.QtCore import QObject, QTimer
+
+# Default frame budgets in milliseconds
+LABEL_FRAME_MS = 100
+TABLE_FRAME_MS = 250
+GRAPH_FRAME_MS = 1000
+
+
+class RenderView:
+    def __init__(self, name, renderFn, widget=None, frameBudgetMs=GRAPH_FRAME_MS):
+        """
+        A single repaintable view.
+        :param name: Unique name used to mark the view dirty
+        :param renderFn: Callable that repaints the view
+        :param widget: Widget whose visibility gates repaints (None = always visible)
+        :param frameBudgetMs: Minimum time between two repaints [ms]
+        """
+        self.name = name
+        self.renderFn = renderFn
+        self.widget = widget
+        self.frameBudgetMs = frameBudgetMs
+        self.dirty = False
+        self.lastRender = 0.0
+        self.renderCount = 0
+        self.lastRenderDuration = 0.0
+        self.totalRenderDuration = 0.0
+
+    def isVisible(self):
+        return self.widget is None or self.widget.isVisible()
+
+
+class RenderScheduler(QObject):
+    def __init__(self, tickMs=LABEL_FRAME_MS, parent=None):
+        """
+        Repaints dirty views from a single timer tick.
+        :param tickMs: Scheduler resolution [ms]; should not exceed the smallest frame budget
+        """
+        super(RenderScheduler, self).__init__(parent)
+        self.views = {}
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.renderDue)
+        self.timer.start(tickMs)
+
+    def register(self, name, renderFn, widget=None, frameBudgetMs=GRAPH_FRAME_MS):
+        self.views[name] = RenderView(name, renderFn, widget, frameBudgetMs)
+        return self.views[name]
+
+    def setFrameBudget(self, name, frameBudgetMs):
+        self.views[name].frameBudgetMs = frameBudgetMs
+
+    def markDirty(self, *names):
+        for name in names:
+            self.views[name].dirty = True
+
+    def renderDue(self, force=False):
+        """
+        Repaints every dirty, visible view whose frame budget has elapsed.
+        Hidden views stay dirty and are repainted once they become visible again.
+        """
+        now = time.monotonic()
+        for view in self.views.values():
+            if not view.dirty or not view.isVisible():
+                continue
+            if not force and (now - view.lastRender) * 1000 < view.frameBudgetMs:
+                continue
+            view.dirty = False
+            view.lastRender = now
+            view.renderFn()
+            view.renderCount += 1
+            view.lastRenderDuration = time.monotonic() - now
+            view.totalRenderDuration += view.lastRenderDuration
+            now = time.monotonic()
+
+    def stop(self):
+        self.timer.stop()
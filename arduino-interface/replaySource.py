@@ -0,0 +1,176 @@
+"""
+    Replays a recorded session (CSV log, segment log or columnar session) as Arduino telemetry, in place of the
+    serial port.
+
+    ReplaySerial has the part of the serial.Serial interface used by ControllerEngine (in_waiting, readline, write,
+    isOpen, close), so the whole pipeline (parsing, building model, setVoltage commands, logging, graphs) runs as
+    with a live board. Lines are released on the recorded schedule in real time, N times faster, or as fast as
+    the pipeline takes them ('max'). Commands written by the controller are counted and checksummed, so two replays
+    of the same session can be compared for deterministic behaviour.
+"""
+
+import time
+import zlib
+import math
+import itertools
+import serial
+from controllerEngine import MAX_BATCH_SAMPLE_RATE
+
+REPLAY_SLICE_SECONDS = 0.05  # Longest uninterrupted read loop; the caller's poll returns in between
+REPLAY_SPEEDS = {'realtime': 1.0, 'max': None}
+RATE_ESTIMATE_ROWS = 64  # Leading samples the recorded telemetry rate is estimated from
+
+
+def parseReplaySpeed(text):
+    """
+    'realtime', 'max', or a speed-up factor such as '10' or '10x'. Returns the factor, None for 'max'.
+    """
+    text = str(text).strip().lower()
+    if text in REPLAY_SPEEDS:
+        return REPLAY_SPEEDS[text]
+    speed = float(text[:-1] if text.endswith('x') else text)
+    if not speed > 0:
+        raise ValueError(f"Replay speed must be positive: {text}")
+    return speed
+
+
+def telemetryLine(row):
+    """
+    Telemetry line of read-temp.ino for a STORE_COLUMNS row; fields recorded as NaN are left out.
+    """
+    _, t_sup, dacVoltage, _, flowRate, t_ret_mea = row[:6]
+    fields = [('STemp', t_sup, 2), ('DACVolt', dacVoltage, 2), ('FlowRate', flowRate, 3), ('RTemp', t_ret_mea, 2)]
+    return ", ".join(f"{name}:{value:.{digits}f}" for name, value, digits in fields if not math.isnan(value))
+
+
+class ReplaySerial:
+    def __init__(self, path, speed=1.0, sliceSeconds=REPLAY_SLICE_SECONDS, clock=time.monotonic):
+        """
+        :param path: CSV log, segment log directory, columnar session directory or its header.json
+        :param speed: Playback speed factor (1.0 is real time); None replays as fast as lines are read
+        :param sliceSeconds: Longest time lines are released without in_waiting returning 0
+        :param clock: Monotonic time source [s]
+        Raises serial.SerialException if the session cannot be read, like a port that cannot be opened.
+        """
+        from sessionLoader import openSessionReader
+
+        self.path = path
+        self.speed = speed
+        self.sliceSeconds = sliceSeconds
+        self.clock = clock
+        try:
+            self.reader = openSessionReader(path)
+        except (OSError, ValueError) as e:
+            raise serial.SerialException(f"Cannot replay {path}: {e}")
+        self.recordedRows = (row for rows, _ in self.reader.chunks() for row in rows.tolist())
+        self.row = self.readRow()  # Next row to replay
+        self.startTime = self.row[0] if self.row else None  # Recorded time of the first sample [s since the epoch]
+        self.sampleRate = self.estimateSampleRate()  # Recorded telemetry rate [Hz]
+        self.is_open = True
+
+        self.pending = b''
+        self.sliceStart = None
+        self.replayStart = None  # Clock time of the first line
+        self.lastLineTime = None
+        self.linesReplayed = 0
+        self.commandsReceived = 0
+        self.commandDigest = 0
+        self.maxLag = 0.0
+
+    def readRow(self):
+        try:
+            return next(self.recordedRows, None)
+        except (OSError, ValueError) as e:
+            raise serial.SerialException(f"Cannot replay {self.path}: {e}")
+
+    def estimateSampleRate(self):
+        """
+        Telemetry rate from the median spacing of the leading samples, as a whole number of 1..MAX_BATCH_SAMPLE_RATE Hz.
+        """
+        leadingRows = []
+        try:
+            leadingRows = list(itertools.islice(self.recordedRows, RATE_ESTIMATE_ROWS - 1))
+        except (OSError, ValueError) as e:
+            raise serial.SerialException(f"Cannot replay {self.path}: {e}")
+        self.recordedRows = itertools.chain(leadingRows, self.recordedRows)
+        spacings = sorted(later[0] - earlier[0] for earlier, later in zip([self.row] + leadingRows, leadingRows))
+        spacing = spacings[len(spacings) // 2] if spacings else 1.0
+        if not spacing > 0:
+            return 1.0
+        return float(min(max(round(1.0 / spacing), 1), MAX_BATCH_SAMPLE_RATE))
+
+    @property
+    def finished(self):
+        """
+        True once every recorded line has been read.
+        """
+        return not self.pending and self.row is None
+
+    @property
+    def in_waiting(self):
+        if self.pending:
+            return len(self.pending)
+        if not self.is_open:
+            return 0
+
+        now = self.clock()
+        if self.sliceStart is None:
+            self.sliceStart = now
+        elif now - self.sliceStart >= self.sliceSeconds:
+            self.sliceStart = None  # Ends the caller's read loop; the next call starts a new slice
+            return 0
+
+        row = self.row
+        if row is None:
+            self.sliceStart = None
+            return 0
+        if self.replayStart is None:
+            self.replayStart = now
+        if self.speed is not None:
+            due = self.replayStart + (row[0] - self.startTime) / self.speed
+            if due > now:
+                self.sliceStart = None
+                return 0
+            self.maxLag = max(self.maxLag, now - due)
+
+        self.row = self.readRow()
+        self.pending = (telemetryLine(row) + "\r\n").encode('utf-8')
+        return len(self.pending)
+
+    def readline(self):
+        if not self.pending:
+            self.in_waiting
+        line, self.pending = self.pending, b''
+        if line:
+            self.linesReplayed += 1
+            self.lastLineTime = self.clock()
+        return line
+
+    def write(self, data):
+        self.commandsReceived += data.count(b'\n')
+        self.commandDigest = zlib.crc32(data, self.commandDigest)
+        return len(data)
+
+    def isOpen(self):
+        return self.is_open
+
+    def close(self):
+        self.is_open = False
+
+    def stats(self):
+        elapsed = (self.lastLineTime - self.replayStart) if self.linesReplayed else 0.0
+        return {
+            'linesReplayed': self.linesReplayed,
+            'elapsed': elapsed,
+            'linesPerSecond': self.linesReplayed / elapsed if elapsed > 0 else 0.0,
+            'commandsReceived': self.commandsReceived,
+            'commandDigest': self.commandDigest,
+            'maxLag': self.maxLag,
+            'finished': self.finished
+        }
+
+
+def formatReplayStats(stats):
+    return (f"{stats['linesReplayed']} lines in {stats['elapsed']:.1f} s ({stats['linesPerSecond']:.0f} lines/s), "
+            f"{stats['commandsReceived']} commands (digest {stats['commandDigest']:08x}), "
+            f"max lag {stats['maxLag']:.2f} s")
@@ -0,0 +1,192 @@
+"""
+    Crash-safe write-ahead journal for the CSV log (bench1.csv -> bench1.journal).
+
+    Every batch of samples is appended to the journal as fixed-size checksummed records with a single write and
+    a single fsync (group commit), instead of an fsync per row. The CSV log is only synced at checkpoints; a checkpoint
+    syncs the CSV log and starts a new, empty journal whose header holds the CSV size at that point.
+
+    After a crash or power loss, recoverJournal() cuts the CSV log back to the checkpointed size (removing a torn
+    final row) and re-appends every valid journal record, so the log ends with the last committed sample.
+"""
+
+import io
+import os
+import csv
+import time
+import zlib
+import struct
+import math
+from csvWriter import CSVWriterThread
+
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_MAGIC = b'HPJ1'
+JOURNAL_HEADER = struct.Struct('<4sQI')  # Magic, CSV log size at the checkpoint, CRC32 of the first two fields
+JOURNAL_RECORD = struct.Struct('<I12d')  # CRC32 of the values, sample time [s since the epoch], 11 sample values
+JOURNAL_CHECKPOINT_ROWS = 10000
+JOURNAL_CHECKPOINT_INTERVAL = 60.0  # [s]
+
+
+def journalPathFor(csvPath):
+    return os.path.splitext(csvPath)[0] + JOURNAL_SUFFIX
+
+
+def packRecord(row):
+    values = struct.pack('<12d', *row)
+    return struct.pack('<I', zlib.crc32(values)) + values
+
+
+def syncDirectory(path):
+    # Makes a rename durable; not supported on Windows, where NTFS journals metadata itself
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def createJournal(path, csvOffset):
+    """
+    Atomically replaces the journal with an empty one for a CSV log synced up to csvOffset bytes.
+    """
+    header = JOURNAL_MAGIC + struct.pack('<Q', csvOffset)
+    temporaryPath = path + '.tmp'
+    with open(temporaryPath, 'wb') as file:
+        file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, csvOffset, zlib.crc32(header)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporaryPath, path)
+    syncDirectory(path)
+
+
+def readJournal(path):
+    """
+    Returns (CSV size at the last checkpoint, valid sample rows). Reading stops at the first torn or corrupt record.
+    Raises ValueError if the header is not valid.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < JOURNAL_HEADER.size:
+        raise ValueError("Journal header is incomplete")
+    magic, csvOffset, checksum = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or checksum != zlib.crc32(data[:12]):
+        raise ValueError("Journal header is corrupt")
+
+    rows = []
+    for position in range(JOURNAL_HEADER.size, len(data) - JOURNAL_RECORD.size + 1, JOURNAL_RECORD.size):
+        checksum, *row = JOURNAL_RECORD.unpack_from(data, position)
+        if checksum != zlib.crc32(data[position + 4:position + JOURNAL_RECORD.size]):
+            break
+        rows.append(row)
+    return csvOffset, rows
+
+
+def csvRow(row, milliseconds=False):
+    """
+    CSV log row of a journal record, as ControllerEngine logs it: time of day, then the values ('' for missing).
+    :param milliseconds: Write the time with milliseconds, as logged at sample rates above 1 Hz
+    """
+    from sampleStore import timeOfDayText
+    return [timeOfDayText(row[0], milliseconds)] + [None if math.isnan(value) else value for value in row[1:]]
+
+
+def recoverJournal(journalPath, csvPath, metadata=(), columnTitles=()):
+    """
+    Rolls a journal left by a crashed run into its CSV log and removes it.
+    Returns the number of recovered samples, or None if there was no journal.
+    :param metadata: (name, value) pairs of the preamble written if the CSV log is missing or empty
+    :param columnTitles: Column headers written below that preamble
+    """
+    if not os.path.exists(journalPath):
+        return None
+    try:
+        csvOffset, rows = readJournal(journalPath)
+    except ValueError:
+        os.remove(journalPath)  # Crashed while creating the journal, before any sample was committed to it
+        return 0
+
+    from sampleStore import hasSubSecondSpacing
+    milliseconds = hasSubSecondSpacing([row[0] for row in rows])
+    text = io.StringIO()
+    writer = csv.writer(text)
+    with open(csvPath, 'r+b' if os.path.exists(csvPath) else 'w+b') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() > csvOffset:
+            file.truncate(csvOffset)  # Rows after the checkpoint may be torn or missing; the journal has them all
+        if file.seek(0, os.SEEK_END) == 0:  # Log lost with its preamble; readCSVPreamble needs the column headers
+            for name, value in metadata:
+                writer.writerow([name, value])
+            writer.writerow([])
+            writer.writerow(columnTitles)
+        writer.writerows(csvRow(row, milliseconds) for row in rows)
+        file.write(text.getvalue().encode('utf-8'))
+        file.flush()
+        os.fsync(file.fileno())
+    os.remove(journalPath)
+    return len(rows)
+
+
+class JournaledCSVWriterThread(CSVWriterThread):
+    def __init__(self, file, journalPath, checkpointRows=JOURNAL_CHECKPOINT_ROWS,
+                 checkpointInterval=JOURNAL_CHECKPOINT_INTERVAL, **writerArgs):
+        """
+        CSV writer that commits every batch to a journal first. The fsync policy applies to the journal;
+        the CSV log is synced at checkpoints.
+        :param file: CSV log opened for appending, with the preamble already written
+        :param journalPath: Journal file; must not hold uncovered samples (run recoverJournal first)
+        :param checkpointRows: Journaled rows that trigger a checkpoint
+        :param checkpointInterval: Maximum time between two checkpoints [s]
+        """
+        super(JournaledCSVWriterThread, self).__init__(file, **writerArgs)
+        self.journalPath = journalPath
+        self.checkpointRows = checkpointRows
+        self.checkpointInterval = checkpointInterval
+        self.journal = None
+        self.journalRows = 0
+        self.lastCheckpoint = time.monotonic()
+        self.checkpoint()
+
+    def submitSample(self, record, timestamp):
+        self.submit([timestamp] + record)
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if self.journal:
+            self.journal.close()
+        createJournal(self.journalPath, os.fstat(self.file.fileno()).st_size)
+        self.journal = open(self.journalPath, 'ab')
+        self.journalRows = 0
+        self.lastCheckpoint = time.monotonic()
+
+    def writeRows(self, batch):
+        # One journal write for the whole batch, synced once by syncFile (group commit). The CSV rows are only
+        # synced at the next checkpoint, so a crash can never leave CSV rows that the journal does not cover.
+        self.journal.write(b''.join(packRecord([math.nan if value is None else value for value in row[:1] + row[2:]])
+                                    for row in batch))
+        self.journal.flush()
+
+        self.writer.writerows(row[1:] for row in batch)
+        self.file.flush()
+        self.journalRows += len(batch)
+        if self.journalRows >= self.checkpointRows or time.monotonic() - self.lastCheckpoint >= self.checkpointInterval:
+            self.checkpoint()
+
+    def syncFile(self):
+        os.fsync(self.journal.fileno())
+
+    def close(self, timeout=None):
+        """
+        Writes the queued rows, syncs the CSV log and removes the journal.
+        """
+        super(JournaledCSVWriterThread, self).close(timeout)
+        if self.journal and self.error is None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.journal.close()
+            os.remove(self.journalPath)
+            self.journal = None
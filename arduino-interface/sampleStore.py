@@ -0,0 +1,134 @@
+"""
+    Fixed-size in-memory sample history shared by the table and the graphs.
+    Only the most recent window is kept in memory; the complete run is in the on-disk log.
+"""
+
+import time
+import numpy as np
+
+HISTORY_WINDOW_SAMPLES = 24 * 3600  # One day at 1 sample per second (~8 MB for 12 float64 columns)
+SUB_SECOND_SPACING = 0.75  # Samples closer together than this [s] are logged with millisecond times (rates > 1 Hz)
+
+# Column keys of the stored records, in SAMPLE_COLUMNS order ('time' is seconds since the epoch)
+STORE_COLUMNS = ['time', 't_sup', 'dac_voltage', 't_ret_model', 'flow_rate', 't_ret_mea',
+                 'q_hb', 'q_ba', 'q_hp', 'q_int', 'q_bh', 't_b']
+
+
+def storeRow(timestamp, record):
+    """
+    Converts a sample record as logged by ControllerEngine to a row of STORE_COLUMNS floats (None becomes NaN).
+    :param timestamp: Sample time [s since the epoch]
+    """
+    return [timestamp] + [np.nan if value is None else value for value in record[1:]]
+
+
+def timeOfDayText(timestamp, milliseconds=False):
+    """
+    Time column text of the CSV log: local 'HH:MM:SS', or 'HH:MM:SS.mmm' (truncated) for sample rates above 1 Hz.
+    """
+    text = time.strftime('%H:%M:%S', time.localtime(timestamp))
+    if milliseconds:
+        text += f".{int((timestamp % 1) * 1000 + 0.0005) % 1000:03d}"
+    return text
+
+
+def hasSubSecondSpacing(times):
+    """
+    True if consecutive sample times are less than a second apart, i.e. the log needs millisecond times.
+    """
+    return len(times) > 1 and bool(np.min(np.diff(np.asarray(times, dtype=float))) < SUB_SECOND_SPACING)
+
+
+class RingBuffer:
+    def __init__(self, capacity, columns):
+        """
+        Preallocated float64 ring buffer; appending never allocates and the oldest rows are overwritten.
+        :param capacity: Maximum number of rows held
+        :param columns: Number of columns per row
+        """
+        self.capacity = capacity
+        self.data = np.full((capacity, columns), np.nan)
+        self.head = 0  # Index the next row is written to
+        self.size = 0
+        self.totalAppended = 0
+
+    def append(self, row):
+        self.data[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.totalAppended += 1
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=float)[-self.capacity:]
+        count = len(rows)
+        first = min(count, self.capacity - self.head)
+        self.data[self.head:self.head + first] = rows[:first]
+        self.data[:count - first] = rows[first:]
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.totalAppended += count
+
+    def physicalIndex(self, row):
+        """
+        Position in data of the row-th oldest row.
+        """
+        return (self.head - self.size + row) % self.capacity
+
+    def row(self, row):
+        return self.data[self.physicalIndex(row)]
+
+    def column(self, column):
+        """
+        Returns the column in chronological order (a copy only when the buffer has wrapped).
+        """
+        start = self.physicalIndex(0)
+        if start + self.size <= self.capacity:
+            return self.data[start:start + self.size, column]
+        return np.concatenate((self.data[start:, column], self.data[:self.head, column]))
+
+    def rows(self):
+        """
+        Returns a chronological copy of all rows, e.g. as a snapshot for an export.
+        """
+        start = self.physicalIndex(0)
+        if start + self.size <= self.capacity:
+            return self.data[start:start + self.size].copy()
+        return np.concatenate((self.data[start:], self.data[:self.head]))
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+
+class SampleStore:
+    def __init__(self, capacity=HISTORY_WINDOW_SAMPLES):
+        self.buffer = RingBuffer(capacity, len(STORE_COLUMNS))
+
+    def __len__(self):
+        return self.buffer.size
+
+    def append(self, timestamp, record):
+        """
+        :param timestamp: Sample time [s since the epoch]
+        :param record: Sample record as logged by ControllerEngine; None values are stored as NaN
+        """
+        self.buffer.append(storeRow(timestamp, record))
+
+    def extend(self, rows):
+        """
+        :param rows: (rows, STORE_COLUMNS) array, e.g. a query result of the sample database
+        """
+        if len(rows):
+            self.buffer.extend(rows)
+
+    def column(self, key):
+        return self.buffer.column(STORE_COLUMNS.index(key))
+
+    def row(self, row):
+        return self.buffer.row(row)
+
+    def rows(self):
+        return self.buffer.rows()
+
+    def clear(self):
+        self.buffer.clear()
@@ -0,0 +1,251 @@
+"""
+    Compressed, rotating CSV log: bench1.csv is written as bench1.segments/segment-00000.csv.zst, segment-00001...
+
+    Each segment is a zstd-compressed CSV log in the controller's format (metadata preamble, column headers, rows),
+    compressed on the writer thread with streaming zstd. A new segment is started when the current one holds
+    SEGMENT_MAX_BYTES of CSV text or spans SEGMENT_MAX_SECONDS of samples. index.json lists the segments with
+    their first/last sample times and row numbers for seeking; SegmentLog streams rows across segments.
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import zstandard
+from csvWriter import BatchWriterThread
+
+SEGMENTS_SUFFIX = '.segments'
+INDEX_FILE = 'index.json'
+SEGMENT_MAX_BYTES = 64 * 2 ** 20  # Uncompressed CSV text per segment
+SEGMENT_MAX_SECONDS = 24 * 3600  # Sample time spanned by one segment
+ZSTD_LEVEL = 3
+INDEX_UPDATE_INTERVAL = 60.0  # [s] between index updates for the segment being written
+
+
+def segmentsPathFor(csvPath):
+    """
+    Segment directory used instead of a single CSV log: bench1.csv -> bench1.segments
+    """
+    return os.path.splitext(csvPath)[0] + SEGMENTS_SUFFIX
+
+
+def segmentFileName(number):
+    return f"segment-{number:05d}.csv.zst"
+
+
+def writeIndex(directory, index):
+    temporaryPath = os.path.join(directory, INDEX_FILE + '.tmp')
+    with open(temporaryPath, 'w', encoding='utf-8') as file:
+        json.dump(index, file, indent=2)
+    os.replace(temporaryPath, os.path.join(directory, INDEX_FILE))
+
+
+class SegmentWriterThread(BatchWriterThread):
+    def __init__(self, directory, metadata=(), columnTitles=(), maxBytes=SEGMENT_MAX_BYTES,
+                 maxSeconds=SEGMENT_MAX_SECONDS, level=ZSTD_LEVEL, **writerArgs):
+        """
+        :param directory: Segment directory; segments are added to an existing log
+        :param metadata: (name, value) pairs written at the top of every segment
+        :param columnTitles: Column header row
+        :param maxBytes: Uncompressed size that starts a new segment
+        :param maxSeconds: Sample time span that starts a new segment [s]
+        :param level: zstd compression level
+        :param writerArgs: Batching and fsync settings, see BatchWriterThread
+        """
+        super(SegmentWriterThread, self).__init__("SegmentWriter", **writerArgs)
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.maxSeconds = maxSeconds
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        os.makedirs(directory, exist_ok=True)
+
+        indexPath = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(indexPath):
+            with open(indexPath, encoding='utf-8') as file:
+                self.index = json.load(file)
+        else:
+            self.index = {'columnTitles': list(columnTitles), 'segments': []}
+        self.index['metadata'] = [list(item) for item in metadata] or self.index.get('metadata', [])
+        writeIndex(directory, self.index)
+
+        # Preamble written at the top of every segment, so each one is a complete CSV log on its own
+        preamble = io.StringIO()
+        preambleWriter = csv.writer(preamble)
+        for name, value in self.index['metadata']:
+            preambleWriter.writerow([name, value])
+        preambleWriter.writerow([])
+        preambleWriter.writerow(self.index['columnTitles'])
+        self.preamble = preamble.getvalue().encode('utf-8')
+
+        self.segment = None  # Index entry of the segment being written
+        self.rawFile = None
+        self.stream = None
+        self.lastIndexUpdate = 0.0
+
+    def submitSample(self, record, timestamp):
+        self.submit([timestamp] + record)
+
+    def openSegment(self, firstTime):
+        segments = self.index['segments']
+        number = len(segments)
+        self.segment = {
+            'file': segmentFileName(number),
+            'firstTime': firstTime,
+            'lastTime': firstTime,
+            'firstRow': segments[-1]['firstRow'] + segments[-1]['rows'] if segments else 0,
+            'rows': 0,
+            'bytes': 0,
+            'compressedBytes': 0,
+            'complete': False
+        }
+        segments.append(self.segment)
+        writeIndex(self.directory, self.index)  # Listed before it is created, so a reader always finds it
+
+        self.rawFile = open(os.path.join(self.directory, self.segment['file']), 'wb')
+        self.stream = self.compressor.stream_writer(self.rawFile, closefd=False)
+        self.writeData(self.preamble)
+
+    def closeSegment(self):
+        self.stream.flush(zstandard.FLUSH_FRAME)
+        self.rawFile.flush()
+        os.fsync(self.rawFile.fileno())
+        self.segment['compressedBytes'] = self.rawFile.tell()
+        self.segment['complete'] = True
+        self.stream.close()
+        self.rawFile.close()
+        self.segment = self.rawFile = self.stream = None
+        writeIndex(self.directory, self.index)
+
+    def writeData(self, data):
+        self.stream.write(data)
+        self.stream.flush(zstandard.FLUSH_BLOCK)  # Every written batch can be decompressed after a crash
+        self.rawFile.flush()
+        self.segment['bytes'] += len(data)
+        self.segment['compressedBytes'] = self.rawFile.tell()
+
+    def writeRows(self, batch):
+        start = 0
+        while start < len(batch):
+            if self.segment is None:
+                self.openSegment(batch[start][0])
+
+            # Rows up to the segment's time limit
+            stop = start
+            endTime = self.segment['firstTime'] + self.maxSeconds
+            while stop < len(batch) and batch[stop][0] < endTime:
+                stop += 1
+
+            if stop > start:
+                text = io.StringIO()
+                csv.writer(text).writerows(row[1:] for row in batch[start:stop])
+                self.writeData(text.getvalue().encode('utf-8'))
+                self.segment['rows'] += stop - start
+                self.segment['lastTime'] = batch[stop - 1][0]
+
+            if stop < len(batch) or self.segment['bytes'] >= self.maxBytes:
+                self.closeSegment()
+            elif time.monotonic() - self.lastIndexUpdate >= INDEX_UPDATE_INTERVAL:
+                self.lastIndexUpdate = time.monotonic()
+                writeIndex(self.directory, self.index)
+            start = stop
+
+    def syncFile(self):
+        if self.rawFile:
+            os.fsync(self.rawFile.fileno())
+
+    def close(self, timeout=None):
+        super(SegmentWriterThread, self).close(timeout)
+        if self.segment:
+            self.closeSegment()
+
+
+class SegmentLog:
+    def __init__(self, directory):
+        """
+        Reads a segment directory written by SegmentWriterThread, including one that is still being written.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as file:
+            self.index = json.load(file)
+        self.segments = self.index['segments']
+
+    @property
+    def metadata(self):
+        return [tuple(item) for item in self.index.get('metadata', [])]
+
+    @property
+    def columnTitles(self):
+        return self.index.get('columnTitles', [])
+
+    def __len__(self):
+        """
+        Number of rows according to the index (the segment being written may hold more).
+        """
+        return sum(segment['rows'] for segment in self.segments)
+
+    def segmentsBetween(self, start=None, end=None):
+        """
+        Index entries of the segments holding samples between start and end [s since the epoch].
+        """
+        return [segment for segment in self.segments
+                if (start is None or not segment['complete'] or segment['lastTime'] >= start)
+                and (end is None or segment['firstTime'] <= end)]
+
+    def lines(self, start=None, end=None):
+        """
+        Yields the CSV data lines (without the preambles) of the segments between start and end, in order.
+        Seeking is per segment; a torn tail of a segment that was being written is skipped.
+        """
+        preambleLines = len(self.metadata) + 2
+        for segment in self.segmentsBetween(start, end):
+            path = os.path.join(self.directory, segment['file'])
+            if not os.path.exists(path):
+                continue
+            for number, line in enumerate(readSegmentLines(path)):
+                if number >= preambleLines:
+                    yield line
+
+    def rows(self, start=None, end=None):
+        """
+        Yields the data rows as lists of strings, as read from a CSV log.
+        """
+        return csv.reader(self.lines(start, end))
+
+    def exportCSV(self, csvPath, progress=None):
+        """
+        Concatenates the segments into one CSV log in the controller's format.
+        :param progress: Optional callable(rowsWritten, indexedRows)
+        """
+        total = len(self)
+        with open(csvPath, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            for name, value in self.metadata:
+                writer.writerow([name, value])
+            writer.writerow([])
+            writer.writerow(self.columnTitles)
+            for number, line in enumerate(self.lines(), 1):
+                file.write(line)
+                if progress and number % 65536 == 0:
+                    progress(number, total)
+
+
+def readSegmentLines(path, chunkSize=2 ** 20):
+    """
+    Yields the complete text lines of a segment. Decompresses chunk by chunk with a decompressobj, which also
+    returns the flushed blocks of a frame that is still being written (or was cut off by a crash).
+    """
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    remainder = b''
+    with open(path, 'rb') as rawFile:
+        while True:
+            chunk = rawFile.read(chunkSize)
+            if not chunk:
+                break
+            try:
+                data = remainder + decompressor.decompress(chunk)
+            except zstandard.ZstdError:
+                break  # Torn tail
+            *lines, remainder = data.split(b'\n')
+            for line in lines:
+                yield line.decode('utf-8') + '\n'
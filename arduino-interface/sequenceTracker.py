@@ -0,0 +1,87 @@
+"""
+    Sample sequence numbers of the telemetry sent by read-temp.ino.
+
+    Every sample carries the running number of the Arduino ('Seq:1234' in a telemetry line; a batch line carries
+    the number of its first sample). SequenceTracker compares each number with the one expected next, so samples
+    lost on the way (serial buffer overruns when the host falls behind, USB glitches), repeated or late samples and
+    board restarts are counted instead of silently shifting the logged times.
+"""
+
+from collections import deque
+
+SEQUENCE_MODULUS = 2 ** 32  # sampleSequence is an unsigned long in read-temp.ino and wraps around
+REORDER_WINDOW = 64  # Numbers this far behind the expected one are repeated or late samples, not a board restart
+GAP_HISTORY = 100  # Most recent gaps kept for inspection
+
+
+class SequenceTracker:
+    def __init__(self):
+        self.expected = None  # Sequence number expected next; None until the first sample after (re)connecting
+        self.recent = deque(maxlen=REORDER_WINDOW)  # Numbers received most recently, to tell repeats from late samples
+        self.gaps = deque(maxlen=GAP_HISTORY)  # (first lost number, samples lost), oldest first
+
+        self.received = 0
+        self.lost = 0
+        self.gapCount = 0
+        self.largestGap = 0
+        self.duplicates = 0
+        self.late = 0  # Samples that arrived after later ones; their time slot has passed
+        self.restarts = 0
+
+    def restart(self):
+        """
+        Forgets the expected number, e.g. when the port is reopened and the board restarts counting.
+        The counters are kept.
+        """
+        self.expected = None
+        self.recent.clear()
+
+    def update(self, sequence):
+        """
+        Registers the sequence number of a received sample.
+        Returns the number of samples lost just before it (0 if none), or None if the sample is a repeat or
+        arrived late and should be dropped.
+        """
+        if self.expected is not None:
+            ahead = (sequence - self.expected) % SEQUENCE_MODULUS
+            behind = SEQUENCE_MODULUS - ahead
+            if ahead and behind <= REORDER_WINDOW:
+                if sequence in self.recent:
+                    self.duplicates += 1
+                else:
+                    self.late += 1
+                return None
+            if ahead >= SEQUENCE_MODULUS // 2:
+                self.restarts += 1  # Far behind: the board started counting again
+                ahead = 0
+        else:
+            ahead = 0
+
+        if ahead:
+            self.lost += ahead
+            self.gapCount += 1
+            self.largestGap = max(self.largestGap, ahead)
+            self.gaps.append((self.expected, ahead))
+        self.received += 1
+        self.recent.append(sequence)
+        self.expected = (sequence + 1) % SEQUENCE_MODULUS
+        return ahead
+
+    def stats(self):
+        total = self.received + self.lost
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'lossRate': self.lost / total if total else 0.0,
+            'gaps': self.gapCount,
+            'largestGap': self.largestGap,
+            'duplicates': self.duplicates,
+            'late': self.late,
+            'restarts': self.restarts
+        }
+
+
+def formatSequenceStats(stats):
+    return (f"{stats['received']} samples, {stats['lost']} lost ({stats['lossRate'] * 100:.2f}%) in {stats['gaps']} "
+            f"gaps (largest {stats['largestGap']}), {stats['duplicates']} duplicates, {stats['late']} late, "
+            f"{stats['restarts']} restarts")
@@ -0,0 +1,229 @@
+"""
+    Reads previous runs for the "Open Session" button and for replays: CSV logs written by ControllerEngine (metadata
+    preamble, column headers, rows), compressed segment logs (segmentLog.py) and columnar sessions (sessionStore.py).
+
+    CSV rows are parsed in chunks by pandas' C parser and converted with vectorized numpy code, so multi-million
+    row logs load in seconds; the chunks are (rows, STORE_COLUMNS) float arrays ready for SampleStore.extend().
+"""
+
+import io
+import os
+import csv
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from sampleStore import STORE_COLUMNS
+
+OPEN_CHUNK_ROWS = 100000
+OPEN_SESSION_MAX_SAMPLES = 1000000  # Samples kept in memory for an opened session (~96 MB)
+MAX_PREAMBLE_LINES = 100
+ROLLOVER_SECONDS = 12 * 3600  # A time of day this much earlier than the previous row starts a new day
+
+
+def readCSVPreamble(path):
+    """
+    Returns (metadata (name, value) pairs, column headers, number of lines before the first data row).
+    """
+    metadata = []
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        for lineNumber, row in enumerate(reader):
+            if not row:  # Empty row separating the metadata from the column headers
+                return metadata, next(reader, []), lineNumber + 2
+            if len(row) == len(STORE_COLUMNS) and row[0] == 'Time':  # Log without a preamble
+                return metadata, row, lineNumber + 1
+            if lineNumber >= MAX_PREAMBLE_LINES:
+                break
+            metadata.append((row[0], row[1] if len(row) > 1 else ''))
+    raise ValueError(f"{os.path.basename(path)} is not a controller CSV log (no column headers found)")
+
+
+def parseTimeOfDay(values):
+    """
+    Vectorized 'HH:MM:SS' or 'HH:MM:SS.mmm' (logs above 1 Hz) -> seconds since midnight; NaN for anything else.
+    """
+    text = np.asarray(values, dtype=str).astype('S12')
+    characters = text.view(np.uint8).reshape(len(text), 12).astype(np.int64)
+    digits = characters - ord('0')
+    isDigit = (digits >= 0) & (digits <= 9)
+    valid = ((characters[:, 2] == ord(':')) & (characters[:, 5] == ord(':'))
+             & np.all(isDigit[:, [0, 1, 3, 4, 6, 7]], axis=1))
+    seconds = ((digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60
+               + digits[:, 6] * 10 + digits[:, 7])
+    milliseconds = (characters[:, 8] == ord('.')) & np.all(isDigit[:, 9:], axis=1)
+    valid &= milliseconds | (characters[:, 8] == 0)
+    seconds = seconds + np.where(milliseconds, (digits[:, 9] * 100 + digits[:, 10] * 10 + digits[:, 11]) / 1000, 0)
+    return np.where(valid, seconds, np.nan)
+
+
+def metadataDate(metadata):
+    """
+    The 'Date' preamble entry as a date, or None if there is none or it cannot be read.
+    """
+    for name, value in metadata:
+        if name == 'Date':
+            try:
+                return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+            except ValueError:
+                return None
+    return None
+
+
+class TimeOfDayClock:
+    def __init__(self, startDate):
+        """
+        Converts the time-of-day column of a CSV log to epoch times, counting day rollovers across chunks.
+        :param startDate: Local date of the first row
+        """
+        self.startDate = startDate
+        self.day = 0
+        self.lastSeconds = None
+        self.midnights = {}
+
+    def midnight(self, day):
+        if day not in self.midnights:
+            self.midnights[day] = time.mktime((self.startDate + timedelta(days=day)).timetuple())
+        return self.midnights[day]
+
+    def toEpoch(self, seconds):
+        previous = np.concatenate(([seconds[0] if self.lastSeconds is None else self.lastSeconds], seconds[:-1]))
+        days = self.day + np.cumsum(previous - seconds > ROLLOVER_SECONDS)
+        self.day = int(days[-1])
+        self.lastSeconds = seconds[-1]
+
+        uniqueDays, inverse = np.unique(days, return_inverse=True)
+        midnights = np.array([self.midnight(int(day)) for day in uniqueDays])
+        return midnights[inverse] + seconds
+
+
+class CSVSessionReader:
+    def __init__(self, path):
+        self.path = path
+        self.metadata, self.columns, self.dataLine = readCSVPreamble(path)
+        if len(self.columns) != len(STORE_COLUMNS):
+            raise ValueError(f"Expected {len(STORE_COLUMNS)} columns, found {len(self.columns)}")
+
+    def startDate(self):
+        """
+        Date of the first row: the 'Date' preamble entry, or the file's modification date.
+        """
+        return metadataDate(self.metadata) or datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+
+    def chunks(self, chunkRows=OPEN_CHUNK_ROWS):
+        """
+        Yields (rows, fraction of the file read). Rows with an unreadable time are skipped, e.g. the preamble and
+        column headers of a second run appended to the same log; unreadable values become NaN.
+        """
+        totalBytes = max(os.path.getsize(self.path), 1)
+        with open(self.path, 'rb') as file:
+            for _ in range(self.dataLine):
+                file.readline()
+            for rows in parseCSVRows(file, TimeOfDayClock(self.startDate()), chunkRows):
+                yield rows, min(file.tell() / totalBytes, 1.0)
+
+
+def parseCSVRows(file, clock, chunkRows=OPEN_CHUNK_ROWS):
+    """
+    Yields (rows, STORE_COLUMNS) float arrays of the CSV data lines read from a binary file, see
+    CSVSessionReader.chunks().
+    """
+    import pandas as pd
+
+    for chunk in pd.read_csv(file, header=None, names=range(len(STORE_COLUMNS)), dtype=str,
+                             chunksize=chunkRows, na_values=['', 'N/A'], keep_default_na=False,
+                             on_bad_lines='skip', engine='c'):
+        seconds = parseTimeOfDay(chunk[0].fillna('').to_numpy())
+        rows = chunk.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        keep = ~np.isnan(seconds)
+        if keep.any():
+            yield np.column_stack((clock.toEpoch(seconds[keep]), rows[keep]))
+
+
+class LineStream(io.RawIOBase):
+    def __init__(self, lines):
+        """
+        Binary file over an iterator of text lines, for parsers that read files (pandas.read_csv).
+        """
+        self.lines = lines
+        self.pending = b''
+        self.bytesRead = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            line = next(self.lines, None)
+            if line is None:
+                return 0
+            self.pending = line.encode('utf-8')
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        self.bytesRead += size
+        return size
+
+
+class SegmentSessionReader:
+    def __init__(self, path):
+        from segmentLog import SegmentLog
+
+        self.path = path
+        self.log = SegmentLog(path)
+        self.metadata = self.log.metadata
+        if len(self.log.columnTitles) != len(STORE_COLUMNS):
+            raise ValueError(f"Expected {len(STORE_COLUMNS)} columns, found {len(self.log.columnTitles)}")
+
+    def startDate(self):
+        """
+        Date of the first row: the 'Date' preamble entry, or the first indexed sample time.
+        """
+        date = metadataDate(self.metadata)
+        if date is not None:
+            return date
+        if self.log.segments:
+            return datetime.fromtimestamp(self.log.segments[0]['firstTime']).date()
+        return datetime.now().date()
+
+    def chunks(self, chunkRows=OPEN_CHUNK_ROWS):
+        """
+        Yields (rows, fraction of the indexed rows read), streaming the segments one after the other.
+        """
+        indexedRows = max(len(self.log), 1)
+        rowsRead = 0
+        with io.BufferedReader(LineStream(self.log.lines())) as file:
+            for rows in parseCSVRows(file, TimeOfDayClock(self.startDate()), chunkRows):
+                rowsRead += len(rows)
+                yield rows, min(rowsRead / indexedRows, 1.0)
+
+
+class ColumnarSessionReader:
+    def __init__(self, path):
+        from sessionStore import Session
+
+        self.path = path
+        self.session = Session(path)
+        self.metadata = self.session.metadata
+
+    def chunks(self, chunkRows=OPEN_CHUNK_ROWS):
+        length = len(self.session)
+        for start in range(0, length, chunkRows):
+            stop = min(start + chunkRows, length)
+            yield self.session.rows(start, stop), stop / length
+
+
+def openSessionReader(path):
+    """
+    Reader for a CSV log, a segment log (its directory or the index.json inside it) or a columnar session (its
+    directory or the header.json inside it).
+    """
+    from sessionStore import HEADER_FILE
+    from segmentLog import SEGMENTS_SUFFIX, INDEX_FILE
+
+    if os.path.basename(path) in (HEADER_FILE, INDEX_FILE):
+        path = os.path.dirname(path)
+    if path.rstrip('/\\').endswith(SEGMENTS_SUFFIX):
+        return SegmentSessionReader(path)
+    if os.path.isdir(path):
+        return ColumnarSessionReader(path)
+    return CSVSessionReader(path)
@@ -0,0 +1,170 @@
+"""
+    Columnar binary session format, recorded next to the CSV log.
+
+    A session is a directory holding header.json (project, client, model parameters, column list, latency
+    histograms) and one little-endian float64 file per column (time.f64, t_sup.f64, ...). Columns are append-only
+    while recording and are opened with numpy.memmap for analysis and replay, so opening a session does not parse or
+    copy any data.
+    CSV is derived from a session with ExportJob (exportJob.py).
+"""
+
+import os
+import json
+import time
+import numpy as np
+from csvWriter import BatchWriterThread
+from sampleStore import STORE_COLUMNS
+
+SESSION_FORMAT_VERSION = 1
+SESSION_SUFFIX = '.session'
+HEADER_FILE = 'header.json'
+COLUMN_SUFFIX = '.f64'
+COLUMN_DTYPE = np.dtype('<f8')
+
+
+def sessionPathFor(csvPath):
+    """
+    Session directory recorded alongside a CSV log: bench1.csv -> bench1.session
+    """
+    return os.path.splitext(csvPath)[0] + SESSION_SUFFIX
+
+
+def writeHeader(directory, header):
+    # Written to a temporary file and renamed, so a reader never sees a partial header
+    temporaryPath = os.path.join(directory, HEADER_FILE + '.tmp')
+    with open(temporaryPath, 'w', encoding='utf-8') as file:
+        json.dump(header, file, indent=2)
+    os.replace(temporaryPath, os.path.join(directory, HEADER_FILE))
+
+
+def newHeader(metadata=(), columnTitles=None, model=None):
+    return {
+        'format': SESSION_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'columns': STORE_COLUMNS,
+        'columnTitles': list(columnTitles or STORE_COLUMNS),
+        'dtype': COLUMN_DTYPE.str,
+        'metadata': [[name, value] for name, value in metadata],
+        'model': model or {}
+    }
+
+
+class SessionWriterThread(BatchWriterThread):
+    def __init__(self, directory, metadata=(), columnTitles=None, **writerArgs):
+        """
+        Creates (or continues) a session directory and appends rows to its column files on a background thread.
+        :param directory: Session directory
+        :param metadata: (name, value) pairs, as written to the CSV preamble
+        :param columnTitles: Column titles used for the CSV export, one per STORE_COLUMNS key
+        :param writerArgs: Batching and fsync settings, see BatchWriterThread
+        """
+        super(SessionWriterThread, self).__init__("SessionWriter", **writerArgs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        headerPath = os.path.join(directory, HEADER_FILE)
+        if os.path.exists(headerPath):
+            with open(headerPath, encoding='utf-8') as file:
+                self.header = json.load(file)
+        else:
+            self.header = newHeader(columnTitles=columnTitles)
+        if metadata:
+            self.header['metadata'] = [[name, value] for name, value in metadata]
+        writeHeader(directory, self.header)
+
+        self.files = [open(os.path.join(directory, key + COLUMN_SUFFIX), 'ab') for key in STORE_COLUMNS]
+
+    def setModelParameters(self, parameters):
+        """
+        Records the building model parameters in the header; called whenever the model is (re)created.
+        """
+        self.header['model'] = parameters
+        writeHeader(self.directory, self.header)
+
+    def setLatencyHistograms(self, histograms):
+        """
+        Records the sample-to-command latency histograms of latencyTrace.py in the header; called when the log is flushed or closed.
+        """
+        self.header['latency'] = histograms
+        writeHeader(self.directory, self.header)
+
+    def writeRows(self, batch):
+        rows = np.asarray(batch, dtype=COLUMN_DTYPE)
+        for index, file in enumerate(self.files):
+            file.write(rows[:, index].tobytes())
+        for file in self.files:
+            file.flush()
+
+    def syncFile(self):
+        for file in self.files:
+            os.fsync(file.fileno())
+
+    def close(self, timeout=None):
+        super(SessionWriterThread, self).close(timeout)
+        for file in self.files:
+            file.close()
+
+
+class Session:
+    def __init__(self, directory):
+        """
+        Opens a recorded session read-only. Columns are numpy.memmap views of the column files;
+        a session that is still being recorded can be reopened to see the new rows.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, HEADER_FILE), encoding='utf-8') as file:
+            self.header = json.load(file)
+        dtype = np.dtype(self.header.get('dtype', COLUMN_DTYPE.str))
+
+        # Columns are written one after the other, so a recording may be a row ahead in some of them
+        sizes = {key: os.path.getsize(os.path.join(directory, key + COLUMN_SUFFIX)) // dtype.itemsize
+                 for key in self.header['columns']}
+        self.length = min(sizes.values(), default=0)
+        self.columns = {}
+        for key in self.header['columns']:
+            if self.length:
+                self.columns[key] = np.memmap(os.path.join(directory, key + COLUMN_SUFFIX), dtype=dtype,
+                                              mode='r', shape=(self.length,))
+            else:
+                self.columns[key] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def metadata(self):
+        return [tuple(item) for item in self.header.get('metadata', [])]
+
+    @property
+    def modelParameters(self):
+        return self.header.get('model', {})
+
+    @property
+    def latencyHistograms(self):
+        return self.header.get('latency', {})
+
+    @property
+    def columnTitles(self):
+        return self.header.get('columnTitles', self.header['columns'])
+
+    def column(self, key):
+        return self.columns[key]
+
+    def rows(self, start=0, stop=None):
+        """
+        Returns rows start..stop as a (rows, columns) array in STORE_COLUMNS order.
+        """
+        return np.column_stack([self.columns[key][start:stop] for key in self.header['columns']])
+
+
+def localOffsets(times):
+    """
+    UTC offsets [s] of the local time zone for epoch times; computed per row only when a chunk spans a DST change.
+    """
+    if not len(times):
+        return 0
+    first = time.localtime(float(times[0])).tm_gmtoff
+    if time.localtime(float(times[-1])).tm_gmtoff == first:
+        return first
+    return np.array([time.localtime(value).tm_gmtoff for value in times.tolist()], dtype=np.int64)
+
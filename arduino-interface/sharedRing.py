@@ -0,0 +1,290 @@
+"""
+    Shared-memory ring of sample records between the acquisition process and the GUI process.
+
+    The headless controller (controller-daemon.py --shared-ring NAME) runs acquisition, the model, the Arduino
+    commands and the CSV log in its own process and appends every logged sample to a multiprocessing.shared_memory
+    block: a small header followed by `capacity` fixed-width records of STORE_COLUMNS float64 values. The GUI
+    (arduino-gui.py --attach NAME) maps the same block and reads the new records as numpy views, without copying
+    or unpickling them. Matplotlib rendering then competes with acquisition for the CPU only, not for the GIL,
+    and a frozen or crashed GUI leaves control and logging running.
+
+    There is a single writer and no lock. The writer fills the next slot, then advances the `written` counter in
+    the header; a reader takes the slots between its own position and `written`. A reader that falls more than half
+    the ring behind skips to the newest half (counted as overrun), so the writer needs another capacity / 2 samples
+    before it could overwrite a view still being read. After each append the writer sends a one-byte UDP datagram to
+    the port the reader put in the header (non-blocking; lost or unread datagrams are harmless), which the GUI
+    watches with a QSocketNotifier instead of polling. The writer also stamps the time of its last append, so the GUI
+    can show when the acquisition process stopped delivering samples.
+
+    A restarted writer creates a new block under the same name, while a reader's mapping stays on the old one. Once
+    the heartbeat is stale, the reader therefore re-opens the name about once a second, and moves to the new block
+    when its start stamp differs from the one it is mapped to.
+"""
+
+import os
+import time
+import socket
+import numpy as np
+from multiprocessing import shared_memory
+from sampleStore import STORE_COLUMNS, storeRow
+
+RING_CAPACITY = 65536  # Records held; 6 MB, about 4 minutes at 250 Hz
+RING_MAGIC = 0x48505247  # 'HPRG'
+HEADER_BYTES = 64
+NOTIFY_HOST = '127.0.0.1'
+RING_STALE_SECONDS = 5.0  # Time without a new sample after which the acquisition process is reported as stalled
+RING_REATTACH_INTERVAL = 1.0  # Interval of a stalled reader's checks for a restarted writer [s]
+
+# Header slots (uint64, except the heartbeat which is a float64 in its slot)
+MAGIC, COLUMNS, CAPACITY, WRITTEN, NOTIFY_PORT, WRITER_PID, HEARTBEAT, STARTED = range(8)
+
+
+def mapRing(shm):
+    """
+    Returns (header, heartbeat, records) numpy views of a ring's shared memory block.
+    """
+    header = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=shm.buf)
+    heartbeat = np.ndarray((1,), np.float64, buffer=shm.buf, offset=HEARTBEAT * 8)
+    capacity, columns = int(header[CAPACITY]), int(header[COLUMNS])
+    records = np.ndarray((capacity, columns), np.float64, buffer=shm.buf, offset=HEADER_BYTES)
+    return header, heartbeat, records
+
+
+def attachSharedMemory(name):
+    """
+    Opens an existing block without registering it with this process's resource tracker, which would otherwise
+    unlink the writer's block when the reader exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedRingWriter:
+    def __init__(self, name, bus=None, capacity=RING_CAPACITY, queueDepth=1000):
+        """
+        Creates the ring; a stale block of the same name left by a crashed writer is replaced.
+        Raises OSError if the block cannot be created.
+        :param name: Name of the shared memory block, as passed to arduino-gui.py --attach
+        :param bus: EventBus whose samples are appended on a subscriber thread (eventBus.py); None to call append()
+        :param capacity: Records held
+        :param queueDepth: Bound of the bus subscription [samples]
+        """
+        size = HEADER_BYTES + capacity * len(STORE_COLUMNS) * 8
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = attachSharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        header = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=self.shm.buf)
+        header[:] = 0
+        header[COLUMNS] = len(STORE_COLUMNS)
+        header[CAPACITY] = capacity
+        header[WRITER_PID] = os.getpid()
+        header[STARTED] = time.time_ns()  # Tells a restarted writer's block from the one a reader is mapped to
+        header[MAGIC] = RING_MAGIC  # Last: a reader checks it before trusting the rest
+        del header
+        self.header, self.heartbeat, self.records = mapRing(self.shm)
+        self.capacity = capacity
+        self.written = 0  # Mirror of header[WRITTEN], owned by the writer
+        self.notifySocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.notifySocket.setblocking(False)
+        self.notifications = 0
+
+        self.bus = bus
+        self.feeder = None
+        if bus is not None:
+            from eventBus import SubscriberThread
+            self.subscription = bus.subscribe('sharedRing', ['sample'], queueDepth, 'drop-oldest')
+            self.feeder = SubscriberThread(self.subscription, self.publish, name='shared-ring')
+            self.feeder.start()
+
+    def publish(self, event):
+        """
+        Appends a SampleEvent of the engine's bus.
+        """
+        self.append(storeRow(event.timestamp, event.record))
+
+    def append(self, row):
+        """
+        Writes a row of STORE_COLUMNS floats to the next slot, publishes it and notifies the reader.
+        """
+        self.records[self.written % self.capacity] = row
+        self.written += 1
+        self.header[WRITTEN] = self.written
+        self.heartbeat[0] = time.time()
+        port = int(self.header[NOTIFY_PORT])
+        if port:
+            try:
+                self.notifySocket.sendto(b'\x01', (NOTIFY_HOST, port))
+                self.notifications += 1
+            except OSError:
+                pass  # Reader gone or its socket buffer full; it reads the ring on its next wake-up anyway
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'written': self.written,
+            'capacity': self.capacity,
+            'readerAttached': bool(self.header[NOTIFY_PORT]),
+            'notifications': self.notifications
+        }
+
+    def close(self):
+        """
+        Stops the feeder thread and removes the block; attached readers keep their mapping until they detach.
+        """
+        if self.feeder is not None:
+            self.feeder.stop(timeout=1.0)
+            self.bus.unsubscribe(self.subscription)
+        self.notifySocket.close()
+        del self.header, self.heartbeat, self.records
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedRingReader:
+    def __init__(self, name):
+        """
+        Attaches to a ring created by SharedRingWriter; the first read() returns the newest half of the ring.
+        Raises FileNotFoundError if there is no such ring and ValueError if the block is not a sample ring.
+        """
+        self.name = name
+        self.shm = self.openBlock()
+        self.recordsRead = 0
+        self.overruns = 0
+        self.restarts = 0
+        self.nextReattach = 0.0
+
+        # Wake-ups from the writer; the port is published in the header for it
+        self.notifySocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.notifySocket.bind((NOTIFY_HOST, 0))
+        self.notifySocket.setblocking(False)
+        self.mapBlock()
+
+    def openBlock(self):
+        """
+        Opens the block currently published under the ring's name. Raises FileNotFoundError or ValueError.
+        """
+        shm = attachSharedMemory(self.name)
+        header = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=shm.buf)
+        valid = int(header[MAGIC]) == RING_MAGIC and int(header[COLUMNS]) == len(STORE_COLUMNS)
+        del header
+        if not valid:
+            shm.close()
+            raise ValueError(f"{self.name} is not a sample ring of this controller version")
+        return shm
+
+    def mapBlock(self):
+        """
+        Maps self.shm, starts at the newest half of its records and asks its writer for wake-ups.
+        """
+        self.header, self.heartbeat, self.records = mapRing(self.shm)
+        self.capacity = len(self.records)
+        written = int(self.header[WRITTEN])
+        self.position = written - min(written, self.capacity // 2)  # Next record to read
+        self.writerPid = int(self.header[WRITER_PID])
+        self.started = int(self.header[STARTED])
+        self.header[NOTIFY_PORT] = self.notifySocket.getsockname()[1]
+
+    def reattach(self):
+        """
+        Moves to a block created under the ring's name by a restarted writer. Returns True if it did.
+        """
+        try:
+            shm = self.openBlock()
+        except (FileNotFoundError, ValueError):
+            return False  # Writer gone for good, or not started yet
+        header = np.ndarray((HEADER_BYTES // 8,), np.uint64, buffer=shm.buf)
+        restarted = int(header[STARTED]) != self.started
+        del header
+        if not restarted:
+            shm.close()
+            return False
+        self.releaseBlock()
+        self.shm = shm
+        self.mapBlock()
+        self.restarts += 1
+        return True
+
+    def releaseBlock(self):
+        del self.header, self.heartbeat, self.records
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Views handed out by read() are still referenced; the mapping goes with them
+
+    def fileno(self):
+        """
+        Socket that becomes readable when the writer has appended records, e.g. for a QSocketNotifier.
+        """
+        return self.notifySocket.fileno()
+
+    def clearNotifications(self):
+        try:
+            while self.notifySocket.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def read(self):
+        """
+        Returns the records appended since the last call as a list of up to two (rows, STORE_COLUMNS) views into
+        the shared memory, oldest first. Copy what must outlive the next capacity / 2 samples.
+        While the writer is stalled, also checks for a restarted writer and moves to its ring.
+        """
+        self.clearNotifications()
+        if self.heartbeatAge() > RING_STALE_SECONDS and time.monotonic() >= self.nextReattach:
+            self.nextReattach = time.monotonic() + RING_REATTACH_INTERVAL
+            self.reattach()
+        written = int(self.header[WRITTEN])
+        start = max(self.position, written - self.capacity // 2)
+        self.overruns += start - self.position
+        self.position = written
+        if start == written:
+            return []
+        self.recordsRead += written - start
+        first, last = start % self.capacity, written % self.capacity
+        if first < last:
+            return [self.records[first:last]]
+        return [self.records[first:]] + ([self.records[:last]] if last else [])
+
+    def heartbeatAge(self):
+        """
+        Seconds since the writer last appended a record (inf before the first one).
+        """
+        beat = float(self.heartbeat[0])
+        return time.time() - beat if beat else float('inf')
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'writerPid': self.writerPid,
+            'written': int(self.header[WRITTEN]),
+            'read': self.recordsRead,
+            'overruns': self.overruns,
+            'restarts': self.restarts,
+            'heartbeatAge': self.heartbeatAge()
+        }
+
+    def close(self):
+        if self.header[NOTIFY_PORT] == self.notifySocket.getsockname()[1]:
+            self.header[NOTIFY_PORT] = 0
+        self.notifySocket.close()
+        self.releaseBlock()
+
+
+def formatRingStats(stats):
+    age = stats['heartbeatAge']
+    state = "stalled" if age > RING_STALE_SECONDS else "running"
+    lastSample = f"last sample {age:.1f} s ago" if age != float('inf') else "no samples yet"
+    return (f"{stats['name']} (pid {stats['writerPid']}) {state}, {stats['read']} samples read, {lastSample}, "
+            f"{stats['overruns']} skipped" + (f", {stats['restarts']} restarts" if stats['restarts'] else ""))
@@ -0,0 +1,185 @@
+"""
+    Optional SQLite time-series store for browsing and querying samples across runs.
+
+    Samples of every logged session are inserted in batches by a background thread into one database in WAL mode,
+    so readers (the history browser, analysis scripts) never block the writer. Samples are indexed by session and
+    time, e.g. "all samples between 02:00 and 04:00 where the supply temperature is above 50 °C":
+
+        SampleDatabase('samples.sqlite3').query(timeOfDay=('02:00', '04:00'), conditions=[('t_sup', '>', 50)])
+"""
+
+import json
+import time
+import sqlite3
+import numpy as np
+from csvWriter import BatchWriterThread
+from sampleStore import STORE_COLUMNS
+
+QUERY_OPERATORS = ('<', '<=', '>', '>=', '=', '!=')
+
+# The 'interval' fsync policy maps to synchronous=NORMAL: WAL commits are durable once checkpointed
+SYNCHRONOUS_MODES = {'never': 'OFF', 'batch': 'FULL', 'interval': 'NORMAL'}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        started REAL NOT NULL,
+        metadata TEXT NOT NULL DEFAULT '[]',
+        model TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE TABLE IF NOT EXISTS samples (
+        session_id INTEGER NOT NULL REFERENCES sessions(id),
+        %s
+    );
+    CREATE INDEX IF NOT EXISTS samples_session_time ON samples(session_id, time);
+    CREATE INDEX IF NOT EXISTS samples_time ON samples(time);
+""" % ",\n        ".join(f"{key} REAL" for key in STORE_COLUMNS)
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SQLiteWriterThread(BatchWriterThread):
+    def __init__(self, path, name, metadata=(), **writerArgs):
+        """
+        Registers a new session in the database and inserts its samples on a background thread.
+        :param path: Database file; created if missing
+        :param name: Session name, e.g. the CSV file name
+        :param metadata: (name, value) pairs, as written to the CSV preamble
+        :param writerArgs: Batching and fsync settings, see BatchWriterThread
+        """
+        super(SQLiteWriterThread, self).__init__("SQLiteWriter", **writerArgs)
+        self.path = path
+        self.connection = None  # Opened on the writer thread; sqlite3 connections belong to their thread
+
+        with connect(path) as connection:
+            cursor = connection.execute("INSERT INTO sessions (name, started, metadata) VALUES (?, ?, ?)",
+                                        (name, time.time(), json.dumps([list(item) for item in metadata])))
+            self.sessionId = cursor.lastrowid
+        connection.close()
+
+        self.insert = "INSERT INTO samples (session_id, %s) VALUES (%d, %s)" % (
+            ", ".join(STORE_COLUMNS), self.sessionId, ", ".join("?" * len(STORE_COLUMNS)))
+
+    def setModelParameters(self, parameters):
+        # Rare and small; done on the calling thread with its own connection
+        connection = connect(self.path)
+        with connection:
+            connection.execute("UPDATE sessions SET model = ? WHERE id = ?", (json.dumps(parameters), self.sessionId))
+        connection.close()
+
+    def run(self):
+        self.connection = connect(self.path)
+        self.connection.execute(f"PRAGMA synchronous={SYNCHRONOUS_MODES[self.fsyncPolicy]}")
+        try:
+            super(SQLiteWriterThread, self).run()
+        finally:
+            self.connection.close()
+
+    def writeRows(self, batch):
+        # NaN is stored as NULL, so SQL comparisons skip missing values
+        with self.connection:
+            self.connection.executemany(self.insert, ([None if value != value else value for value in row]
+                                                      for row in batch))
+
+    def syncFile(self):
+        pass  # Durability of each commit is set by PRAGMA synchronous
+
+
+class SampleDatabase:
+    def __init__(self, path):
+        """
+        Read access to a sample database written by SQLiteWriterThread.
+        """
+        self.path = path
+        self.connection = connect(path)
+
+    def close(self):
+        self.connection.close()
+
+    def sessions(self):
+        """
+        Returns the recorded sessions, newest first, as dicts with id, name, started, metadata, model and samples.
+        """
+        rows = self.connection.execute(
+            "SELECT id, name, started, metadata, model, "
+            "(SELECT COUNT(*) FROM samples WHERE session_id = sessions.id) "
+            "FROM sessions ORDER BY started DESC").fetchall()
+        return [{'id': sessionId, 'name': name, 'started': started, 'metadata': json.loads(metadata),
+                 'model': json.loads(model), 'samples': samples}
+                for sessionId, name, started, metadata, model, samples in rows]
+
+    def query(self, sessionIds=None, start=None, end=None, timeOfDay=None, conditions=(), limit=None):
+        """
+        Returns the matching samples as a (rows, STORE_COLUMNS) float array in time order; NULL values are NaN.
+        :param sessionIds: Only these sessions (all if None)
+        :param start: Earliest sample time [s since the epoch]
+        :param end: Latest sample time [s since the epoch]
+        :param timeOfDay: ('HH:MM[:SS]', 'HH:MM[:SS]') local time-of-day range; wraps past midnight if start > end
+        :param conditions: (column, operator, value) filters, e.g. ('t_sup', '>', 50)
+        :param limit: Return only the most recent rows
+        """
+        clauses, parameters = [], []
+        if sessionIds is not None:
+            sessionIds = list(sessionIds)
+            clauses.append(f"session_id IN ({', '.join('?' * len(sessionIds))})")
+            parameters.extend(sessionIds)
+        if start is not None:
+            clauses.append("time >= ?")
+            parameters.append(start)
+        if end is not None:
+            clauses.append("time <= ?")
+            parameters.append(end)
+        if timeOfDay is not None:
+            fromTime, toTime = (normalizeTimeOfDay(value) for value in timeOfDay)
+            localTime = "time(time, 'unixepoch', 'localtime')"
+            joiner = "AND" if fromTime <= toTime else "OR"
+            clauses.append(f"({localTime} >= ? {joiner} {localTime} <= ?)")
+            parameters.extend([fromTime, toTime])
+        for column, operator, value in conditions:
+            if column not in STORE_COLUMNS or operator not in QUERY_OPERATORS:
+                raise ValueError(f"Invalid condition: {column} {operator} {value}")
+            clauses.append(f"{column} {operator} ?")
+            parameters.append(float(value))
+
+        sql = f"SELECT {', '.join(STORE_COLUMNS)} FROM samples"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if limit is not None:
+            # The most recent rows, returned in time order
+            sql = f"SELECT * FROM ({sql} ORDER BY time DESC LIMIT {int(limit)}) ORDER BY time"
+        else:
+            sql += " ORDER BY time"
+
+        rows = self.connection.execute(sql, parameters).fetchall()
+        return np.array(rows, dtype=float).reshape(len(rows), len(STORE_COLUMNS))
+
+
+def normalizeTimeOfDay(text):
+    """
+    'H:MM' or 'HH:MM:SS' -> 'HH:MM:SS', as compared by SQLite's time() function.
+    """
+    parts = [int(part) for part in text.strip().split(':')]
+    if not 2 <= len(parts) <= 3 or not (0 <= parts[0] < 24 and all(0 <= part < 60 for part in parts[1:])):
+        raise ValueError(f"Invalid time of day: {text}")
+    parts += [0] * (3 - len(parts))
+    return "%02d:%02d:%02d" % tuple(parts)
+
+
+def parseCondition(text):
+    """
+    Parses a filter such as 't_sup > 50' into (column, operator, value).
+    """
+    for operator in sorted(QUERY_OPERATORS, key=len, reverse=True):
+        if operator in text:
+            column, value = text.split(operator, 1)
+            column = column.strip()
+            if column not in STORE_COLUMNS:
+                raise ValueError(f"Unknown column '{column}', expected one of: {', '.join(STORE_COLUMNS)}")
+            return column, operator, float(value)
+    raise ValueError(f"Invalid condition: {text}")
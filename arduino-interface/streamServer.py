@@ -0,0 +1,253 @@
+"""
+    Live sample stream for remote viewers: Server-Sent Events (text/event-stream over plain HTTP) at /stream,
+    plus a minimal viewer page at /. Any browser, curl or an EventSource client can follow a running test
+    without screen-sharing the Qt window.
+
+    The server subscribes to the samples on the engine's event bus (eventBus.py), so the acquisition thread only
+    appends each sample to its queue, whatever the number of viewers. A single server thread wakes every
+    STREAM_FLUSH_INTERVAL, takes the queued batch at once (a queue swap, so the publisher never waits for a long
+    drain), encodes each new sample once as a JSON event and fans the batch out to all viewers with non-blocking
+    sends; SSE formatting and decimation never run on the acquisition thread. Every subscriber has a
+    bounded output buffer: a client that falls behind is decimated (it receives every 2nd, 4th, ... sample; the
+    event ids show the gaps) rather than buffered for, and one that stops reading for CLIENT_STALL_TIMEOUT is
+    disconnected.
+"""
+
+import json
+import math
+import socket
+import selectors
+import threading
+import time
+from sampleStore import STORE_COLUMNS
+
+STREAM_HOST = '127.0.0.1'  # Use '0.0.0.0' to let other machines watch
+STREAM_PATH = '/stream'
+STREAM_FLUSH_INTERVAL = 0.05  # Batching interval of the server thread [s]; the delay added for viewers
+STREAM_BACKLOG = 10000  # Samples queued for the server thread if it stalls; older ones are dropped
+CLIENT_BUFFER_BYTES = 65536  # Output buffer per subscriber before it is decimated
+SOCKET_SEND_BUFFER = 16384  # Kernel send buffer per subscriber; kept small so a slow viewer sees recent samples
+MAX_DECIMATION = 64  # Largest stride of a slow subscriber
+CLIENT_STALL_TIMEOUT = 30.0  # A subscriber that accepts no data for this long is disconnected [s]
+MAX_REQUEST_BYTES = 8192
+
+STREAM_HEADERS = (b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                  b"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\nretry: 2000\n\n")
+VIEWER_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Heat pump controller</title></head>
+<body style="font-family: sans-serif"><h3>Heat pump controller: live samples</h3><table id="values"></table>
+<script>
+const table = document.getElementById('values');
+new EventSource('/stream').onmessage = event => {
+    const sample = JSON.parse(event.data);
+    sample.time = new Date(sample.time * 1000).toLocaleTimeString();
+    table.innerHTML = Object.entries(sample).map(([key, value]) =>
+        `<tr><td>${key}</td><td>${typeof value === 'number' ? value.toFixed(3) : value}</td></tr>`).join('');
+};
+</script></body></html>
+"""
+
+
+def httpResponse(status, contentType, body):
+    return (f"HTTP/1.1 {status}\r\nContent-Type: {contentType}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n").encode() + body
+
+
+def encodeEvent(eventId, timestamp, record):
+    """
+    One SSE event for a sample record as logged by ControllerEngine (STORE_COLUMNS keys, null for missing values).
+    """
+    values = [None if value is None or not math.isfinite(value) else value for value in record[1:]]
+    sample = dict(zip(STORE_COLUMNS, [timestamp] + values))
+    return f"id: {eventId}\ndata: {json.dumps(sample, separators=(',', ':'))}\n\n".encode()
+
+
+class StreamClient:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.request = b""
+        self.subscribed = False
+        self.closing = False  # Close once the buffer is sent
+        self.buffer = bytearray()
+        self.stride = 1  # Only every stride-th event is sent while the client is behind
+        self.skipped = 0
+        self.lastProgress = time.monotonic()
+
+
+class StreamServer(threading.Thread):
+    def __init__(self, bus, port, host=STREAM_HOST, flushInterval=STREAM_FLUSH_INTERVAL,
+                 clientBuffer=CLIENT_BUFFER_BYTES):
+        """
+        Serves the sample stream on a background thread. Raises OSError if the port cannot be bound.
+        :param bus: EventBus the samples are published on, e.g. ControllerEngine.bus
+        :param port: TCP port; 0 picks a free one (see self.port)
+        :param host: Interface to listen on
+        :param flushInterval: Batching interval [s]
+        :param clientBuffer: Output buffer per subscriber before it is decimated [bytes]
+        """
+        super(StreamServer, self).__init__(name='stream-server', daemon=True)
+        self.flushInterval = flushInterval
+        self.clientBuffer = clientBuffer
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.clients = {}  # Socket -> StreamClient
+        self.stopping = threading.Event()
+        self.bus = bus
+        self.samples = bus.subscribe('stream', ['sample'], STREAM_BACKLOG, 'drop-oldest')
+
+        self.eventId = 0  # Written by the server thread only, like the statistics below
+        self.bytesSent = 0
+        self.skipped = 0
+        self.subscriptions = 0
+        self.stalledClients = 0
+
+    def run(self):
+        while not self.stopping.is_set():
+            for key, mask in self.selector.select(self.flushInterval):
+                if key.fileobj is self.listener:
+                    self.accept()
+                else:
+                    self.receive(key.data)
+            self.broadcast()
+            self.send()
+        for client in list(self.clients.values()):
+            self.disconnect(client)
+        self.selector.close()
+        self.listener.close()
+
+    def stop(self, timeout=None):
+        self.bus.unsubscribe(self.samples)
+        self.stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+        else:
+            self.listener.close()
+
+    def accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+        client = StreamClient(sock, address)
+        self.clients[sock] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def receive(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(client)  # The viewer went away
+            return
+        if client.subscribed or client.closing:
+            return
+        client.request += data
+        if b"\r\n\r\n" not in client.request:
+            if len(client.request) > MAX_REQUEST_BYTES:
+                self.disconnect(client)
+            return
+        path = client.request.split(b" ", 2)[1].decode('latin-1') if client.request.count(b" ") >= 2 else ""
+        path = path.split('?')[0]
+        if path == STREAM_PATH:
+            client.subscribed = True
+            client.buffer += STREAM_HEADERS
+            self.subscriptions += 1
+        else:
+            if path == '/':
+                client.buffer += httpResponse("200 OK", "text/html; charset=utf-8", VIEWER_PAGE.encode())
+            else:
+                client.buffer += httpResponse("404 Not Found", "text/plain", b"Not found\n")
+            client.closing = True
+        client.lastProgress = time.monotonic()
+
+    def broadcast(self):
+        """
+        Encodes the samples published since the last call once and appends them to every subscriber's buffer.
+        """
+        samples = self.samples.drain()
+        if not samples:
+            return
+        events = []
+        for sample in samples:
+            self.eventId += 1
+            events.append((self.eventId, encodeEvent(self.eventId, sample.timestamp, sample.record)))
+        everything = b"".join(event for eventId, event in events)
+        for client in self.clients.values():
+            if not client.subscribed:
+                continue
+            if client.stride == 1 and len(client.buffer) + len(everything) <= self.clientBuffer:
+                client.buffer += everything
+                continue
+            skipped = client.skipped
+            for eventId, event in events:
+                if eventId % client.stride:
+                    client.skipped += 1
+                elif len(client.buffer) + len(event) > self.clientBuffer:
+                    client.stride = min(client.stride * 2, MAX_DECIMATION)  # Behind: send fewer samples
+                    client.skipped += 1
+                else:
+                    client.buffer += event
+            self.skipped += client.skipped - skipped
+
+    def send(self):
+        now = time.monotonic()
+        for client in list(self.clients.values()):
+            if client.buffer:
+                try:
+                    sent = client.sock.send(client.buffer)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError:
+                    self.disconnect(client)
+                    continue
+                if sent:
+                    del client.buffer[:sent]
+                    self.bytesSent += sent
+                    client.lastProgress = now
+                elif now - client.lastProgress > CLIENT_STALL_TIMEOUT:
+                    self.stalledClients += 1
+                    self.disconnect(client)
+                    continue
+            if not client.buffer:
+                client.lastProgress = now
+                if client.closing:
+                    self.disconnect(client)
+                    continue
+            if client.stride > 1 and len(client.buffer) < self.clientBuffer // 4:
+                client.stride //= 2  # Caught up: send more samples again
+
+    def disconnect(self, client):
+        self.clients.pop(client.sock, None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def stats(self):
+        clients = list(self.clients.values())
+        return {
+            'subscribers': sum(1 for client in clients if client.subscribed),
+            'decimated': sum(1 for client in clients if client.stride > 1),
+            'published': self.samples.delivered,
+            'events': self.eventId,
+            'bytesSent': self.bytesSent,
+            'skipped': self.skipped,
+            'subscriptions': self.subscriptions,
+            'stalledClients': self.stalledClients
+        }
+
+
+def formatStreamStats(stats):
+    return (f"{stats['subscribers']} viewers ({stats['decimated']} decimated), {stats['events']} samples streamed, "
+            f"{stats['bytesSent'] / 2 ** 20:.1f} MB sent, {stats['skipped']} skipped for slow viewers, "
+            f"{stats['subscriptions']} subscriptions, {stats['stalledClients']} stalled viewers dropped")
@@ -0,0 +1,99 @@
+"""
+    Bounded, batched log output for the terminal widget.
+    Messages are queued as they are logged and written into the QPlainTextEdit once per frame.
+"""
+
+import html
+from collections import deque
+from PyQt5.QtGui import QTextCursor
+
+MAX_BLOCKS = 2000  # Lines kept in the terminal widget (and in the pending queue)
+
+MESSAGE_STYLES = {
+    "info": "color: #FFFFFF;",
+    "warning": "color: #E5C07B;",
+    "error": "color: #E06C75;",
+    "update": "color: #61AFEF;",
+    "init": "color: #98C379;"
+}
+DEFAULT_STYLE = "color: #ABB2BF;"
+PLAIN_TYPES = {"info"}  # Message types written through the plain-text fast path
+
+
+class TerminalLog:
+    def __init__(self, terminal, maxBlocks=MAX_BLOCKS):
+        """
+        :param terminal: QPlainTextEdit the messages are written to
+        :param maxBlocks: Maximum number of lines kept in the widget; older lines are discarded
+        """
+        self.terminal = terminal
+        self.terminal.setMaximumBlockCount(maxBlocks)
+        self.pending = deque(maxlen=maxBlocks)  # Entries are [message, messageType, repeatCount]
+        self.lastWritten = None  # Entry shown on the last line of the widget
+        self.lastWrittenChanged = False
+        self.droppedCount = 0
+
+    def log(self, message, messageType="info"):
+        """
+        Queues a message. A message identical to the previous one only increments its repeat count.
+        """
+        last = self.pending[-1] if self.pending else self.lastWritten
+        if last is not None and last[0] == message and last[1] == messageType:
+            last[2] += 1
+            if last is self.lastWritten:
+                self.lastWrittenChanged = True
+            return
+
+        if len(self.pending) == self.pending.maxlen:
+            self.droppedCount += 1
+        self.pending.append([message, messageType, 1])
+
+    def flush(self):
+        """
+        Writes all queued messages into the widget, grouping consecutive runs into a single append.
+        """
+        if self.lastWrittenChanged:
+            self.removeLastLine()
+            self.writeRun([self.lastWritten], self.lastWritten[1] in PLAIN_TYPES)
+            self.lastWrittenChanged = False
+
+        if self.droppedCount:
+            dropped = [f"> {self.droppedCount} log messages dropped.", "warning", 1]
+            self.writeRun([dropped], False)
+            self.lastWritten = dropped  # The last line now; a repeat of an earlier message must not replace it
+            self.droppedCount = 0
+
+        run, runIsPlain = [], True
+        while self.pending:
+            entry = self.pending.popleft()
+            isPlain = entry[1] in PLAIN_TYPES
+            if run and isPlain != runIsPlain:
+                self.writeRun(run, runIsPlain)
+                run = []
+            run.append(entry)
+            runIsPlain = isPlain
+            self.lastWritten = entry
+        if run:
+            self.writeRun(run, runIsPlain)
+
+    def writeRun(self, run, isPlain):
+        if isPlain:
+            self.terminal.appendPlainText("\n".join(self.formatText(entry) for entry in run))
+        else:
+            self.terminal.appendHtml("".join(
+                f"<p style='{MESSAGE_STYLES.get(entry[1], DEFAULT_STYLE)}'>{html.escape(self.formatText(entry))}</p>"
+                for entry in run
+            ))
+
+    def formatText(self, entry):
+        message, _, count = entry
+        return f"{message} ×{count}" if count > 1 else message
+
+    def removeLastLine(self):
+        if self.terminal.blockCount() == 1:
+            self.terminal.clear()
+            return
+        cursor = self.terminal.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.select(QTextCursor.BlockUnderCursor)  # Includes the preceding line break
+        cursor.removeSelectedText()
@@ -0,0 +1,386 @@
+"""
+    Python emulator of read-temp.ino, so the controller can be run and benchmarked without a board.
+    It speaks the same serial protocol as the firmware and simulates simple supply/return temperature dynamics.
+"""
+
+import os
+import re
+import tty
+import time
+import random
+import threading
+
+MAX_SAMPLE_RATE = 100  # maxSampleRate in read-temp.ino [Hz]
+MAX_BATCH_SAMPLE_RATE = 250  # maxBatchSampleRate in read-temp.ino [Hz]
+MAX_BATCH_SAMPLES = 25  # maxBatchSamples in read-temp.ino
+MAX_AVG_SAMPLES = 100  # maxAvgSamples in read-temp.ino
+MAX_COMMAND_LENGTH = 48  # maxCommandLength in read-temp.ino
+ADC_VOLTS = 5.0 / 1023.0  # Volts per ADC count
+SUPPLY_SLOPE = 1.01552 * ADC_VOLTS * 70.0 / 5.0  # °C per count of the supply temperature conversion
+RETURN_SLOPE = 1.01652 * ADC_VOLTS * 70.0 / 5.0
+FLOW_SLOPE = ADC_VOLTS / 5.0  # l/s per count of calculateFlowRate()
+
+
+def countsToTemperature(sensorValue):
+    return SUPPLY_SLOPE * sensorValue + 0.20325
+
+
+def countsToReturnTemperature(sensorValue):
+    return RETURN_SLOPE * sensorValue + 0.32448
+
+
+def countsToFlowRate(sensorValue):
+    return FLOW_SLOPE * sensorValue
+
+
+def deviceTimeText(milliseconds):
+    # printDeviceTime(): seconds with three decimals
+    return f"{milliseconds // 1000}.{milliseconds % 1000:03d}"
+
+
+def analogCounts(value, offset, slope):
+    """
+    ADC reading (0..1023) of a sensor whose conversion is value = slope * counts + offset.
+    """
+    return min(max(int(round((value - offset) / slope)), 0), 1023)
+
+
+class ArduinoEmulator:
+    def __init__(self, write, sampleInterval=1.0, avgSamples=4, seed=None, rtcTime=None, clockDrift=0.0):
+        """
+        :param write: Callable(bytes) sending data to the host
+        :param sampleInterval: Time between two telemetry lines [s] (the firmware starts at once per second)
+        :param avgSamples: Number of samples in the running average (1..MAX_AVG_SAMPLES)
+        :param seed: Random seed for reproducible sensor noise
+        :param rtcTime: RTC time [s since the epoch] at time 0 of the clock passed to step(); by default the RTC
+                        matches the host's wall clock for time.monotonic()
+        :param clockDrift: Rate error of the RTC against the host clock [ppm]
+        """
+        self.write = write
+        self.rtcTime = time.time() - time.monotonic() if rtcTime is None else rtcTime
+        self.clockDrift = clockDrift
+        self.sampleIntervalMicros = int(round(sampleInterval * 1e6))
+        self.random = random.Random(seed)
+
+        self.targetTemperature = 25.0  # Default target temperature in Celsius
+        self.desiredVoltage = 0.0  # Desired voltage to be set on the DAC
+        self.dacVoltage = 0.0
+        self.correctionFactor = 0.891
+
+        # Simulated plant: supply temperature follows the DAC output with a first order lag (time constant ~20 s)
+        self.supplyTemperature = 30.0
+        self.commandBuffer = bytearray()  # Command line received so far
+        self.commandOverflow = False
+
+        # Raw ADC readings with integer running sums, as in the firmware
+        if not 1 <= avgSamples <= MAX_AVG_SAMPLES:
+            raise ValueError(f"avgSamples must be 1..{MAX_AVG_SAMPLES}")
+        self.avgSamples = avgSamples
+        self.tempSamples = [0] * MAX_AVG_SAMPLES
+        self.returnTempSamples = [0] * MAX_AVG_SAMPLES
+        self.flowRateSamples = [0] * MAX_AVG_SAMPLES
+        self.fillSamples(self.readTemperature(), self.readReturnTemperature(), self.readFlowRate())
+        self.lastSampleTime = None
+        self.sampleSequence = 0  # Number of the last sample taken, sent as 'Seq'
+        self.sampleTime = 0  # Device time of the last sample [ms since the epoch], sent as 'Time'
+
+        # Batch mode (setBatch K, K > 1): K samples per 'BATCH <first seq> dt,STemp,DACVolt,FlowRate,RTemp;...' line
+        self.batchSamples = 1
+        self.batch = []  # (offset [ms], temperature, DAC voltage, flow rate, return temperature)
+        self.batchStartTime = 0
+        self.batchSequence = 0
+        self.batchTime = 0
+
+    @property
+    def sampleInterval(self):
+        """
+        Time between two samples [s].
+        """
+        return self.sampleIntervalMicros / 1e6
+
+    def readTemperature(self):
+        target = 30.0 + 5.0 * self.dacVoltage
+        self.supplyTemperature += (target - self.supplyTemperature) * (1.0 - 0.95 ** self.sampleInterval)
+        return analogCounts(self.supplyTemperature + self.random.gauss(0, 0.05), 0.20325, SUPPLY_SLOPE)
+
+    def readReturnTemperature(self):
+        return analogCounts(self.supplyTemperature - 5.0 + self.random.gauss(0, 0.05), 0.32448, RETURN_SLOPE)
+
+    def readFlowRate(self):
+        return analogCounts(0.2 + self.random.gauss(0, 0.002), 0.0, FLOW_SLOPE)
+
+    def takeSample(self):
+        """
+        Replaces the oldest sample of the window and updates the running sums in O(1).
+        """
+        temp, returnTemp, flow = self.readTemperature(), self.readReturnTemperature(), self.readFlowRate()
+        index = self.sampleIndex
+        self.tempSum += temp - self.tempSamples[index]
+        self.returnTempSum += returnTemp - self.returnTempSamples[index]
+        self.flowRateSum += flow - self.flowRateSamples[index]
+        self.tempSamples[index] = temp
+        self.returnTempSamples[index] = returnTemp
+        self.flowRateSamples[index] = flow
+        self.sampleIndex = (index + 1) % self.avgSamples
+
+    def fillSamples(self, temp, returnTemp, flow):
+        """
+        Fills the averaging window with one reading per sensor and resets the running sums.
+        """
+        for index in range(self.avgSamples):
+            self.tempSamples[index] = temp
+            self.returnTempSamples[index] = returnTemp
+            self.flowRateSamples[index] = flow
+        self.tempSum = temp * self.avgSamples
+        self.returnTempSum = returnTemp * self.avgSamples
+        self.flowRateSum = flow * self.avgSamples
+        self.sampleIndex = 0
+
+    def roundedAverage(self, total):
+        # (sum + avgSamples / 2) / avgSamples in the firmware's integer arithmetic
+        return (total + self.avgSamples // 2) // self.avgSamples
+
+    def setDACVoltage(self, voltage):
+        # Apply the correction factor and the DAC's 0-10V range
+        self.dacVoltage = min(max(voltage * self.correctionFactor, 0.0), 10.0)
+
+    def sendSerialData(self, temperature, dacVoltage, flowRate, returnTemperature):
+        self.println(
+            f"STemp:{temperature:.2f}, DACVolt:{dacVoltage:.2f}, FlowRate:{flowRate:.3f}, "
+            f"RTemp:{returnTemperature:.2f}, Seq:{self.sampleSequence}, Time:{deviceTimeText(self.sampleTime)}"
+        )
+
+    def addToBatch(self, temperature, dacVoltage, flowRate, returnTemperature):
+        """
+        Adds a sample to the batch; the batch is sent once it holds batchSamples samples.
+        """
+        if not self.batch:
+            self.batchStartTime = self.lastSampleTime
+            self.batchSequence = self.sampleSequence
+            self.batchTime = self.sampleTime
+        offset = (self.lastSampleTime - self.batchStartTime + 500) // 1000  # Rounded to the millisecond
+        self.batch.append((offset, temperature, dacVoltage, flowRate, returnTemperature))
+        if len(self.batch) >= self.batchSamples:
+            self.sendBatch()
+
+    def sendBatch(self):
+        samples = ";".join(f"{offset},{temperature:.2f},{dacVoltage:.2f},{flowRate:.3f},{returnTemperature:.2f}"
+                           for offset, temperature, dacVoltage, flowRate, returnTemperature in self.batch)
+        self.println(f"BATCH {self.batchSequence} {deviceTimeText(self.batchTime)} dt,STemp,DACVolt,FlowRate,RTemp;"
+                     f"{samples}")
+        self.batch.clear()
+
+    def println(self, text):
+        self.write((text + "\r\n").encode('utf-8'))  # Serial.println terminates lines with CR LF
+
+    def handleCommandLine(self, line, overflow=False):
+        """
+        Handles '<command>' or '#<seq> <command>'; a sequenced command is answered with 'ACK <seq>' once applied
+        or 'NAK <seq> <reason>' instead of the text confirmation.
+        """
+        sequence = None
+        command = line
+        if line.startswith('#'):
+            match = re.match(r'\s*[+-]?\d+', line[1:])  # strtol(): 0 and no characters used if there is no number
+            sequence = int(match.group()) if match else 0
+            command = line[1 + (match.end() if match else 0):].lstrip(' ')
+
+        error = "Command too long" if overflow else self.processSerialCommand(command, quiet=sequence is not None)
+        if sequence is None:
+            if error:
+                self.println(error)
+        elif error:
+            self.println(f"NAK {sequence} {error}")
+        else:
+            self.println(f"ACK {sequence}")
+
+    def processSerialCommand(self, command, quiet=False):
+        """
+        Applies a command; returns None, or the reason it was rejected. The text confirmation is left out if quiet.
+        """
+        if command.startswith("setTemp "):
+            self.targetTemperature = self.toFloat(command[8:])
+            if not quiet:
+                self.println(f"New target temperature: {self.targetTemperature:.2f}")
+        elif command.startswith("setVoltage "):
+            self.desiredVoltage = self.toFloat(command[11:])
+            if not quiet:
+                self.println(f"New DAC voltage: {self.desiredVoltage:.2f}")
+            self.setDACVoltage(self.desiredVoltage)  # Update the DAC voltage immediately
+        elif command.startswith("setRate "):
+            rate = self.toInt(command[8:])
+            if not 1 <= rate <= (MAX_BATCH_SAMPLE_RATE if self.batchSamples > 1 else MAX_SAMPLE_RATE):
+                return "Invalid sample rate"
+            self.sampleIntervalMicros = 1000000 // rate
+            if not quiet:
+                self.println(f"New sample rate: {rate} Hz")
+        elif command.startswith("setAvgWindow "):
+            window = self.toInt(command[13:])
+            if not 1 <= window <= MAX_AVG_SAMPLES:
+                return "Invalid averaging window"
+            # Restart the window from the current averages, so the output does not jump
+            averages = [self.roundedAverage(total) for total in (self.tempSum, self.returnTempSum, self.flowRateSum)]
+            self.avgSamples = window
+            self.fillSamples(*averages)
+            if not quiet:
+                self.println(f"New averaging window: {self.avgSamples} samples")
+        elif command.startswith("setBatch "):
+            samples = self.toInt(command[9:])
+            if not 1 <= samples <= MAX_BATCH_SAMPLES:
+                return "Invalid batch size"
+            if samples == 1 and self.sampleIntervalMicros < 1000000 // MAX_SAMPLE_RATE:
+                return "Sample rate too high for line mode"
+            if self.batch:
+                self.sendBatch()  # Send the samples collected so far before the size changes
+            self.batchSamples = samples
+            if not quiet:
+                self.println(f"New batch size: {self.batchSamples} samples")
+        else:
+            return "Unknown command"
+        return None
+
+    def toFloat(self, text):
+        # atof(): leading number of the text, 0 if there is none
+        match = re.match(r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?', text)
+        return float(match.group()) if match else 0.0
+
+    def toInt(self, text):
+        # atoi(): leading integer of the text, 0 if there is none
+        match = re.match(r'\s*[+-]?\d+', text)
+        return int(match.group()) if match else 0
+
+    def feed(self, data):
+        """
+        Processes bytes received from the host one character at a time, like readSerialCommands():
+        complete lines are handled as commands, and lines longer than MAX_COMMAND_LENGTH are rejected.
+        """
+        for byte in data:
+            if byte == 0x0A:  # '\n'
+                self.handleCommandLine(self.commandBuffer.decode('utf-8', 'replace'), self.commandOverflow)
+                self.commandBuffer.clear()
+                self.commandOverflow = False
+            elif byte != 0x0D:  # '\r' is ignored
+                if len(self.commandBuffer) < MAX_COMMAND_LENGTH:
+                    self.commandBuffer.append(byte)
+                else:
+                    self.commandOverflow = True  # Keep discarding until the end of the line
+
+    @property
+    def nextSampleTime(self):
+        """
+        Time the next sample is due [s], on the clock passed to step(); None before the first sample.
+        """
+        if self.lastSampleTime is None:
+            return None
+        return (self.lastSampleTime + self.sampleIntervalMicros) / 1e6
+
+    def step(self, now=None):
+        """
+        Equivalent of one pass of loop(): takes and sends a sample if the sample interval has elapsed.
+        """
+        nowMicros = int(round((time.monotonic() if now is None else now) * 1e6))
+        if self.lastSampleTime is None:
+            self.lastSampleTime = nowMicros
+        elif nowMicros - self.lastSampleTime < self.sampleIntervalMicros:
+            return False
+        else:
+            self.lastSampleTime += self.sampleIntervalMicros  # Stay on the sample grid so the rate does not drift
+            if nowMicros - self.lastSampleTime >= self.sampleIntervalMicros:
+                self.lastSampleTime = nowMicros  # More than a sample behind: skip ahead
+        self.takeSample()
+        self.sampleSequence = (self.sampleSequence + 1) % 2 ** 32  # unsigned long
+        # RTC seconds plus millis() since the tick; millis() is re-aligned to the RTC every minute, so the device
+        # time runs at the rate of the RTC
+        self.sampleTime = int(self.rtcTime * 1000 + nowMicros * (1 + self.clockDrift * 1e-6) / 1000)
+
+        temperature = countsToTemperature(self.tempSum / self.avgSamples)
+        returnTemperature = countsToReturnTemperature(self.returnTempSum / self.avgSamples)
+        averagedFlowRate = countsToFlowRate(self.flowRateSum / self.avgSamples)
+
+        self.setDACVoltage(self.desiredVoltage)  # Update the DAC output voltage
+        if self.batchSamples > 1:
+            self.addToBatch(temperature, self.dacVoltage, averagedFlowRate, returnTemperature)
+        else:
+            self.sendSerialData(temperature, self.dacVoltage, averagedFlowRate, returnTemperature)
+        return True
+
+
+def serveFileDescriptor(fd, stopEvent, **emulatorArgs):
+    """
+    Runs an emulator on a raw file descriptor, e.g. the master side of a pseudo terminal from os.openpty().
+    """
+    os.set_blocking(fd, False)
+
+    def write(data):
+        try:
+            os.write(fd, data)
+        except BlockingIOError:
+            pass  # Nobody is reading; drop the line like a full serial buffer would
+
+    emulator = ArduinoEmulator(write, **emulatorArgs)
+    while not stopEvent.is_set():
+        try:
+            emulator.feed(os.read(fd, 4096))
+        except (BlockingIOError, OSError):
+            pass
+        emulator.step()
+        time.sleep(0.001)
+    return emulator
+
+
+def startPseudoTerminal(**emulatorArgs):
+    """
+    Starts an emulator thread behind a new pseudo terminal.
+    Returns (port name to open from the controller, stop event, thread).
+    """
+    masterFd, slaveFd = os.openpty()
+    tty.setraw(slaveFd)  # No echo: until the controller opens the port, telemetry would be echoed back as commands
+    portName = os.ttyname(slaveFd)
+    stopEvent = threading.Event()
+    thread = threading.Thread(target=serveFileDescriptor, args=(masterFd, stopEvent), kwargs=emulatorArgs, daemon=True)
+    thread.start()
+    return portName, stopEvent, thread
+
+
+class EmulatedSerial:
+    def __init__(self, **emulatorArgs):
+        """
+        In-process stand-in for serial.Serial backed by an emulator running on virtual time.
+        Call advance() to let time pass; telemetry produced meanwhile is returned by readline().
+        """
+        self.rxBuffer = bytearray()
+        emulatorArgs.setdefault('rtcTime', time.time())  # Virtual time starts at 0
+        self.emulator = ArduinoEmulator(self.rxBuffer.extend, **emulatorArgs)
+        self.emulator.lastSampleTime = 0  # First sample one interval after the start
+        self.now = 0.0
+        self.is_open = True
+
+    def advance(self, seconds):
+        """
+        Lets `seconds` of virtual time pass, taking every sample that falls due (also after a setRate command).
+        """
+        end = self.now + seconds
+        while self.emulator.nextSampleTime <= end + 1e-9:
+            self.now = self.emulator.nextSampleTime
+            self.emulator.step(self.now)
+        self.now = end
+
+    @property
+    def in_waiting(self):
+        return len(self.rxBuffer)
+
+    def readline(self):
+        end = self.rxBuffer.find(b'\n') + 1 or len(self.rxBuffer)
+        line = bytes(self.rxBuffer[:end])
+        del self.rxBuffer[:end]
+        return line
+
+    def write(self, data):
+        self.emulator.feed(data)
+        return len(data)
+
+    def isOpen(self):
+        return self.is_open
+
+    def close(self):
+        self.is_open = False
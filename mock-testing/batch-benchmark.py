@@ -0,0 +1,107 @@
+"""
+    Batched telemetry benchmark: runs the controller engine against the in-process emulator in line mode and in
+    batch mode (setBatch, several samples per line with a single header) and reports the serial bytes per sample,
+    the load on the 115200 baud link (telemetry and ACK replies), the samples/s the link could carry, the lines the
+    host has to wake up for, and the host time per sample.
+
+    python batch-benchmark.py --modes 100:1 100:10 250:10 250:25
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from arduinoEmulator import EmulatedSerial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine, BAUD_RATE
+
+LINK_BYTES_PER_SECOND = BAUD_RATE / 10  # 8N1: ten bits per byte
+
+
+def parseMode(text):
+    rate, _, batch = text.partition(':')
+    return int(rate), int(batch or 1)
+
+
+def measureMode(rate, batchSamples, duration, seed=1):
+    """
+    Runs `duration` seconds of virtual time at `rate` Hz with `batchSamples` samples per line.
+    Returns (samples processed, samples taken by the emulator, received bytes, received lines, host time [s]).
+    """
+    engine = ControllerEngine('batch-benchmark', log=lambda message, messageType="info": None)
+    engine.arduinoSerial = EmulatedSerial(seed=seed)
+    engine.setSampling(rate, batchSamples=batchSamples)
+    emulator = engine.arduinoSerial.emulator
+
+    samples = 0
+
+    def onReading(reading):
+        nonlocal samples
+        if 't_sup' in reading:
+            samples += 1
+
+    engine.onReading = onReading
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        while engine.sampleRate != rate or emulator.batchSamples != batchSamples:  # Until both are confirmed
+            engine.arduinoSerial.advance(0.1)
+            engine.poll()
+            if engine.arduinoSerial.now > 10.0:
+                raise RuntimeError(f"The emulator did not confirm {rate} Hz in batches of {batchSamples}")
+        if emulator.batch:
+            engine.arduinoSerial.advance(emulator.sampleInterval * (batchSamples - len(emulator.batch)))
+        engine.poll()  # Start on a batch boundary
+
+        samples = 0
+        receivedBytes = receivedLines = 0
+        hostTime = 0.0
+        taken = 0
+        end = engine.arduinoSerial.now + duration
+        while engine.arduinoSerial.now < end - 1e-9:
+            before = emulator.lastSampleTime
+            engine.arduinoSerial.advance(0.1)
+            taken += (emulator.lastSampleTime - before) // emulator.sampleIntervalMicros
+            receivedBytes += len(engine.arduinoSerial.rxBuffer)
+            receivedLines += engine.arduinoSerial.rxBuffer.count(b'\n')
+            start = time.perf_counter()
+            engine.poll()
+            hostTime += time.perf_counter() - start
+    engine.shutdown()
+    return samples, taken - len(emulator.batch), receivedBytes, receivedLines, hostTime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', type=parseMode, nargs='+', default=[(100, 1), (100, 10), (250, 10), (250, 25)],
+                        metavar='HZ:BATCH', help="Sample rates and batch sizes to test")
+    parser.add_argument('--duration', type=float, default=20.0, help="Virtual time per mode [s]")
+    args = parser.parse_args()
+
+    failed = False
+    for rate, batchSamples in args.modes:
+        samples, taken, receivedBytes, receivedLines, hostTime = measureMode(rate, batchSamples, args.duration)
+        bytesPerSample = receivedBytes / max(samples, 1)
+        load = receivedBytes / args.duration / LINK_BYTES_PER_SECOND
+        print(f"{rate:4d} Hz, batch {batchSamples:2d}: {bytesPerSample:5.1f} bytes/sample, link {load * 100:5.1f}% "
+              f"(max ~{LINK_BYTES_PER_SECOND / bytesPerSample:4.0f} samples/s), "
+              f"{receivedLines / args.duration:5.1f} lines/s, host {hostTime / max(samples, 1) * 1e6:5.0f} us/sample")
+        if samples != taken:
+            print(f"FAIL: {taken} samples taken, {samples} processed", file=sys.stderr)
+            failed = True
+        if load >= 1.0:
+            print(f"FAIL: {rate} Hz in batches of {batchSamples} does not fit the serial link", file=sys.stderr)
+            failed = True
+
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+    Clock sync test: runs the controller engine against the in-process emulator with an RTC that is off the host
+    clock and drifts, reads the telemetry at irregular intervals with occasional host stalls (the lines queue up
+    meanwhile), and checks that the logged sample times still match when the samples were taken.
+
+    python clock-sync-test.py --rate 100 --rtc-offset 3.2 --drift 40 --stall 1.5
+"""
+
+import io
+import os
+import sys
+import random
+import argparse
+import contextlib
+from arduinoEmulator import EmulatedSerial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from clockSync import formatClockStats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--batch', type=int, default=1, help="Samples per telemetry line")
+    parser.add_argument('--rtc-offset', type=float, default=3.2, help="RTC time minus host time [s]")
+    parser.add_argument('--drift', type=float, default=40.0, help="Rate error of the RTC [ppm]")
+    parser.add_argument('--stall', type=float, default=1.5, help="Longest host stall [s]")
+    parser.add_argument('--duration', type=float, default=600.0, help="Virtual time [s]")
+    parser.add_argument('--max-error', type=float, default=0.005, help="Largest logged time error allowed [s]")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    hostStart = 1.7e9  # Host wall clock at virtual time 0
+    rtcTime = hostStart + args.rtc_offset
+    engine = ControllerEngine('clock-sync-test', log=lambda message, messageType="info": None)
+    engine.arduinoSerial = serial = EmulatedSerial(seed=args.seed, rtcTime=rtcTime, clockDrift=args.drift)
+    engine.clock = lambda: serial.now  # The host clock runs on the emulator's virtual time
+    engine.wallClockOffset = hostStart
+    engine.setSampling(args.rate, batchSamples=args.batch)
+
+    errors = []  # (virtual time, logged time - time the sample was taken) [s]
+    update = engine.clockSync.update
+
+    def checkedUpdate(deviceTime, hostTime):
+        takenAt = update(deviceTime, hostTime)
+        trueTime = hostStart + (deviceTime - rtcTime) / (1 + args.drift * 1e-6)
+        errors.append((serial.now, takenAt - trueTime))
+        return takenAt
+
+    engine.clockSync.update = checkedUpdate
+    delays = random.Random(args.seed)
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        stalls = 0
+        while serial.now < args.duration:
+            if delays.random() < 0.002:
+                serial.advance(delays.uniform(0.2, args.stall))  # Host busy: the telemetry queues up
+                stalls += 1
+            else:
+                serial.advance(delays.uniform(0.001, 0.05))
+            engine.poll()
+    engine.shutdown()
+
+    settled = [error for at, error in errors if at > 60.0]  # After the drift estimate has converged
+    worst = max(abs(error) for error in settled)
+    print(f"{len(errors)} samples, {stalls} host stalls of up to {args.stall:g} s")
+    print(f"clock: {formatClockStats(engine.clockStats())}")
+    print(f"logged time error after 60 s: max {worst * 1000:.2f} ms, last {settled[-1] * 1000:+.2f} ms")
+    if worst > args.max_error:
+        print(f"FAIL: logged times are more than {args.max_error * 1000:g} ms off", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+    Command latency benchmark: runs the controller engine against the emulator through a pseudo terminal
+    (Linux/macOS) and measures the round trip of the sequence-numbered commands (command sent -> 'ACK <seq>'
+    received), the commands lost or rejected, and the largest gap between two telemetry lines.
+
+    python command-latency-benchmark.py --rate 100 --seconds 30
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from commandTracker import formatAckStats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]; one setVoltage per line")
+    parser.add_argument('--seconds', type=float, default=30.0, help="Run length")
+    parser.add_argument('--poll-interval', type=float, default=0.01, help="Serial polling interval [s]")
+    parser.add_argument('--max-p99', type=float, default=0.05, help="Largest p99 round trip allowed [s]")
+    args = parser.parse_args()
+
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": print(message, file=sys.stderr))
+    engine.connect()
+    engine.setSampling(args.rate)
+
+    arrivals = []
+
+    def onReading(reading):
+        if 't_sup' in reading:
+            arrivals.append(time.perf_counter())
+
+    engine.onReading = onReading
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        while engine.sampleRate != args.rate and (not arrivals or time.perf_counter() - arrivals[0] < 5.0):
+            engine.poll()
+            time.sleep(args.poll_interval)
+        arrivals.clear()
+        end = time.perf_counter() + args.seconds
+        while time.perf_counter() < end:
+            engine.poll()
+            time.sleep(args.poll_interval)
+    stats = engine.commandStats()
+    engine.shutdown()
+    stopEvent.set()
+    thread.join()
+
+    gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    print(f"{len(arrivals)} telemetry lines at {engine.sampleRate:g} Hz, max gap {max(gaps, default=0) * 1000:.1f} ms")
+    print(f"commands: {formatAckStats(stats)}")
+    if engine.sampleRate != args.rate:
+        print(f"FAIL: the emulator did not confirm {args.rate} Hz", file=sys.stderr)
+        return 1
+    if stats['timedOut'] or stats['rejected']:
+        print("FAIL: commands were lost or rejected", file=sys.stderr)
+        return 1
+    if stats['p99RTT'] > args.max_p99:
+        print(f"FAIL: p99 round trip above {args.max_p99 * 1000:.0f} ms", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+    Control loop benchmark: runs the controller engine against the emulator through a pseudo terminal
+    (Linux/macOS) while the main thread emulates a busy GUI (repaints, table updates, dialogs of random length),
+    and compares the timing of the poll / model step / setVoltage iterations in two set-ups:
+
+      timer   the iterations run from a timer callback of the GUI event loop (the former QTimer set-up)
+      thread  the iterations run on the fixed-period ControlLoop thread (controlLoop.py)
+
+    For each, the lateness of the iterations (start after the scheduled time), their compute time and the missed
+    deadlines are reported.
+
+    python control-loop-benchmark.py --rate 100 --period 0.05 --seconds 20
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from controlLoop import ControlLoop, formatControlStats
+
+
+def busy(seconds):
+    """
+    Keeps the calling thread (and the interpreter) busy, like a repaint in the GUI thread.
+    """
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def runMode(mode, args):
+    """
+    Runs `args.seconds` of control iterations with the emulated GUI load. Returns the ControlLoop statistics.
+    """
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": None)
+    engine.connect()
+    engine.setSampling(args.rate)
+    load = random.Random(args.seed)
+    controlLoop = ControlLoop(engine.poll, args.period)
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        end = time.monotonic() + args.seconds
+        nextBurst = time.monotonic() + load.expovariate(1 / args.gui_interval)
+        if mode == 'thread':
+            controlLoop.start()
+            while time.monotonic() < end:
+                time.sleep(max(min(nextBurst, end) - time.monotonic(), 0))
+                with controlLoop.lock:
+                    pass  # GUI calls into the engine take the lock, like the status line does
+                busy(load.uniform(0, args.gui_burst))
+                nextBurst = time.monotonic() + load.expovariate(1 / args.gui_interval)
+            controlLoop.stop()
+        else:
+            # Single-threaded event loop: the timer callback runs when no other event is being handled, and a timer
+            # that is overdue by more than a period is rescheduled from now, as QTimer does
+            due = time.monotonic() + args.period
+            while time.monotonic() < end:
+                if nextBurst < due:
+                    time.sleep(max(nextBurst - time.monotonic(), 0))
+                    busy(load.uniform(0, args.gui_burst))
+                    nextBurst = time.monotonic() + load.expovariate(1 / args.gui_interval)
+                    continue
+                time.sleep(max(due - time.monotonic(), 0))
+                start = time.monotonic()
+                engine.poll()
+                finished = time.monotonic()
+                controlLoop.record(finished - start, start - due)
+                due += args.period
+                if finished > due:
+                    controlLoop.missed += 1
+                    if finished > due + args.period:
+                        controlLoop.skipped += int((finished - due) / args.period)
+                        due = finished + args.period
+    engine.shutdown()
+    stopEvent.set()
+    thread.join()
+    return controlLoop.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--period', type=float, default=0.05, help="Control loop period [s]")
+    parser.add_argument('--seconds', type=float, default=20.0, help="Run length per set-up")
+    parser.add_argument('--gui-burst', type=float, default=0.15, help="Longest busy stretch of the GUI thread [s]")
+    parser.add_argument('--gui-interval', type=float, default=0.2, help="Mean time between two GUI bursts [s]")
+    parser.add_argument('--max-p99-lateness', type=float, default=0.02,
+                        help="Largest p99 lateness allowed for the control loop thread [s]")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('timer', 'thread'):
+        results[mode] = runMode(mode, args)
+        print(f"{mode:6s}: {formatControlStats(results[mode])}")
+
+    if results['thread']['p99Lateness'] > args.max_p99_lateness:
+        print(f"FAIL: p99 lateness of the control loop above {args.max_p99_lateness * 1000:.0f} ms", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
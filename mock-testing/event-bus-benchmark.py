@@ -0,0 +1,118 @@
+"""
+    Event bus benchmark: runs the controller engine on the control loop thread against the emulator through a
+    pseudo terminal (Linux/macOS) with a consumer that is slower than the sample rate (like a table or graph redraw),
+    first called synchronously from the engine's onSample callback, then subscribed to the event bus (eventBus.py)
+    on its own thread next to a fast consumer that must see every sample.
+    Checks that on the bus the slow consumer only loses its own oldest samples within its queue bound, that the fast
+    consumer receives every sample, and that the slow consumer no longer delays the control loop. The time the control
+    loop takes to stop shows how far the synchronous consumer left it behind.
+
+    python event-bus-benchmark.py --rate 100 --period 0.01 --slow-handler 0.03 --seconds 15
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from controlLoop import ControlLoop, formatControlStats
+from eventBus import SubscriberThread, formatBusStats
+
+
+def run(args, mode):
+    """
+    Runs the control loop for `args.seconds`. mode: 'none' (no consumer), 'callback' (slow consumer in onSample)
+    or 'bus' (slow and fast consumers on their own queues and threads).
+    Returns (control loop statistics, samples published, bus statistics, samples handled by the fast consumer,
+    time the control loop took to stop [s], None if it was still busy after args.stop_timeout).
+    """
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": None)
+    engine.connect()
+    engine.setSampling(args.rate)
+    controlLoop = ControlLoop(engine.poll, args.period)
+    published = []
+    engine.onSample = lambda record, timestamp: published.append(timestamp)
+
+    def slowHandler(event):
+        time.sleep(args.slow_handler)
+
+    consumers = []
+    if mode == 'callback':
+        engine.onSample = lambda record, timestamp: (published.append(timestamp), slowHandler(None))
+    elif mode == 'bus':
+        slow = engine.bus.subscribe('slow', ['sample'], args.queue_depth, 'drop-oldest')
+        fast = engine.bus.subscribe('fast', ['sample'], args.queue_depth, 'block')
+        consumers = [SubscriberThread(slow, slowHandler), SubscriberThread(fast, lambda event: None)]
+        for consumer in consumers:
+            consumer.start()
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        controlLoop.start()
+        time.sleep(args.seconds)
+        stopStart = time.monotonic()
+        controlLoop.stop(timeout=args.stop_timeout)
+        stopDelay = None if controlLoop.is_alive() else time.monotonic() - stopStart
+        for consumer in consumers:
+            consumer.stop(timeout=args.queue_depth * args.slow_handler)
+        if stopDelay is not None:  # A loop still in its iteration owns the engine; it ends with the process
+            engine.shutdown()
+    stopEvent.set()
+    thread.join()
+    handled = consumers[1].handled if consumers else None
+    return controlLoop.stats(), len(published), engine.bus.stats(), handled, stopDelay
+
+
+def formatStop(stopDelay, timeout):
+    return f"stopped in {stopDelay:.2f} s" if stopDelay is not None else f"still busy {timeout:g} s after stop"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--period', type=float, default=0.01, help="Control loop period [s]")
+    parser.add_argument('--slow-handler', type=float, default=0.03, help="Time the slow consumer takes per sample [s]")
+    parser.add_argument('--queue-depth', type=int, default=100, help="Bound of each consumer's queue [events]")
+    parser.add_argument('--seconds', type=float, default=15.0, help="Run length per set-up")
+    parser.add_argument('--stop-timeout', type=float, default=10.0,
+                        help="Longest wait for the control loop to stop [s]")
+    parser.add_argument('--max-p99-increase', type=float, default=0.002,
+                        help="Largest increase of the p99 control loop lateness allowed on the bus [s]")
+    args = parser.parse_args()
+
+    quiet, _, _, _, quietStop = run(args, 'none')
+    callback, _, _, _, callbackStop = run(args, 'callback')
+    bus, published, queues, fastHandled, busStop = run(args, 'bus')
+    queues = {queue['name']: queue for queue in queues}
+
+    print(f"no consumer:         {formatControlStats(quiet)}; {formatStop(quietStop, args.stop_timeout)}")
+    print(f"slow onSample:       {formatControlStats(callback)}; {formatStop(callbackStop, args.stop_timeout)}")
+    print(f"slow on the bus:     {formatControlStats(bus)}; {formatStop(busStop, args.stop_timeout)}")
+    print(f"event queues: {formatBusStats(queues.values())}; {published} samples published, "
+          f"{fastHandled} handled by the fast consumer")
+
+    failed = False
+    if queues['fast']['dropped'] or fastHandled != published:
+        print("FAIL: the fast consumer missed samples", file=sys.stderr)
+        failed = True
+    if queues['slow']['peakDepth'] > args.queue_depth or not queues['slow']['dropped']:
+        print("FAIL: the slow consumer's queue was not bounded by its overflow policy", file=sys.stderr)
+        failed = True
+    if busStop is None or bus['p99Lateness'] - quiet['p99Lateness'] > args.max_p99_increase:
+        print("FAIL: the slow consumer delays the control loop through the bus", file=sys.stderr)
+        failed = True
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+    Export benchmark: writes a columnar session of simulated samples (10 million by default), then runs the
+    streaming export job to CSV, zstd-compressed CSV and a columnar session while a simulated acquisition thread
+    keeps recording, and compares the export throughput with the raw disk write speed.
+
+    python export-benchmark.py --rows 10000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import SAMPLE_COLUMNS
+from sampleStore import STORE_COLUMNS
+from sessionStore import Session, SessionWriterThread, COLUMN_SUFFIX, COLUMN_DTYPE, newHeader, writeHeader
+from exportJob import ExportJob
+
+WRITE_CHUNK_ROWS = 2 ** 20
+
+
+def writeSimulatedSession(directory, count, seed=1):
+    """
+    Writes `count` simulated 1 Hz samples straight to the column files of a new session.
+    """
+    os.makedirs(directory)
+    writeHeader(directory, newHeader([('Project Number', 'benchmark'), ('Client Name', 'BRE')], SAMPLE_COLUMNS))
+    generator = np.random.default_rng(seed)
+    start = time.time() - count
+    files = [open(os.path.join(directory, key + COLUMN_SUFFIX), 'wb') for key in STORE_COLUMNS]
+    for first in range(0, count, WRITE_CHUNK_ROWS):
+        length = min(WRITE_CHUNK_ROWS, count - first)
+        rows = generator.normal(40.0, 5.0, size=(length, len(STORE_COLUMNS))).round(2)
+        rows[:, 0] = start + first + np.arange(length)
+        rows[:, 3] = generator.normal(40.0, 5.0, size=length)  # Model output at full precision
+        rows[::97, 3] = np.nan
+        for index, file in enumerate(files):
+            file.write(rows[:, index].astype(COLUMN_DTYPE).tobytes())
+    for file in files:
+        file.close()
+
+
+def diskWriteSpeed(directory, megabytes=512):
+    """
+    Sequential write speed of the benchmark directory [MB/s], including the final fsync.
+    """
+    path = os.path.join(directory, 'disk-speed.bin')
+    block = os.urandom(2 ** 20)
+    start = time.perf_counter()
+    with open(path, 'wb') as file:
+        for _ in range(megabytes):
+            file.write(block)
+        file.flush()
+        os.fsync(file.fileno())
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return megabytes / elapsed
+
+
+class SimulatedAcquisition(threading.Thread):
+    def __init__(self, directory, rate):
+        """
+        Submits samples to a session writer at a fixed rate and records the largest gap between two samples.
+        """
+        super(SimulatedAcquisition, self).__init__(name="SimulatedAcquisition", daemon=True)
+        self.writer = SessionWriterThread(directory, fsyncPolicy='never')
+        self.period = 1.0 / rate
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.maxGap = 0.0
+
+    def run(self):
+        self.writer.start()
+        last = time.perf_counter()
+        while not self.stopped.wait(self.period):
+            now = time.perf_counter()
+            self.maxGap = max(self.maxGap, now - last)
+            last = now
+            self.writer.submit([time.time()] + [40.0] * (len(STORE_COLUMNS) - 1))
+            self.samples += 1
+        self.writer.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000000, help="Samples in the exported session")
+    parser.add_argument('--formats', nargs='+', default=['.csv', '.csv.zst', '.session'], help="Formats to export")
+    parser.add_argument('--rate', type=float, default=100.0, help="Simulated acquisition rate during exports [Hz]")
+    parser.add_argument('--max-gap', type=float, default=0.25, help="Maximum acquisition gap allowed [s]")
+    parser.add_argument('--directory', help="Directory for the benchmark files (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        sessionPath = os.path.join(directory, 'benchmark.session')
+        start = time.perf_counter()
+        writeSimulatedSession(sessionPath, args.rows)
+        print(f"wrote {args.rows} samples in {time.perf_counter() - start:.1f} s")
+        print(f"disk write speed: {diskWriteSpeed(directory):.0f} MB/s")
+
+        session = Session(sessionPath)
+        failed = False
+        for suffix in args.formats:
+            path = os.path.join(directory, 'export' + suffix)
+            acquisition = SimulatedAcquisition(os.path.join(directory, 'acquisition.session'), args.rate)
+            acquisition.start()
+            start = time.perf_counter()
+            rowsWritten = ExportJob(session, path).run()
+            elapsed = time.perf_counter() - start
+            acquisition.stop()
+
+            if os.path.isdir(path):
+                size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            else:
+                size = os.path.getsize(path)
+            print(f"{suffix}: {rowsWritten} rows in {elapsed:.1f} s ({rowsWritten / elapsed / 1e6:.2f} M rows/s, "
+                  f"{size / 2 ** 20 / elapsed:.0f} MB/s, {size / 2 ** 20:.0f} MB); acquisition recorded "
+                  f"{acquisition.samples} samples, max gap {acquisition.maxGap * 1000:.0f} ms")
+            if acquisition.maxGap > args.max_gap:
+                print(f"FAIL: acquisition stalled for more than {args.max_gap} s during the export", file=sys.stderr)
+                failed = True
+            if suffix == '.session' and not np.array_equal(Session(path).rows(0, 100000), session.rows(0, 100000),
+                                                            equal_nan=True):
+                print("FAIL: exported session differs from the source", file=sys.stderr)
+                failed = True
+
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+    Sample-to-DAC latency benchmark: runs the controller engine on the control loop thread against the emulator
+    through a pseudo terminal (Linux/macOS) and reports the per-stage latency histograms of latencyTrace.py, from a
+    telemetry line read off the serial port to its setVoltage written back (receive, parse, model step, command
+    enqueue, serial write). The time a line waits in the serial buffer until the next poll is the read delay of the
+    clock sync, reported alongside. Also checks that the histograms are exported with the recorded session.
+
+    python latency-benchmark.py --rate 100 --period 0.01 --seconds 30
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from controlLoop import ControlLoop
+from latencyTrace import TRACE_STAGES
+from sessionStore import Session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--batch', type=int, default=1, help="Samples per telemetry line")
+    parser.add_argument('--period', type=float, default=0.01, help="Control loop period [s]")
+    parser.add_argument('--seconds', type=float, default=30.0, help="Run length")
+    parser.add_argument('--max-p99', type=float, default=0.01, help="Largest p99 receive -> write latency allowed [s]")
+    args = parser.parse_args()
+
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": print(message, file=sys.stderr))
+    engine.connect()
+    engine.setSampling(args.rate, batchSamples=args.batch)
+    controlLoop = ControlLoop(engine.poll, args.period)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine.setCSVFilePath(os.path.join(directory, 'latency.csv'))
+        engine.initCSVFile()
+        # The model implementation prints every step; keep stdout quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.initializeBuildingModel(7.0, 25.0)
+            controlLoop.start()
+            time.sleep(args.seconds)
+            controlLoop.stop()
+        stats = engine.latencyStats()
+        clock = engine.clockStats()
+        engine.shutdown()
+        stopEvent.set()
+        thread.join()
+        exported = Session(engine.session_path).latencyHistograms
+
+    print(f"{stats['total']['count']} setVoltage commands at {engine.sampleRate:g} Hz, batch {args.batch}, "
+          f"control loop every {args.period * 1000:g} ms")
+    print(f"{'stage':16s} {'mean':>8s} {'p50':>8s} {'p99':>8s} {'p999':>8s} {'max':>8s}  [ms]")
+    for stage in TRACE_STAGES:
+        row = stats[stage]
+        print(f"{stage:16s} " + " ".join(f"{row[key] * 1000:8.3f}" for key in ('mean', 'p50', 'p99', 'p999', 'max')))
+    print(f"serial buffer wait before the poll (clock sync read delay): max {clock['maxDelay'] * 1000:.1f} ms")
+
+    if exported.get('total', {}).get('count') != stats['total']['count']:
+        print("FAIL: the latency histograms were not exported with the session", file=sys.stderr)
+        return 1
+    if not stats['total']['count'] or stats['total']['p99'] > args.max_p99:
+        print(f"FAIL: p99 sample-to-DAC latency above {args.max_p99 * 1000:.0f} ms", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
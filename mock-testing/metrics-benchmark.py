@@ -0,0 +1,143 @@
+"""
+    Metrics endpoint benchmark: runs the controller engine on the control loop thread against the emulator through a
+    pseudo terminal (Linux/macOS), once without and once with a client scraping the Prometheus endpoint
+    (metricsServer.py) at a high rate. Reports the scrape time and size, checks that the exposition parses, holds
+    the expected metrics and lists the samples of each metric family (e.g. one per event queue) as one group, and
+    compares the control loop timing, which scraping must not perturb.
+
+    python metrics-benchmark.py --rate 100 --period 0.01 --scrapes-per-second 20 --seconds 15
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+import urllib.request
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from controlLoop import ControlLoop, formatControlStats
+from metricsServer import MetricsServer, engineMetrics, controlLoopMetrics, METRICS_PREFIX
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? \S+$')
+EXPECTED_METRICS = ('samples_received_total', 'parse_errors_total', 'serial_reconnects_total', 'csv_queue_depth',
+                    'model_step_seconds_bucket', 'supply_temperature_celsius', 'return_temperature_celsius',
+                    'building_temperature_celsius', 'heat_flow_watts', 'control_iterations_total',
+                    'resident_memory_bytes', 'event_queue_depth')
+
+
+def splitFamilies(text):
+    """
+    Metric families whose samples do not follow their HELP and TYPE lines as one group.
+    """
+    kinds = {}
+    blocks = []  # Family of each run of consecutive samples
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split()
+            kinds[name] = kind
+            continue
+        if line.startswith('#') or not line:
+            continue
+        name = re.match(r'[a-zA-Z_:][a-zA-Z0-9_:]*', line).group()
+        base = re.sub(r'_(bucket|sum|count)$', '', name)
+        family = base if kinds.get(base) == 'histogram' else name
+        if not blocks or blocks[-1] != family:
+            blocks.append(family)
+    return sorted({family for family in blocks if blocks.count(family) > 1})
+
+
+def run(args, scrapesPerSecond):
+    """
+    Runs the control loop for `args.seconds`, scraped `scrapesPerSecond` times a second (0: not at all).
+    Returns (control loop statistics, scrape times [s], last exposition text).
+    """
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": None)
+    engine.connect()
+    engine.setSampling(args.rate)
+    controlLoop = ControlLoop(engine.poll, args.period)
+    for name in ('viewer-1', 'viewer-2'):  # Two label values of the event queue families
+        engine.bus.subscribe(name, ['sample'])
+    server = MetricsServer([engineMetrics(engine), controlLoopMetrics(controlLoop)], 0)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}/metrics"
+
+    scrapeTimes = []
+    text = ""
+    done = threading.Event()
+
+    def scrape():
+        nonlocal text
+        while not done.wait(1 / scrapesPerSecond):
+            start = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                text = response.read().decode('utf-8')
+            scrapeTimes.append(time.perf_counter() - start)
+
+    # The model implementation prints every step; keep stdout quiet
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        engine.setCSVFilePath(os.path.join(directory, 'metrics.csv'))
+        engine.initCSVFile()
+        engine.initializeBuildingModel(7.0, 25.0)
+        controlLoop.start()
+        scraper = threading.Thread(target=scrape, daemon=True)
+        if scrapesPerSecond:
+            scraper.start()
+        time.sleep(args.seconds)
+        done.set()
+        if scrapesPerSecond:
+            scraper.join()
+        controlLoop.stop()
+        server.stop()
+        engine.shutdown()
+    stopEvent.set()
+    thread.join()
+    return controlLoop.stats(), scrapeTimes, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--period', type=float, default=0.01, help="Control loop period [s]")
+    parser.add_argument('--scrapes-per-second', type=float, default=20.0, help="Scrape rate of the client")
+    parser.add_argument('--seconds', type=float, default=15.0, help="Run length per set-up")
+    parser.add_argument('--max-p99-increase', type=float, default=0.002,
+                        help="Largest increase of the p99 control loop lateness allowed while scraping [s]")
+    args = parser.parse_args()
+
+    quiet, _, _ = run(args, 0)
+    scraped, scrapeTimes, text = run(args, args.scrapes_per_second)
+    scrapeTimes.sort()
+    print(f"not scraped: {formatControlStats(quiet)}")
+    print(f"scraped:     {formatControlStats(scraped)}")
+    print(f"{len(scrapeTimes)} scrapes of {len(text.encode())} bytes, round trip "
+          f"{scrapeTimes[len(scrapeTimes) // 2] * 1000:.2f} ms (max {scrapeTimes[-1] * 1000:.2f} ms)")
+
+    failed = False
+    malformed = [line for line in text.splitlines() if not line.startswith('#') and not SAMPLE_LINE.match(line)]
+    missing = [name for name in EXPECTED_METRICS if f"\n{METRICS_PREFIX}{name}" not in text]
+    if malformed or missing:
+        print(f"FAIL: malformed lines {malformed[:3]}, missing metrics {missing}", file=sys.stderr)
+        failed = True
+    split = splitFamilies(text)
+    if split:
+        print(f"FAIL: samples of {', '.join(split)} are not grouped under their family", file=sys.stderr)
+        failed = True
+    if scraped['p99Lateness'] - quiet['p99Lateness'] > args.max_p99_increase:
+        print("FAIL: scraping perturbs the control loop", file=sys.stderr)
+        failed = True
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,32 @@
+import sys
 import time
 import serial
-import random
+from arduinoEmulator import ArduinoEmulator, startPseudoTerminal
 
 port = '/dev/ttys073'  # Replace with the correct port for your virtual serial port
-baud_rate = 9600
+baud_rate = 115200
 
 def mock_arduino():
-    with serial.Serial(port, baud_rate, timeout=1) as ser:
+    with serial.Serial(port, baud_rate, timeout=0) as ser:
         print(f"Mock Arduino on {ser.name} started")
+        emulator = ArduinoEmulator(ser.write)
         while True:
-            # Simulate sensor data
-            temperature = round(random.uniform(20, 30), 2)
-            resistance = round(random.uniform(100, 200), 2)
-            voltage = round(random.uniform(0, 5), 2)
-            flow_rate = round(random.uniform(0, 1), 2)
-            
-            # Include a timestamp
-            timestamp = round(time.time(), 2)  # You could also format this as a human-readable string
-            
-            # Send a formatted string back to the GUI, now including the timestamp
-            response = f"Time:{timestamp},Temp:{temperature},Res:{resistance},Volt:{voltage},Flow:{flow_rate}\n"
-            ser.write(response.encode('utf-8'))
-            print(f"Sent mock data: {response.strip()}")
-            
-            time.sleep(1)  # Adjust this sleep time if needed
+            # Handle commands from the GUI, then send a telemetry line once per sample interval
+            emulator.feed(ser.read(ser.in_waiting or 1))
+            emulator.step()
+            time.sleep(0.001)
+
+def mock_arduino_pty():
+    # No socat/com0com needed: create a pseudo terminal and print the port to set as ARDUINO_PORT
+    portName, stopEvent, thread = startPseudoTerminal()
+    print(f"Mock Arduino on {portName} started")
+    try:
+        thread.join()
+    except KeyboardInterrupt:
+        stopEvent.set()
 
 if __name__ == "__main__":
-    mock_arduino()
+    if '--pty' in sys.argv:
+        mock_arduino_pty()
+    else:
+        mock_arduino()
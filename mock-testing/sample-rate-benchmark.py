@@ -0,0 +1,93 @@
+"""
+    Sample rate benchmark: runs the controller engine against the in-process emulator at several telemetry rates
+    (setRate / setAvgWindow) and measures how long the controller takes to react to a supply temperature step,
+    and how much host time each telemetry line costs, which must stay below the sample period.
+
+    python sample-rate-benchmark.py --rates 1 10 100
+    python sample-rate-benchmark.py --avg-seconds 4   (same averaging time at every rate)
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from arduinoEmulator import EmulatedSerial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine, MAX_AVG_WINDOW
+
+
+def measureReaction(rate, avgWindow, step, settle, duration, seed=1):
+    """
+    Applies a supply temperature step of `step` °C after `settle` seconds of virtual time.
+    Returns (reaction time [s] until the engine sees half of the step, host time per telemetry line [s]).
+    """
+    engine = ControllerEngine('sample-rate-benchmark', log=lambda message, messageType="info": None)
+    engine.arduinoSerial = EmulatedSerial(seed=seed)
+    engine.setSampling(rate, avgWindow)
+    emulator = engine.arduinoSerial.emulator
+
+    readings = []  # (virtual time, supply temperature) of every telemetry line
+
+    def onReading(reading):
+        if 't_sup' in reading:
+            readings.append((engine.arduinoSerial.now, reading['t_sup']))
+
+    engine.onReading = onReading
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        tick = min(0.1, 1.0 / rate)
+        hostTime = 0.0
+        lines = 0
+        stepTime = None
+        while engine.arduinoSerial.now < settle + duration:
+            if stepTime is None and engine.arduinoSerial.now >= settle:
+                before = readings[-1][1]
+                emulator.supplyTemperature += step
+                stepTime = engine.arduinoSerial.now
+            engine.arduinoSerial.advance(tick)
+            lines += engine.arduinoSerial.rxBuffer.count(b'\n')
+            start = time.perf_counter()
+            engine.poll()
+            hostTime += time.perf_counter() - start
+    engine.shutdown()
+
+    if engine.sampleRate != rate:
+        raise RuntimeError(f"The emulator did not confirm {rate} Hz (engine runs at {engine.sampleRate:g} Hz)")
+    reaction = next((at - stepTime for at, t_sup in readings
+                     if at > stepTime and t_sup - before >= step / 2), None)
+    return reaction, hostTime / max(lines, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=int, nargs='+', default=[1, 10, 100], help="Telemetry rates to test [Hz]")
+    parser.add_argument('--avg-seconds', type=float, default=0.0,
+                        help="Averaging window as time [s]; 0 keeps the firmware's 4 samples at every rate")
+    parser.add_argument('--step', type=float, default=10.0, help="Supply temperature step [°C]")
+    parser.add_argument('--duration', type=float, default=30.0, help="Virtual time after the step [s]")
+    args = parser.parse_args()
+
+    failed = False
+    for rate in args.rates:
+        avgWindow = min(max(int(round(args.avg_seconds * rate)), 1), MAX_AVG_WINDOW) if args.avg_seconds else 4
+        reaction, perLine = measureReaction(rate, avgWindow, args.step, settle=5.0, duration=args.duration)
+        reactionText = f"{reaction:.2f} s" if reaction is not None else "none"
+        print(f"{rate:4d} Hz, window {avgWindow:3d} samples ({avgWindow / rate:.2f} s): reaction {reactionText}, "
+              f"host time {perLine * 1000:.2f} ms per line ({perLine * rate * 100:.1f}% of real time)")
+        if perLine * rate >= 1.0:
+            print(f"FAIL: the host cannot keep up with {rate} Hz telemetry", file=sys.stderr)
+            failed = True
+
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
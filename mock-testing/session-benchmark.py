@@ -0,0 +1,115 @@
+"""
+    Columnar session benchmark: records a session of simulated 1 Hz samples through the background session writer,
+    then times opening it with numpy.memmap, a full-column scan and the derived CSV export. Also checks that a CSV log
+    holding two runs (a second preamble and header appended to the same file) opens with the rows of both.
+
+    python session-benchmark.py --days 7
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import SAMPLE_COLUMNS
+from sampleStore import STORE_COLUMNS
+from sessionStore import SessionWriterThread, Session
+from sessionLoader import openSessionReader
+from exportJob import ExportJob, RowSnapshot
+
+APPENDED_RUN_ROWS = 50000  # Rows of each run in the two-run CSV log
+
+
+def simulatedRows(count, start, seed=1):
+    generator = np.random.default_rng(seed)
+    rows = generator.normal(40.0, 5.0, size=(count, len(STORE_COLUMNS))).round(2)
+    rows[:, 0] = start + np.arange(count)
+    rows[::97, 3] = np.nan  # Occasional missing model output, as logged for 'N/A'
+    return rows
+
+
+def appendedRunsDiffer(directory, rows):
+    """
+    Writes two runs into one CSV log, as choosing an existing file in the save dialog does, and opens it.
+    Returns an error message, or None if the rows of both runs are read back.
+    """
+    runs = [rows[:APPENDED_RUN_ROWS], rows[APPENDED_RUN_ROWS:2 * APPENDED_RUN_ROWS]]
+    paths = []
+    for number, run in enumerate(runs, 1):
+        date = time.strftime('%Y-%m-%d', time.localtime(run[0, 0]))
+        metadata = [('Project Number', f'p{number}'), ('Client Name', 'BRE'), ('Date', date)]
+        paths.append(os.path.join(directory, f'run{number}.csv'))
+        ExportJob(RowSnapshot(run, metadata, SAMPLE_COLUMNS), paths[-1]).run()
+    with open(paths[0], 'ab') as log, open(paths[1], 'rb') as second:
+        shutil.copyfileobj(second, log)
+
+    opened = np.concatenate([chunk for chunk, fraction in openSessionReader(paths[0]).chunks()])
+    expected = np.concatenate(runs)
+    if len(opened) != len(expected):
+        return f"{len(opened)} rows read from a two-run log of {len(expected)} rows"
+    if not np.allclose(opened[:, 1:], expected[:, 1:], equal_nan=True):
+        return "values of a two-run log differ from the recorded rows"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=7.0, help="Simulated session length")
+    parser.add_argument('--open-target', type=float, default=1.0, help="Maximum time to open the session [s]")
+    parser.add_argument('--skip-export', action='store_true', help="Do not time the CSV export")
+    args = parser.parse_args()
+
+    count = int(args.days * 86400)
+    rows = simulatedRows(count, time.time() - count)
+
+    with tempfile.TemporaryDirectory() as directory:
+        sessionPath = os.path.join(directory, 'benchmark.session')
+        writer = SessionWriterThread(sessionPath, [('Project Number', 'benchmark'), ('Client Name', 'BRE')],
+                                     SAMPLE_COLUMNS, fsyncPolicy='never')
+        writer.start()
+        start = time.perf_counter()
+        for row in rows.tolist():
+            writer.submit(row)
+        submitted = time.perf_counter() - start
+        writer.close()
+        print(f"recorded {count} samples ({writer.rowsWritten} written): "
+              f"{submitted / count * 1e6:.2f} us per submit, max write latency {writer.maxWriteLatency * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        session = Session(sessionPath)
+        opened = time.perf_counter() - start
+        print(f"open: {opened * 1000:.1f} ms for {len(session)} samples")
+
+        start = time.perf_counter()
+        peak = np.nanmax(session.column('t_sup'))
+        print(f"scan: max supply temperature {peak:.2f} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        if not np.array_equal(session.rows(), rows, equal_nan=True):
+            print("FAIL: session data differs from the recorded rows", file=sys.stderr)
+            return 1
+
+        error = appendedRunsDiffer(directory, rows)
+        if error:
+            print(f"FAIL: {error}", file=sys.stderr)
+            return 1
+        print(f"two-run CSV log: {2 * APPENDED_RUN_ROWS} rows read back")
+
+        if not args.skip_export:
+            csvPath = os.path.join(directory, 'benchmark.csv')
+            start = time.perf_counter()
+            ExportJob(session, csvPath).run()
+            print(f"CSV export: {time.perf_counter() - start:.1f} s, {os.path.getsize(csvPath) / 2 ** 20:.1f} MB")
+
+    if opened > args.open_target:
+        print(f"FAIL: opening took longer than {args.open_target} s", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+    Shared-memory ring benchmark: runs the headless controller (controller-daemon.py --shared-ring) against the
+    emulator through a pseudo terminal (Linux/macOS) and a viewer in a second process that attaches to the ring like
+    arduino-gui.py --attach. The viewer follows the samples, then freezes (a busy loop, like a long repaint or a
+    modal dialog), catches up and finally crashes (SIGKILL).
+    Reports the time from the writer's append to the viewer's read, and checks that the viewer lost no sample while
+    it froze, and that the controller kept logging every sample through the freeze and after the crash.
+
+    python shared-ring-benchmark.py --rate 100 --follow 10 --freeze 3 --after-crash 5
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import signal
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from arduinoEmulator import startPseudoTerminal
+
+INTERFACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface')
+sys.path.insert(0, INTERFACE_DIR)
+from sharedRing import SharedRingReader
+from sessionStore import Session, sessionPathFor
+from commandTracker import percentile
+
+ATTACH_TIMEOUT = 15.0  # Longest wait of the viewer for the controller's ring [s]
+
+
+def gaps(times, rate):
+    """
+    Number of steps between consecutive sample times longer than 1.5 sample periods.
+    """
+    return int(np.sum(np.diff(times) > 1.5 / rate)) if len(times) > 1 else 0
+
+
+def atRate(times, rate):
+    """
+    The sample times from the first step of one period at `rate` on: the samples logged before the Arduino
+    acknowledges setRate are taken at its default 1 Hz schedule and are not checked for gaps.
+    """
+    steps = np.flatnonzero(np.diff(times) <= 1.5 / rate)
+    return times[steps[0]:] if len(steps) else times[:0]
+
+
+def view(args):
+    """
+    Viewer process: follows the ring, freezes, catches up, prints its results as JSON and kills itself.
+    """
+    deadline = time.monotonic() + ATTACH_TIMEOUT
+    while True:
+        try:
+            reader = SharedRingReader(args.viewer)
+            break
+        except (FileNotFoundError, ValueError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+    reader.read()  # Start with the samples logged from now on
+    times = []
+    wakeDelays = []  # Time from the newest append to its read [s]
+    end = time.monotonic() + args.follow
+    while time.monotonic() < end:
+        select.select([reader], [], [], 0.5)
+        segments = reader.read()
+        if segments:
+            wakeDelays.append(reader.heartbeatAge())
+            times.extend(np.concatenate([rows[:, 0] for rows in segments]))
+
+    freezeEnd = time.monotonic() + args.freeze
+    while time.monotonic() < freezeEnd:
+        pass  # Frozen GUI thread: nothing is read
+    caughtUp = sum(len(rows) for rows in reader.read())
+    wakeDelays.sort()
+    print(json.dumps({
+        'read': reader.recordsRead,
+        'caughtUp': caughtUp,
+        'overruns': reader.overruns,
+        'gaps': gaps(np.array(times), args.rate),
+        'p50WakeDelay': percentile(wakeDelays, 0.5),
+        'p99WakeDelay': percentile(wakeDelays, 0.99),
+        'crashTime': time.time()
+    }), flush=True)
+    os.kill(os.getpid(), signal.SIGKILL)  # Crash without closing anything
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--follow', type=float, default=10.0, help="Time the viewer follows the ring [s]")
+    parser.add_argument('--freeze', type=float, default=3.0, help="Time the viewer is frozen [s]")
+    parser.add_argument('--after-crash', type=float, default=5.0, help="Time the controller runs after the crash [s]")
+    parser.add_argument('--viewer', metavar='NAME', help=argparse.SUPPRESS)  # Run as the viewer process
+    args = parser.parse_args()
+    if args.viewer:
+        return view(args)
+
+    name = f"hp-ring-benchmark-{os.getpid()}"
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    with tempfile.TemporaryDirectory() as directory:
+        csvPath = os.path.join(directory, 'ring.csv')
+        controller = subprocess.Popen(
+            [sys.executable, 'controller-daemon.py', '--port', port, '--csv', csvPath, '--sample-rate', str(args.rate),
+             '--shared-ring', name, '--stats-interval', '0', '--retries', '1'],
+            cwd=INTERFACE_DIR, stdout=subprocess.DEVNULL)
+        viewer = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--viewer', name, '--rate', str(args.rate),
+             '--follow', str(args.follow), '--freeze', str(args.freeze)],
+            stdout=subprocess.PIPE, text=True)
+        time.sleep(args.after_crash)
+        controller.send_signal(signal.SIGINT)
+        controllerStatus = controller.wait()
+        stopEvent.set()
+        thread.join()
+        times = atRate(Session(sessionPathFor(csvPath)).column('time').copy(), args.rate)
+
+    results = json.loads(viewer.stdout.strip().splitlines()[-1])
+    logged = gaps(times, args.rate)
+    loggedAfterCrash = int(np.sum(times > results['crashTime']))
+    print(f"viewer: {results['read']} samples read, {results['caughtUp']} of them after a {args.freeze:g} s freeze, "
+          f"{results['overruns']} skipped, {results['gaps']} gaps; append to read "
+          f"{results['p50WakeDelay'] * 1000:.2f} ms (p99 {results['p99WakeDelay'] * 1000:.2f} ms)")
+    print(f"viewer exit status {viewer.returncode} (SIGKILL), controller exit status {controllerStatus}")
+    print(f"controller: {len(times)} samples logged, {logged} gaps, {loggedAfterCrash} after the viewer crashed")
+
+    failed = False
+    if results['overruns'] or not results['caughtUp']:
+        print("FAIL: the viewer lost samples while it was frozen", file=sys.stderr)
+        failed = True
+    if controllerStatus != 0:
+        print("FAIL: the controller did not shut down cleanly", file=sys.stderr)
+        failed = True
+    if logged:
+        print("FAIL: the controller's log has gaps", file=sys.stderr)
+        failed = True
+    if loggedAfterCrash < 0.8 * args.rate * args.after_crash:
+        print("FAIL: the controller stopped logging after the viewer crashed", file=sys.stderr)
+        failed = True
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+    Memory soak test: drives the controller engine, the CSV log and the GUI sample store with simulated days of
+    1 Hz telemetry from the in-process emulator, and checks that resident memory stays flat after the first hour.
+
+    python soak-test.py --days 7
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import contextlib
+from arduinoEmulator import EmulatedSerial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from sampleStore import SampleStore, HISTORY_WINDOW_SAMPLES
+
+
+def residentMemoryMB():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak only (kB on Linux, bytes on macOS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=7.0, help="Simulated run length")
+    parser.add_argument('--window', type=int, default=HISTORY_WINDOW_SAMPLES, help="In-memory history window [samples]")
+    parser.add_argument('--tolerance-mb', type=float, default=5.0, help="Allowed growth after the first hour")
+    args = parser.parse_args()
+
+    logs = []
+    engine = ControllerEngine('soak-test', log=lambda message, messageType="info": logs.append(message) if len(logs) < 100 else None)
+    store = SampleStore(args.window)
+    engine.onSample = lambda record, timestamp: store.append(timestamp, record)
+    engine.arduinoSerial = EmulatedSerial(seed=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine.setCSVFilePath(os.path.join(directory, 'soak.csv'))
+        engine.initCSVFile([('Project Number', 'soak-test')])
+
+        hours = int(args.days * 24)
+        baseline = None
+        # The model implementation prints every step; keep stdout quiet while the simulated days run
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            engine.initializeBuildingModel(7.0, 25.0)
+            for hour in range(1, hours + 1):
+                for second in range(3600):
+                    engine.arduinoSerial.advance(1.0)
+                    engine.poll()
+                memory = residentMemoryMB()
+                if hour == 1:
+                    baseline = memory
+                if hour == 1 or hour % 24 == 0 or hour == hours:
+                    print(f"hour {hour:4d}: {memory:7.1f} MB, {len(store)} samples in memory", file=sys.stderr)
+
+        engine.shutdown()
+
+    growth = memory - baseline
+    print(f"Resident memory after {hours} h: {memory:.1f} MB ({growth:+.1f} MB since hour 1)")
+    if growth > args.tolerance_mb:
+        print(f"FAIL: memory grew by more than {args.tolerance_mb} MB", file=sys.stderr)
+        return 1
+    print("PASS: memory is flat")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+    Start-up benchmark: time from process start to the first accepted telemetry sample.
+    The controller is connected to the Python Arduino emulator through a pseudo terminal (Linux/macOS).
+
+    python startup-benchmark.py --target daemon --runs 10
+    python startup-benchmark.py --target gui --runs 5
+    python startup-benchmark.py --target daemon --importtime   # adds the slowest imports of the first run
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from arduinoEmulator import startPseudoTerminal
+
+INTERFACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface')
+TARGETS = {
+    'daemon': ['controller-daemon.py', '--exit-after-first-sample', '--retries', '1'],
+    'gui': ['arduino-gui.py', '--benchmark-startup']
+}
+
+
+def runOnce(target, port, timeout, importTime=False):
+    """
+    Starts the target and returns (seconds until FIRST_SAMPLE, stderr text).
+    """
+    script, *options = TARGETS[target]
+    command = [sys.executable] + (['-X', 'importtime'] if importTime else []) + [script, '--port', port] + options
+    with tempfile.TemporaryFile(mode='w+') as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=INTERFACE_DIR, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        watchdog = threading.Timer(timeout, process.kill)
+        watchdog.start()
+        elapsed = None
+        try:
+            for line in process.stdout:
+                if line.strip() == "FIRST_SAMPLE":
+                    elapsed = time.perf_counter() - start
+                    break
+            process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        stderr.seek(0)
+        if elapsed is None:
+            raise RuntimeError(f"{target} did not report a sample within {timeout} s:\n{stderr.read()}")
+        return elapsed, stderr.read()
+
+
+def slowestImports(stderr, count=10):
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=sorted(TARGETS), default='daemon')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sample-interval', type=float, default=0.05, help="Emulator telemetry interval [s]")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--importtime', action='store_true', help="Report the slowest imports of the first run")
+    args = parser.parse_args()
+
+    port, stopEvent, _ = startPseudoTerminal(sampleInterval=args.sample_interval)
+    print(f"Emulator on {port}, telemetry every {args.sample_interval * 1000:.0f} ms")
+
+    timings = []
+    for run in range(args.runs):
+        elapsed, stderr = runOnce(args.target, port, args.timeout, importTime=args.importtime and run == 0)
+        timings.append(elapsed)
+        print(f"run {run + 1}: {elapsed * 1000:.0f} ms")
+        if args.importtime and run == 0:
+            for cumulative, name in slowestImports(stderr):
+                print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    stopEvent.set()
+
+    print(f"{args.target}: start to first sample min {min(timings) * 1000:.0f} ms, "
+          f"median {statistics.median(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
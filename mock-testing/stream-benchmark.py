@@ -0,0 +1,211 @@
+"""
+    Live stream benchmark: runs the controller engine on the control loop thread against the emulator through a
+    pseudo terminal (Linux/macOS), once without and once with the sample stream (streamServer.py) followed by many
+    viewers: most read everything, a few read slowly and a few stop reading after subscribing.
+    The viewers run in a separate process, like remote browsers. Checks that every fast viewer receives every
+    sample, that slow and stalled viewers are decimated with bounded buffers instead of holding up the others, and
+    that streaming adds no latency to the acquisition path: the p99 control loop lateness and sample-to-DAC latency
+    may exceed those of the run without viewers by --max-p99-increase at most.
+
+    python stream-benchmark.py --rate 100 --period 0.01 --clients 50 --slow 3 --stalled 2 --seconds 20
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import selectors
+import contextlib
+import multiprocessing
+from arduinoEmulator import startPseudoTerminal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine
+from controlLoop import ControlLoop, formatControlStats
+from streamServer import StreamServer, formatStreamStats, STREAM_PATH, CLIENT_BUFFER_BYTES
+from commandTracker import percentile
+
+SLOW_READ_BYTES = 1024  # A slow viewer reads this much ...
+SLOW_READ_INTERVAL = 0.5  # ... every this many seconds, far below the stream's rate
+VIEWER_PROCESS = multiprocessing.get_context('spawn')  # The viewers' process starts afresh, without the controller
+
+
+class Viewer:
+    def __init__(self, port, kind):
+        self.kind = kind  # 'fast', 'slow' or 'stalled'
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        if kind != 'fast':
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.sock.sendall(f"GET {STREAM_PATH} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+        self.data = b""
+        self.headerSeen = False
+        self.ids = []
+        self.delays = []  # Arrival time - sample time [s]
+        self.lastRead = 0.0
+
+    def feed(self, data):
+        now = time.time()
+        self.data += data
+        if not self.headerSeen:
+            if b"\r\n\r\n" not in self.data:
+                return
+            header, self.data = self.data.split(b"\r\n\r\n", 1)
+            assert header.startswith(b"HTTP/1.1 200"), header
+            self.headerSeen = True
+        *events, self.data = self.data.split(b"\n\n")
+        for event in events:
+            fields = dict(line.split(": ", 1) for line in event.decode().split("\n") if ": " in line)
+            if 'id' in fields:
+                self.ids.append(int(fields['id']))
+                self.delays.append(now - json.loads(fields['data'])['time'])
+
+
+def follow(viewers, done):
+    """
+    Reads all viewers on one thread.
+    """
+    selector = selectors.DefaultSelector()
+    for viewer in viewers:
+        if viewer.kind != 'stalled':
+            selector.register(viewer.sock, selectors.EVENT_READ, viewer)
+    while not done.is_set():
+        for key, mask in selector.select(0.05):
+            viewer = key.data
+            if viewer.kind == 'slow':
+                if time.monotonic() - viewer.lastRead < SLOW_READ_INTERVAL:
+                    continue
+                viewer.lastRead = time.monotonic()
+            viewer.feed(viewer.sock.recv(SLOW_READ_BYTES if viewer.kind == 'slow' else 65536))
+        time.sleep(0.001)  # Slow viewers stay readable; do not spin on them
+    selector.close()
+
+
+def viewerProcess(port, kinds, ready, done, results):
+    """
+    Connects the viewers, follows the stream until `done` is set and sends back what each viewer received as
+    (kind, event ids, delays) tuples.
+    """
+    viewers = [Viewer(port, kind) for kind in kinds]
+    ready.set()
+    follow(viewers, done)
+    for viewer in viewers:
+        viewer.sock.close()
+    results.send([(viewer.kind, viewer.ids, viewer.delays) for viewer in viewers])
+
+
+class ViewerResult:
+    def __init__(self, kind, ids, delays):
+        self.kind = kind
+        self.ids = ids
+        self.delays = delays
+
+    def gaps(self):
+        return sum(1 for previous, current in zip(self.ids, self.ids[1:]) if current != previous + 1)
+
+
+def run(args, clients):
+    """
+    Runs the control loop for `args.seconds`, streaming to `clients` viewers (0: no stream server).
+    Returns (control loop statistics, sample-to-DAC statistics, stream statistics, viewers, peak buffer bytes).
+    """
+    port, stopEvent, thread = startPseudoTerminal(seed=1)
+    engine = ControllerEngine(port, log=lambda message, messageType="info": None)
+    engine.connect()
+    engine.setSampling(args.rate)
+    controlLoop = ControlLoop(engine.poll, args.period)
+    streamServer = None
+    viewers = []
+    peakBuffer = 0
+    done = VIEWER_PROCESS.Event()
+    if clients:
+        streamServer = StreamServer(engine.bus, 0)
+        streamServer.start()
+        kinds = ['stalled'] * args.stalled + ['slow'] * args.slow
+        kinds += ['fast'] * (clients - len(kinds))
+        ready = VIEWER_PROCESS.Event()
+        results, childResults = VIEWER_PROCESS.Pipe(duplex=False)
+        follower = VIEWER_PROCESS.Process(target=viewerProcess,
+                                           args=(streamServer.port, kinds, ready, done, childResults), daemon=True)
+        follower.start()
+        ready.wait()
+        while streamServer.subscriptions < clients:  # Every viewer follows from the first sample
+            time.sleep(0.01)
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        controlLoop.start()
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            time.sleep(0.1)
+            if clients:
+                buffers = [len(client.buffer) for client in list(streamServer.clients.values())]
+                peakBuffer = max([peakBuffer] + buffers)
+        controlLoop.stop()
+        time.sleep(0.5)  # Let the last batch reach the viewers
+        streamStats = streamServer.stats() if clients else None  # While every viewer is still connected
+        done.set()
+        if clients:
+            viewers = [ViewerResult(*viewer) for viewer in results.recv()]
+            follower.join()
+            streamServer.stop()
+        engine.shutdown()
+    stopEvent.set()
+    thread.join()
+    return controlLoop.stats(), engine.latencyStats()['total'], streamStats, viewers, peakBuffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--period', type=float, default=0.01, help="Control loop period [s]")
+    parser.add_argument('--clients', type=int, default=50, help="Viewers in total")
+    parser.add_argument('--slow', type=int, default=3, help="Viewers reading far below the stream's rate")
+    parser.add_argument('--stalled', type=int, default=2, help="Viewers that stop reading after subscribing")
+    parser.add_argument('--seconds', type=float, default=20.0, help="Run length per set-up")
+    parser.add_argument('--max-p99-increase', type=float, default=0.0005,
+                        help="Largest increase of the p99 control loop lateness and sample-to-DAC latency allowed [s]")
+    args = parser.parse_args()
+
+    quiet, quietLatency, _, _, _ = run(args, 0)
+    streamed, streamedLatency, stream, viewers, peakBuffer = run(args, args.clients)
+    fast = [viewer for viewer in viewers if viewer.kind == 'fast']
+    others = [viewer for viewer in viewers if viewer.kind != 'fast']
+    delays = sorted(delay for viewer in fast for delay in viewer.delays)
+
+    print(f"no viewers:  {formatControlStats(quiet)}; sample to DAC p99 {quietLatency['p99'] * 1000:.2f} ms")
+    print(f"{args.clients} viewers: {formatControlStats(streamed)}; "
+          f"sample to DAC p99 {streamedLatency['p99'] * 1000:.2f} ms")
+    print(f"stream: {formatStreamStats(stream)}, largest viewer buffer {peakBuffer} bytes")
+    print(f"fast viewers: {min(len(viewer.ids) for viewer in fast)} to {max(len(viewer.ids) for viewer in fast)} "
+          f"samples each, sample time to viewer {percentile(delays, 0.5) * 1000:.0f} ms "
+          f"(p99 {percentile(delays, 0.99) * 1000:.0f} ms)")
+    for viewer in others:
+        print(f"{viewer.kind} viewer: {len(viewer.ids)} samples read, {viewer.gaps()} gaps")
+
+    failed = False
+    incomplete = [viewer for viewer in fast if viewer.gaps() or len(viewer.ids) != stream['events']]
+    if incomplete:
+        print(f"FAIL: {len(incomplete)} fast viewers missed samples", file=sys.stderr)
+        failed = True
+    if stream['decimated'] < args.slow + args.stalled:
+        print("FAIL: slow or stalled viewers were not decimated", file=sys.stderr)
+        failed = True
+    if peakBuffer > CLIENT_BUFFER_BYTES:
+        print("FAIL: a viewer's buffer grew past its limit", file=sys.stderr)
+        failed = True
+    if (streamed['p99Lateness'] - quiet['p99Lateness'] > args.max_p99_increase
+            or streamedLatency['p99'] - quietLatency['p99'] > args.max_p99_increase):
+        print("FAIL: streaming adds latency to the acquisition path", file=sys.stderr)
+        failed = True
+    if failed:
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+    Telemetry loss test: runs the controller engine against the in-process emulator, drops and repeats random
+    telemetry lines between the emulator and the engine (like serial buffer overruns and USB glitches), and checks
+    that the sample sequence numbers account for every injected fault: the lost and duplicate counters match,
+    and every logged sample time stays on the sample grid, across the gaps.
+
+    python telemetry-loss-test.py --rate 100 --batch 10 --drop 0.02 --repeat 0.01
+"""
+
+import io
+import os
+import sys
+import random
+import argparse
+import contextlib
+from datetime import timedelta
+from arduinoEmulator import EmulatedSerial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino-interface'))
+from controllerEngine import ControllerEngine, BATCH_PREFIX
+from sequenceTracker import formatSequenceStats
+
+
+def samplesIn(line):
+    return line.count(b';') if line.startswith(BATCH_PREFIX.encode()) else int(b'Seq:' in line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=100, help="Telemetry rate [Hz]")
+    parser.add_argument('--batch', type=int, default=1, help="Samples per telemetry line")
+    parser.add_argument('--drop', type=float, default=0.02, help="Fraction of telemetry lines dropped")
+    parser.add_argument('--repeat', type=float, default=0.01, help="Fraction of telemetry lines sent twice")
+    parser.add_argument('--duration', type=float, default=60.0, help="Virtual time [s]")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logs = []
+    engine = ControllerEngine('telemetry-loss-test', log=lambda message, messageType="info": logs.append(message))
+    engine.arduinoSerial = serial = EmulatedSerial(seed=args.seed)
+    engine.clock = lambda: serial.now  # The host clock runs on the emulator's virtual time
+    engine.wallClockOffset = serial.emulator.rtcTime
+    engine.setSampling(args.rate, batchSamples=args.batch)
+    emulator = engine.arduinoSerial.emulator
+    rxBuffer = engine.arduinoSerial.rxBuffer
+    faults = random.Random(args.seed)
+
+    loggedTimes = {}  # Sequence number -> logged time of the samples processed
+    processSample = engine.processSample
+
+    def recordingProcessSample(dataDict, *args, **kwargs):
+        record = processSample(dataDict, *args, **kwargs)
+        loggedTimes[int(dataDict['Seq'])] = engine.simulated_time - timedelta(seconds=engine.samplePeriod)
+        return record
+
+    engine.processSample = recordingProcessSample
+
+    # The model implementation prints every step; keep stdout quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initializeBuildingModel(7.0, 25.0)
+        while engine.sampleRate != args.rate or emulator.batchSamples != args.batch or emulator.batch:
+            engine.arduinoSerial.advance(emulator.sampleInterval)
+            engine.poll()
+            if engine.arduinoSerial.now > 10.0:
+                print(f"FAIL: the emulator did not confirm {args.rate} Hz in batches of {args.batch}", file=sys.stderr)
+                return 1
+
+        loggedTimes.clear()
+        dropped = repeated = 0
+        while engine.arduinoSerial.now < args.duration:
+            engine.arduinoSerial.advance(0.1)
+            lines = rxBuffer.splitlines(keepends=True)
+            rxBuffer.clear()
+            for line in lines:
+                samples = samplesIn(line)
+                if samples and faults.random() < args.drop:
+                    dropped += samples
+                    continue
+                rxBuffer.extend(line)
+                if samples and faults.random() < args.repeat:
+                    rxBuffer.extend(line)
+                    repeated += samples
+            engine.poll()
+        if emulator.batch:  # Samples still waiting for their batch were taken but not sent
+            lastSent = emulator.batchSequence - 1
+        else:
+            lastSent = emulator.sampleSequence
+    engine.shutdown()
+
+    trailing = lastSent - max(loggedTimes)  # Samples dropped after the last one received cannot be detected yet
+    firstSample = min(loggedTimes)
+    timeError = max(abs((loggedTime - loggedTimes[firstSample]).total_seconds() - (sequence - firstSample) / args.rate)
+                    for sequence, loggedTime in loggedTimes.items())
+
+    stats = engine.sequenceStats()
+    print(f"injected: {dropped} samples dropped, {repeated} repeated")
+    print(f"tracked:  {formatSequenceStats(stats)}")
+    print(f"logged times at most {timeError * 1000:.1f} ms off the sample grid")
+    failed = stats['lost'] + trailing != dropped or stats['duplicates'] != repeated
+    if failed or timeError > 0.002:
+        print("FAIL: the sequence numbers do not account for the injected faults", file=sys.stderr)
+        return 1
+    print("PASS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())